@@ -102,16 +102,14 @@ def run_doctor(settings: Settings) -> int:
         errors += 1
 
     try:
-        from filters import (
-            DISALLOWED_PLATFORM_PATTERNS,
-            DISALLOWED_TOPICS,
-            TARGET_KEYWORD_PATTERNS,
-        )
+        from filters import load_filter_rules
 
+        rules = load_filter_rules(settings.filter_rules_path)
         _print_check(
             "OK",
-            f"Фильтр загружен: {len(TARGET_KEYWORD_PATTERNS)} целевых шаблонов, "
-            f"{len(DISALLOWED_TOPICS) + len(DISALLOWED_PLATFORM_PATTERNS)} исключений",
+            f"Фильтр загружен из {settings.filter_rules_path.name} "
+            f"(версия {rules.version}): {len(rules.target_patterns)} целевых шаблонов, "
+            f"{len(rules.disallowed_topics) + len(rules.disallowed_platforms)} исключений",
         )
     except Exception as exc:
         _print_check("ОШИБКА", f"Не удалось загрузить фильтр: {exc}")
@@ -300,12 +298,17 @@ def command_auth(settings: Settings, *, force: bool) -> int:
     return 0
 
 
-def command_filter(text: str | None) -> int:
-    from filters import evaluate_order
+def command_filter(settings: Settings, text: str | None) -> int:
+    from filters import FilterRulesError, evaluate_order, load_filter_rules
 
+    try:
+        rules = load_filter_rules(settings.filter_rules_path)
+    except FilterRulesError as exc:
+        print(f"ОШИБКА ПРАВИЛ ФИЛЬТРА: {exc}")
+        return 2
     if not text:
         text = input("Введите текст заявки: ").strip()
-    decision = evaluate_order({"title": text})
+    decision = evaluate_order({"title": text}, rules)
 
     if decision.excluded_rule:
         print(f"НЕ ПОДХОДИТ: найдено исключение «{decision.excluded_rule.phrase}»")
@@ -317,6 +320,54 @@ def command_filter(text: str | None) -> int:
     return 0
 
 
+def command_replay(
+    settings: Settings,
+    paths: list[Path],
+    *,
+    synthetic: int | None,
+    seed: int,
+    candidate_path: Path | None,
+    show_changes: int,
+) -> int:
+    from itertools import chain
+
+    from filter_corpus import synthetic_orders
+    from filter_replay import format_report, iter_jsonl_orders, replay_orders
+    from filters import FilterRulesError, load_filter_rules
+    from storage import queue_files
+
+    try:
+        rules = load_filter_rules(settings.filter_rules_path)
+        candidate = load_filter_rules(candidate_path) if candidate_path else None
+    except FilterRulesError as exc:
+        print(f"ОШИБКА ПРАВИЛ ФИЛЬТРА: {exc}")
+        return 2
+
+    if not paths and not synthetic:
+        paths = queue_files(settings.orders_path) or [settings.orders_path]
+    missing = [path for path in paths if not path.exists()]
+    if missing:
+        print(f"ОШИБКА: файл не найден: {missing[0]}")
+        return 2
+
+    orders = chain(
+        iter_jsonl_orders(paths),
+        synthetic_orders(synthetic, seed=seed) if synthetic else (),
+    )
+    report = replay_orders(
+        orders,
+        rules,
+        candidate=candidate,
+        max_changes=show_changes,
+    )
+    print(f"Правила: {settings.filter_rules_path.name} (версия {rules.version})")
+    if candidate is not None:
+        print(f"Кандидат: {candidate_path} (версия {candidate.version})")
+    for line in format_report(report, with_candidate=candidate is not None):
+        print(line)
+    return 0
+
+
 def command_session_audit(settings: Settings) -> int:
     if not _runtime_preflight(settings, require_telegram=False):
         return 2
@@ -378,6 +429,36 @@ def build_parser() -> argparse.ArgumentParser:
 
     filter_parser = subparsers.add_parser("filter", help="проверить текст фильтром")
     filter_parser.add_argument("text", nargs="?", help="текст тестовой заявки")
+
+    replay_parser = subparsers.add_parser(
+        "replay",
+        help="прогнать историю заявок через фильтр",
+    )
+    replay_parser.add_argument(
+        "paths",
+        nargs="*",
+        type=Path,
+        help="JSONL-файлы заявок, можно .gz; по умолчанию data/new_orders.jsonl",
+    )
+    replay_parser.add_argument(
+        "--synthetic",
+        type=int,
+        metavar="N",
+        help="добавить N синтетических заявок",
+    )
+    replay_parser.add_argument("--seed", type=int, default=0)
+    replay_parser.add_argument(
+        "--candidate",
+        type=Path,
+        help="файл правил, решения которого сравнить с текущими",
+    )
+    replay_parser.add_argument(
+        "--show-changes",
+        type=int,
+        default=20,
+        metavar="N",
+        help="сколько изменившихся решений показать",
+    )
     return parser
 
 
@@ -398,7 +479,16 @@ def main(argv: list[str] | None = None) -> int:
     if arguments.command == "auth":
         return command_auth(settings, force=arguments.force)
     if arguments.command == "filter":
-        return command_filter(arguments.text)
+        return command_filter(settings, arguments.text)
+    if arguments.command == "replay":
+        return command_replay(
+            settings,
+            arguments.paths,
+            synthetic=arguments.synthetic,
+            seed=arguments.seed,
+            candidate_path=arguments.candidate,
+            show_changes=arguments.show_changes,
+        )
     return 2
 
 
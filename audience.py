@@ -1,19 +1,94 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any
+from collections import OrderedDict
+import os
+import time
+from typing import Any, Awaitable, Callable
 
 from aiogram import Bot
 from aiogram.enums import ChatType
 from aiogram.exceptions import (
+    TelegramBadRequest,
     TelegramForbiddenError,
     TelegramNetworkError,
     TelegramRetryAfter,
+    TelegramServerError,
 )
 from aiogram.types import FSInputFile
 
 from config import Settings
-from storage import load_chat_ids, save_chat_ids
+from delivery import DeliveryOutbox
+from metrics import REGISTRY
+from storage import JSON_WRITER, load_chat_ids, save_chat_ids
+from telegram_dispatch import (
+    ChatPaused,
+    LANE_ALERTS,
+    LANE_ORDERS,
+    LANE_RECOVERY,
+    TelegramDispatcher,
+)
+
+
+SEND_SECONDS = REGISTRY.histogram(
+    "profi_telegram_send_seconds",
+    "Длительность успешных запросов отправки в Telegram",
+    ("method",),
+)
+SEND_FAILURES = REGISTRY.counter(
+    "profi_telegram_send_failures",
+    "Неудачные отправки в Telegram по причине",
+    ("method", "reason"),
+)
+
+# Временные сбои: сообщение остаётся в очереди чата и отправляется повторно.
+RETRYABLE_ERRORS = (
+    ChatPaused,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+
+class PhotoIdCache:
+    """file_id загруженных снимков по пути, mtime и размеру файла.
+
+    Загрузка файла — самая медленная операция Bot API, особенно через
+    TELEGRAM_PROXY; по file_id Telegram рассылает уже загруженный снимок.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple[str, int, int], str] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(path: str) -> tuple[str, int, int] | None:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    def get(self, key: tuple[str, int, int] | None) -> str | None:
+        file_id = self._entries.get(key) if key is not None else None
+        if file_id is not None:
+            self._entries.move_to_end(key)
+        return file_id
+
+    def put(self, key: tuple[str, int, int] | None, file_id: str) -> None:
+        if key is None:
+            return
+        self._entries[key] = file_id
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: tuple[str, int, int] | None) -> None:
+        if key is not None:
+            self._entries.pop(key, None)
 
 
 class TelegramAudience:
@@ -34,6 +109,21 @@ class TelegramAudience:
         self._available = asyncio.Event()
         if self._chat_ids:
             self._available.set()
+        self.dispatcher = TelegramDispatcher(
+            settings.telegram_rate_per_sec,
+            concurrency=settings.telegram_concurrency,
+            alert_rate_per_sec=settings.telegram_alert_rate_per_sec,
+            alert_concurrency=settings.telegram_alert_concurrency,
+        )
+        self.outbox = DeliveryOutbox(
+            settings.telegram_outbox_path,
+            base_delay_sec=settings.delivery_retry_base_sec,
+            max_delay_sec=settings.delivery_retry_max_sec,
+            max_attempts=settings.delivery_max_attempts,
+            writer=JSON_WRITER,
+        )
+        self._outbox_changed = asyncio.Event()
+        self.photo_ids = PhotoIdCache()
 
     @property
     def recipients(self) -> tuple[int, ...]:
@@ -88,6 +178,7 @@ class TelegramAudience:
             return
         self._chat_ids.remove(chat_id)
         self._error_muted_chat_ids.discard(chat_id)
+        self.outbox.drop(chat_id)
         save_chat_ids(self.settings.telegram_chats_path, self._chat_ids)
         save_chat_ids(
             self.settings.telegram_error_mutes_path,
@@ -99,42 +190,148 @@ class TelegramAudience:
     async def wait_until_available(self) -> None:
         await self._available.wait()
 
-    async def send(self, bot: Bot, text: str, **kwargs: Any) -> int:
-        return await self._send_to(bot, self.recipients, text, **kwargs)
+    async def send(
+        self,
+        bot: Bot,
+        text: str,
+        *,
+        lane: str = LANE_ALERTS,
+        **kwargs: Any,
+    ) -> int:
+        return await self._send_to(bot, self.recipients, text, lane, **kwargs)
+
+    async def send_recovery(self, bot: Bot, text: str, **kwargs: Any) -> int:
+        """Запрос восстановления сессии: важнее ошибок, но уступает заявкам."""
+        return await self.send(bot, text, lane=LANE_RECOVERY, **kwargs)
 
     async def send_error(self, bot: Bot, text: str, **kwargs: Any) -> int:
-        return await self._send_to(bot, self.error_recipients, text, **kwargs)
+        return await self._send_to(
+            bot,
+            self.error_recipients,
+            text,
+            LANE_ALERTS,
+            **kwargs,
+        )
+
+    async def send_order(self, bot: Bot, text: str, **kwargs: Any) -> int:
+        """Рассылает заявку без потерь: временный сбой ставит её в очередь чата.
+
+        Чат с непустой очередью получает новые заявки только после старых.
+        Возвращает число чатов, получивших заявку или ожидающих повтора.
+        """
+        waiting: list[int] = []
+        direct: list[int] = []
+        for chat_id in self.recipients:
+            (waiting if self.outbox.has_pending(chat_id) else direct).append(chat_id)
+
+        async def send(chat_id: int) -> None:
+            await self._send_message(bot, chat_id, text, kwargs)
+
+        results = await self.dispatcher.deliver(
+            direct,
+            self._reporting(send, "sendMessage"),
+            LANE_ORDERS,
+        )
+        failed = [
+            (chat_id, error)
+            for chat_id, error in results
+            if isinstance(error, RETRYABLE_ERRORS)
+        ]
+        queued = self.outbox.add(
+            [*waiting, *(chat_id for chat_id, _ in failed)],
+            {"text": text, "kwargs": kwargs},
+        )
+        # Чат под лимитом повторяется после паузы Telegram, остальные не ждут его.
+        now = time.time()
+        for chat_id, error in failed:
+            if isinstance(error, (TelegramRetryAfter, ChatPaused)):
+                self._defer(chat_id, error, now)
+        if failed and self.log is not None:
+            self.log.warning(
+                "Заявка поставлена в очередь повтора для %s чат(ов)",
+                len(failed),
+            )
+        if queued:
+            self._outbox_changed.set()
+        # Отказ Telegram в одном чате не мешает остальным: заявка для него теряется.
+        delivered = self._count_delivered(results, "sendMessage", drop_rejected=True)
+        return delivered + queued
+
+    async def retry_pending(self, bot: Bot) -> float | None:
+        """Повторяет отложенные сообщения; возвращает паузу до следующего срока."""
+        due = self.outbox.due(time.time())
+        for chat_id in [chat_id for chat_id in due if chat_id not in self._chat_ids]:
+            # Получатель отписался или сменился ADMIN_CHAT_ID.
+            self.outbox.drop(chat_id)
+            del due[chat_id]
+        if due:
+            async def send(chat_id: int) -> None:
+                message = due[chat_id]
+                await self._send_message(
+                    bot,
+                    chat_id,
+                    message["text"],
+                    message.get("kwargs") or {},
+                )
+
+            results = await self.dispatcher.deliver(
+                due,
+                self._reporting(send, "sendMessage"),
+                LANE_ORDERS,
+            )
+            now = time.time()
+            for chat_id, error in results:
+                if error is None:
+                    self.outbox.pop(chat_id)
+                elif isinstance(error, TelegramForbiddenError):
+                    self.outbox.drop(chat_id)
+                elif not isinstance(error, RETRYABLE_ERRORS):
+                    self.outbox.pop(chat_id)
+                else:
+                    self._defer(chat_id, error, now)
+            self._count_delivered(results, "sendMessage", drop_rejected=True)
+        next_due = self.outbox.next_due()
+        return None if next_due is None else max(0.0, next_due - time.time())
+
+    def _defer(self, chat_id: int, error: BaseException, now: float) -> None:
+        if not self.outbox.failed(
+            chat_id,
+            now,
+            getattr(error, "retry_after", 0),
+        ) and self.log is not None:
+            self.log.warning(
+                "Сообщение в чат %s удалено из очереди после %s попыток",
+                chat_id,
+                self.outbox.max_attempts,
+            )
+
+    async def wait_for_pending(self, timeout: float | None) -> None:
+        """Ждёт срока повтора или новой записи в очереди доставки."""
+        try:
+            await asyncio.wait_for(self._outbox_changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._outbox_changed.clear()
 
     async def _send_to(
         self,
         bot: Bot,
         recipients: tuple[int, ...],
         text: str,
+        lane: str,
         **kwargs: Any,
     ) -> int:
-        delivered = 0
-        for chat_id in recipients:
-            try:
-                await bot.send_message(chat_id, text, **kwargs)
-                delivered += 1
-            except TelegramForbiddenError:
-                self.unregister(chat_id)
-                if self.log is not None:
-                    self.log.warning("Telegram-пользователь %s заблокировал бота", chat_id)
-            except TelegramRetryAfter as exc:
-                if self.log is not None:
-                    self.log.warning(
-                        "Telegram ограничил отправку в чат %s; повтор возможен через %s сек.",
-                        chat_id,
-                        exc.retry_after,
-                    )
-            except TelegramNetworkError as exc:
-                if self.log is not None:
-                    self.log.warning(
-                        "Не удалось отправить сообщение в Telegram через сеть/прокси: %s",
-                        exc,
-                    )
-        return delivered
+        async def send(chat_id: int) -> None:
+            await self._send_message(bot, chat_id, text, kwargs)
+
+        return self._count_delivered(
+            await self.dispatcher.deliver(
+                recipients,
+                self._reporting(send, "sendMessage"),
+                lane,
+            ),
+            "sendMessage",
+        )
 
     async def send_photo(self, bot: Bot, path: str, caption: str) -> int:
         return await self._send_photo_to(bot, self.recipients, path, caption)
@@ -154,31 +351,125 @@ class TelegramAudience:
         path: str,
         caption: str,
     ) -> int:
+        """Загружает снимок один раз, остальным чатам отправляет его file_id."""
         safe_caption = caption if len(caption) <= 1024 else caption[:1021] + "..."
-        delivered = 0
-        for chat_id in recipients:
+        key = self.photo_ids.key(path)
+
+        async def upload(chat_id: int) -> None:
+            started = time.perf_counter()
+            message = await bot.send_photo(
+                chat_id,
+                FSInputFile(path),
+                caption=safe_caption,
+            )
+            SEND_SECONDS.observe(time.perf_counter() - started, method="sendPhoto")
+            sizes = getattr(message, "photo", None)
+            if sizes:
+                self.photo_ids.put(key, sizes[-1].file_id)
+
+        async def send(chat_id: int) -> None:
+            file_id = self.photo_ids.get(key)
+            if file_id is None:
+                await upload(chat_id)
+                return
+            started = time.perf_counter()
             try:
-                await bot.send_photo(
-                    chat_id,
-                    FSInputFile(path),
-                    caption=safe_caption,
-                )
+                await bot.send_photo(chat_id, file_id, caption=safe_caption)
+            except TelegramBadRequest:
+                # file_id больше не принимается: загружаем файл заново.
+                self.photo_ids.discard(key)
+                await upload(chat_id)
+                return
+            SEND_SECONDS.observe(time.perf_counter() - started, method="sendPhoto")
+
+        reporting = self._reporting(send, "sendPhoto")
+        pending = list(recipients)
+        results: list[tuple[int, BaseException | None]] = []
+        # Пока снимок не загружен, отправляем по одному чату: иначе каждый
+        # параллельный запрос загрузил бы файл заново.
+        while pending and self.photo_ids.get(key) is None and key is not None:
+            result = await self.dispatcher.deliver(pending[:1], reporting, LANE_ALERTS)
+            del pending[:1]
+            results.extend(result)
+            if result[0][1] is None:
+                break
+        results.extend(
+            await self.dispatcher.deliver(pending, reporting, LANE_ALERTS)
+        )
+        return self._count_delivered(results, "sendPhoto")
+
+    async def _send_message(
+        self,
+        bot: Bot,
+        chat_id: int,
+        text: str,
+        kwargs: dict[str, Any],
+    ) -> None:
+        started = time.perf_counter()
+        await bot.send_message(chat_id, text, **kwargs)
+        SEND_SECONDS.observe(time.perf_counter() - started, method="sendMessage")
+
+    def _reporting(
+        self,
+        send: Callable[[int], Awaitable[None]],
+        method: str,
+    ) -> Callable[[int], Awaitable[None]]:
+        async def reporting(chat_id: int) -> None:
+            try:
+                await send(chat_id)
+            except TelegramRetryAfter as exc:
+                SEND_FAILURES.inc(method=method, reason="retry_after")
+                if self.log is not None:
+                    self.log.warning(
+                        "Telegram ограничил отправку в чат %s; повтор через %s сек.",
+                        chat_id,
+                        exc.retry_after,
+                    )
+                raise
+
+        return reporting
+
+    def _count_delivered(
+        self,
+        results: list[tuple[int, BaseException | None]],
+        method: str,
+        *,
+        drop_rejected: bool = False,
+    ) -> int:
+        delivered = 0
+        for chat_id, error in results:
+            if error is None:
                 delivered += 1
-            except TelegramForbiddenError:
+            elif isinstance(error, TelegramForbiddenError):
+                SEND_FAILURES.inc(method=method, reason="forbidden")
                 self.unregister(chat_id)
                 if self.log is not None:
                     self.log.warning("Telegram-пользователь %s заблокировал бота", chat_id)
-            except TelegramRetryAfter as exc:
+            elif isinstance(error, TelegramNetworkError):
+                SEND_FAILURES.inc(method=method, reason="network")
                 if self.log is not None:
                     self.log.warning(
-                        "Telegram ограничил отправку фото в чат %s; повтор через %s сек.",
+                        "Не удалось отправить в Telegram через сеть/прокси: %s",
+                        error,
+                    )
+            elif isinstance(error, TelegramServerError):
+                SEND_FAILURES.inc(method=method, reason="server")
+                if self.log is not None:
+                    self.log.warning("Сервер Telegram вернул ошибку: %s", error)
+            elif isinstance(error, (TelegramRetryAfter, ChatPaused)):
+                if self.log is not None:
+                    self.log.warning(
+                        "Сообщение в чат %s не отправлено: лимит Telegram",
                         chat_id,
-                        exc.retry_after,
                     )
-            except TelegramNetworkError as exc:
+            elif drop_rejected:
+                SEND_FAILURES.inc(method=method, reason="rejected")
                 if self.log is not None:
                     self.log.warning(
-                        "Не удалось отправить фото в Telegram через сеть/прокси: %s",
-                        exc,
+                        "Telegram отклонил сообщение в чат %s: %s",
+                        chat_id,
+                        error,
                     )
+            else:
+                raise error
         return delivered
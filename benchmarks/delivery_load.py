@@ -0,0 +1,237 @@
+"""Пропускная способность доставки в Telegram через локальную имитацию Bot API.
+
+Запуск из корня проекта:
+
+    python -m benchmarks.delivery_load
+    python -m benchmarks.delivery_load --recipients 200 --orders 100 --resets 0.02
+
+Настоящие order_notifier, delivery_retry_worker, system_event_notifier и
+telegram_command_polling работают с сервером benchmarks.fake_bot_api, который
+добавляет задержку, случайные 429, 403 для части чатов и обрывы соединения.
+Заявки и события пишутся в очереди, команды приходят через getUpdates.
+Для каждого потока выводятся доставки получателям в секунду и перцентили
+задержки от записи до приёма сервером.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+from pathlib import Path
+import re
+import tempfile
+import time
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from audience import TelegramAudience
+from benchmarks.fake_bot_api import Delivery, FakeBotApi
+from config import Settings
+from health import EVENT_SITE_ERROR, emit_system_event
+from queues import open_order_queue
+from run_all import delivery_retry_worker, order_notifier
+from session_recovery import SessionRecoveryManager
+from storage import save_chat_ids
+from telegram_control import system_event_notifier, telegram_command_polling
+
+
+ORDER_ID = re.compile(r"<code>bench-(\d+)</code>")
+EVENT_ID = re.compile(r"bench-event-(\d+)")
+
+
+def _percentile(values: list[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round((len(ordered) - 1) * share))]
+
+
+def _report(name: str, latencies: list[float], expected: int, elapsed: float) -> None:
+    if not latencies:
+        print(f"{name:>8}: доставлено 0/{expected}")
+        return
+    print(
+        f"{name:>8}: доставлено {len(latencies)}/{expected} за {elapsed:5.1f} с, "
+        f"{len(latencies) / elapsed:6.1f} получ./с, "
+        f"p50 {_percentile(latencies, 0.5) * 1000:7.0f} мс, "
+        f"p95 {_percentile(latencies, 0.95) * 1000:7.0f} мс, "
+        f"p99 {_percentile(latencies, 0.99) * 1000:7.0f} мс"
+    )
+
+
+class _Stream:
+    def __init__(self, name: str, expected: int):
+        self.name = name
+        self.expected = expected
+        self.latencies: list[float] = []
+        self.last_at = 0.0
+
+    def add(self, delivery: Delivery, written_at: float) -> None:
+        self.latencies.append(delivery.at - written_at)
+        self.last_at = max(self.last_at, delivery.at)
+
+    @property
+    def complete(self) -> bool:
+        return len(self.latencies) >= self.expected
+
+
+def _collect(
+    deliveries: list[Delivery],
+    orders: dict[int, float],
+    events: dict[int, float],
+    commands: dict[int, float],
+    streams: tuple[_Stream, _Stream, _Stream],
+) -> None:
+    order_stream, event_stream, command_stream = streams
+    commands = dict(commands)
+    for delivery in deliveries:
+        for match in ORDER_ID.finditer(delivery.text):
+            order_stream.add(delivery, orders[int(match.group(1))])
+        if match := EVENT_ID.search(delivery.text):
+            event_stream.add(delivery, events[int(match.group(1))])
+        if delivery.text.startswith("Версия парсера") and delivery.chat_id in commands:
+            command_stream.add(delivery, commands.pop(delivery.chat_id))
+
+
+async def _run(args: argparse.Namespace, directory: Path) -> None:
+    recipients = list(range(1, args.recipients + 1))
+    forbidden = recipients[: args.forbidden]
+    active = len(recipients) - len(forbidden)
+    settings = Settings.load(
+        env_file=None,
+        values={
+            "DATA_DIR": str(directory),
+            "LOG_DIR": str(directory / "logs"),
+            "BOT_TOKEN": "123:benchmark",
+            "PROFI_LOGIN": "+79990000000",
+            "ORDER_DIGEST_THRESHOLD": str(args.digest_threshold),
+        },
+    )
+    settings.ensure_directories()
+    save_chat_ids(settings.telegram_chats_path, set(recipients))
+    screenshot = settings.debug_dir / "site_error.png"
+    screenshot.write_bytes(b"\x89PNG\r\n\x1a\n" + b"\0" * 50_000)
+
+    log = logging.getLogger("benchmark")
+    log.setLevel(logging.CRITICAL)
+    logging.getLogger("aiogram").setLevel(logging.CRITICAL)
+    api = FakeBotApi(
+        latency_sec=args.latency_ms / 1000,
+        latency_jitter_sec=args.latency_ms / 2000,
+        rate_limit_probability=args.rate_limits,
+        forbidden_chats=forbidden,
+        reset_probability=args.resets,
+        seed=1,
+    )
+    async with api:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(api.url))
+        bot = Bot(token="123:benchmark", session=session)
+        audience = TelegramAudience(settings, log)
+        recovery = SessionRecoveryManager(settings, bot, log, audience=audience)
+        tasks = [
+            asyncio.create_task(order_notifier(settings, bot, log, audience)),
+            asyncio.create_task(delivery_retry_worker(settings, bot, log, audience)),
+            asyncio.create_task(system_event_notifier(settings, bot, log, audience)),
+            asyncio.create_task(
+                telegram_command_polling(settings, bot, recovery, log, audience)
+            ),
+        ]
+        # Первый запуск отправщика пропускает уже записанные заявки.
+        await asyncio.sleep(0.5)
+
+        orders: dict[int, float] = {}
+        events: dict[int, float] = {}
+        commands: dict[int, float] = {}
+        started = time.monotonic()
+        with open_order_queue(settings) as queue:
+            for index in range(args.orders):
+                orders[index] = time.monotonic()
+                queue.append(
+                    {
+                        "order_id": f"bench-{index}",
+                        "title": f"Заявка {index}",
+                        "description": "Нужно сделать сайт. " * 20,
+                    }
+                )
+                if index < args.events:
+                    events[index] = time.monotonic()
+                    emit_system_event(
+                        settings.system_events_path,
+                        EVENT_SITE_ERROR,
+                        f"bench-event-{index}",
+                        screenshot_path=str(screenshot) if index % 2 else "",
+                    )
+                if index < args.commands:
+                    chat_id = recipients[-1 - index]
+                    commands[chat_id] = time.monotonic()
+                    await api.push_command(chat_id, "/version")
+                await asyncio.sleep(args.interval_ms / 1000)
+
+        # Без новых доставок за idle_sec считаем, что остальное потеряно.
+        seen = 0
+        idle_since = time.monotonic()
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            streams = (
+                _Stream("заявки", args.orders * active),
+                _Stream("события", args.events * active),
+                _Stream("команды", args.commands),
+            )
+            _collect(api.stats.deliveries, orders, events, commands, streams)
+            if all(stream.complete for stream in streams):
+                break
+            if len(api.stats.deliveries) != seen:
+                seen = len(api.stats.deliveries)
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since > args.idle_sec:
+                break
+            await asyncio.sleep(0.2)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await recovery.stop()
+        await session.close()
+
+    print(
+        f"получателей {args.recipients} (заблокировали бота: {args.forbidden}), "
+        f"заявок {args.orders}, событий {args.events}, команд {args.commands}"
+    )
+    for stream in streams:
+        _report(
+            stream.name,
+            stream.latencies,
+            stream.expected,
+            max(stream.last_at - started, 1e-3),
+        )
+    print(
+        f"сервер: запросов {api.stats.requests}, доставлено {api.stats.delivered}, "
+        f"429: {api.stats.rate_limited}, 403: {api.stats.forbidden}, "
+        f"обрывов: {api.stats.resets}, sendPhoto: "
+        f"{api.stats.by_method.get('sendphoto', 0)}"
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=50)
+    parser.add_argument("--forbidden", type=int, default=2)
+    parser.add_argument("--orders", type=int, default=30)
+    parser.add_argument("--events", type=int, default=4)
+    parser.add_argument("--commands", type=int, default=10)
+    parser.add_argument("--interval-ms", type=float, default=50)
+    parser.add_argument("--latency-ms", type=float, default=60)
+    parser.add_argument("--rate-limits", type=float, default=0.01)
+    parser.add_argument("--resets", type=float, default=0.01)
+    parser.add_argument("--digest-threshold", type=int, default=3)
+    parser.add_argument("--idle-sec", type=float, default=10)
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(_run(args, Path(directory)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
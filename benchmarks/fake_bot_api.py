@@ -0,0 +1,244 @@
+"""Локальная имитация Telegram Bot API для нагрузочных замеров.
+
+Сервер отвечает на методы, которыми пользуется проект: sendMessage,
+sendPhoto, getUpdates, setMyCommands, getMe и deleteWebhook. Ответы
+приходят с заданной задержкой; sendMessage и sendPhoto возвращают 429 с
+retry_after при нарушении лимитов Telegram (не больше global_rate запросов в
+секунду на бота и одного сообщения в секунду в чат) или с вероятностью
+rate_limit_probability, 403 для заблокировавших бота чатов и обрывают
+соединение с вероятностью reset_probability. Команды пользователей
+добавляются через push_command() и уходят боту через getUpdates.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+import random
+import time
+from typing import Any, Iterable
+
+from aiohttp import web
+
+
+SEND_METHODS = frozenset({"sendmessage", "sendphoto"})
+
+
+@dataclass(slots=True)
+class Delivery:
+    chat_id: int
+    method: str
+    text: str
+    at: float
+
+
+@dataclass
+class FakeBotApiStats:
+    requests: int = 0
+    delivered: int = 0
+    rate_limited: int = 0
+    forbidden: int = 0
+    resets: int = 0
+    by_chat: dict[int, int] = field(default_factory=dict)
+    by_method: dict[str, int] = field(default_factory=dict)
+    deliveries: list[Delivery] = field(default_factory=list)
+
+
+class FakeBotApi:
+    def __init__(
+        self,
+        *,
+        latency_sec: float = 0.05,
+        latency_jitter_sec: float = 0.0,
+        global_rate: int = 30,
+        chat_interval_sec: float = 1.0,
+        rate_limit_probability: float = 0.0,
+        forbidden_chats: Iterable[int] = (),
+        reset_probability: float = 0.0,
+        seed: int | None = None,
+    ):
+        self.latency_sec = latency_sec
+        self.latency_jitter_sec = latency_jitter_sec
+        self.global_rate = global_rate
+        self.chat_interval_sec = chat_interval_sec
+        self.rate_limit_probability = rate_limit_probability
+        self.forbidden_chats = frozenset(forbidden_chats)
+        self.reset_probability = reset_probability
+        self.stats = FakeBotApiStats()
+        self.url = ""
+        self._random = random.Random(seed)
+        self._recent: deque[float] = deque()
+        self._chat_last: dict[int, float] = {}
+        self._message_id = 0
+        self._updates: list[dict[str, Any]] = []
+        self._update_id = 0
+        self._updates_changed = asyncio.Condition()
+        self._runner: web.AppRunner | None = None
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def __aenter__(self) -> "FakeBotApi":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def push_command(self, chat_id: int, text: str) -> int:
+        """Имитирует сообщение пользователя; возвращает номер обновления."""
+        self._update_id += 1
+        self._message_id += 1
+        command = text.split(maxsplit=1)[0]
+        self._updates.append(
+            {
+                "update_id": self._update_id,
+                "message": {
+                    "message_id": self._message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"},
+                    "from": {"id": chat_id, "is_bot": False, "first_name": "Тест"},
+                    "text": text,
+                    "entities": (
+                        [{"type": "bot_command", "offset": 0, "length": len(command)}]
+                        if command.startswith("/")
+                        else []
+                    ),
+                },
+            }
+        )
+        async with self._updates_changed:
+            self._updates_changed.notify_all()
+        return self._update_id
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.stats.requests += 1
+        method = request.match_info["method"].lower()
+        self.stats.by_method[method] = self.stats.by_method.get(method, 0) + 1
+        data = await request.post()
+        if method == "getupdates":
+            return await self._get_updates(data)
+
+        await asyncio.sleep(
+            self.latency_sec + self._random.uniform(0, self.latency_jitter_sec)
+        )
+        if method == "getme":
+            return _ok(
+                {
+                    "id": 1,
+                    "is_bot": True,
+                    "first_name": "Benchmark",
+                    "username": "benchmark_bot",
+                }
+            )
+        if method in {"setmycommands", "deletewebhook", "setwebhook"}:
+            return _ok(True)
+        if method not in SEND_METHODS:
+            return _error(404, "Not Found")
+        return self._send(method, data, request)
+
+    def _send(
+        self,
+        method: str,
+        data: Any,
+        request: web.Request,
+    ) -> web.Response:
+        chat_id = int(data.get("chat_id", 0))
+        if self._random.random() < self.reset_probability:
+            self.stats.resets += 1
+            if request.transport is not None:
+                request.transport.abort()
+            return web.Response(status=500)
+        if chat_id in self.forbidden_chats:
+            self.stats.forbidden += 1
+            return _error(403, "Forbidden: bot was blocked by the user")
+
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= 1:
+            self._recent.popleft()
+        chat_wait = self._chat_last.get(chat_id, -1e9) + self.chat_interval_sec - now
+        if (
+            len(self._recent) >= self.global_rate
+            or chat_wait > 0
+            or self._random.random() < self.rate_limit_probability
+        ):
+            self.stats.rate_limited += 1
+            retry_after = max(1, round(chat_wait))
+            return _error(
+                429,
+                f"Too Many Requests: retry after {retry_after}",
+                parameters={"retry_after": retry_after},
+            )
+
+        self._recent.append(now)
+        self._chat_last[chat_id] = now
+        self._message_id += 1
+        self.stats.delivered += 1
+        self.stats.by_chat[chat_id] = self.stats.by_chat.get(chat_id, 0) + 1
+        message: dict[str, Any] = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        if method == "sendphoto":
+            text = str(data.get("caption", ""))
+            message["photo"] = [
+                {
+                    "file_id": f"photo-{self._message_id}",
+                    "file_unique_id": f"unique-{self._message_id}",
+                    "width": 1,
+                    "height": 1,
+                }
+            ]
+        else:
+            text = str(data.get("text", ""))
+            message["text"] = text
+        self.stats.deliveries.append(Delivery(chat_id, method, text, now))
+        return _ok(message)
+
+    async def _get_updates(self, data: Any) -> web.Response:
+        offset = int(data.get("offset") or 0)
+        timeout = float(data.get("timeout") or 0)
+        # Подтверждённые обновления Telegram больше не отдаёт.
+        self._updates = [
+            update for update in self._updates if update["update_id"] >= offset
+        ]
+        if not self._updates and timeout:
+            async with self._updates_changed:
+                try:
+                    await asyncio.wait_for(self._updates_changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        return _ok(list(self._updates))
+
+
+def _ok(result: Any) -> web.Response:
+    return web.json_response({"ok": True, "result": result})
+
+
+def _error(
+    code: int,
+    description: str,
+    parameters: dict[str, Any] | None = None,
+) -> web.Response:
+    payload: dict[str, Any] = {
+        "ok": False,
+        "error_code": code,
+        "description": description,
+    }
+    if parameters:
+        payload["parameters"] = parameters
+    return web.json_response(payload, status=code)
@@ -0,0 +1,61 @@
+"""Время фильтра на длинных описаниях, подобранных под худший случай.
+
+Запуск из корня проекта:
+
+    python -m benchmarks.filter_adversarial
+    python -m benchmarks.filter_adversarial --no-original
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from filters import evaluate_order
+from tests.test_filter_engine import ORIGINAL_PAIR_PATTERNS
+
+
+CASES = (
+    ("телеграм без «бот»", "нужно сделать телеграм интеграцию "),
+    ("«бот» без мессенджера", "разработать бот для сайта "),
+    ("чередование тг/max", "тг max срочно "),
+)
+
+
+def _text(unit: str, size: int) -> str:
+    return (unit * (size // len(unit) + 1))[:size]
+
+
+def _elapsed(callback) -> float:
+    started = time.perf_counter()
+    callback()
+    return time.perf_counter() - started
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes-kb", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument(
+        "--no-original",
+        action="store_true",
+        help="не замерять прежние шаблоны (на 200 КБ это десятки секунд)",
+    )
+    args = parser.parse_args(argv)
+
+    for name, unit in CASES:
+        print(name)
+        for size_kb in args.sizes_kb:
+            text = _text(unit, size_kb * 1024)
+            current = _elapsed(lambda: evaluate_order({"description": text}))
+            line = f"  {size_kb:>4} КБ: фильтр {current * 1000:8.1f} мс"
+            if not args.no_original:
+                original = _elapsed(
+                    lambda: [pattern.search(text) for _rule, pattern in ORIGINAL_PAIR_PATTERNS]
+                )
+                line += f", прежние шаблоны Telegram/MAX {original * 1000:10.1f} мс"
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
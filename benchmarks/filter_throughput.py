@@ -0,0 +1,58 @@
+"""Пропускная способность фильтра заявок.
+
+Запуск из корня проекта:
+
+    python -m benchmarks.filter_throughput --orders 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from filter_corpus import synthetic_orders
+from filters import evaluate_order
+from tests.test_filter_engine import reference_evaluate
+
+
+def _measure(evaluate, orders: list[dict[str, str]], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for order in orders:
+            evaluate(order)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--target-share",
+        type=float,
+        action="append",
+        help="доля целевых заявок; по умолчанию 0.05 (лента) и 1.0",
+    )
+    args = parser.parse_args(argv)
+
+    for share in args.target_share or (0.05, 1.0):
+        orders = list(synthetic_orders(args.orders, seed=args.seed, target_share=share))
+        print(f"Целевых заявок: {share:.0%}")
+        for name, evaluate in (
+            ("по одному правилу", reference_evaluate),
+            ("общий проход", evaluate_order),
+        ):
+            elapsed = _measure(evaluate, orders, args.repeats)
+            print(
+                f"  {name:>18}: {elapsed:.3f} с, "
+                f"{len(orders) / elapsed:_.0f} заявок/с, ".replace("_", " ")
+                + f"{elapsed / len(orders) * 1e6:.1f} мкс/заявка"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,86 @@
+"""Задержка от записи заявки в очередь до её чтения отправщиком.
+
+Запуск из корня проекта:
+
+    python -m benchmarks.queue_latency
+    python -m benchmarks.queue_latency --orders 50 --poll-sec 3
+
+Сравнивается прежнее ожидание BOT_POLL_SEC между проверками и пробуждение
+через inotify (только Linux). Производитель пишет из отдельного потока со
+случайными паузами, как парсер между страницами.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from pathlib import Path
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from queue_watch import QueueWatcher
+from queues import JsonlQueue
+from storage import append_segmented_jsonl
+
+
+def _produce(path: Path, orders: int, seed: int) -> None:
+    rng = random.Random(seed)
+    for order_id in range(orders):
+        time.sleep(rng.uniform(0.1, 1.5))
+        append_segmented_jsonl(path, {"order_id": str(order_id), "t": time.time()})
+
+
+async def _consume(directory: Path, mode: str, orders: int, poll_sec: float) -> list[float]:
+    path = directory / mode / "new_orders.jsonl"
+    path.parent.mkdir()
+    latencies: list[float] = []
+    producer = threading.Thread(target=_produce, args=(path, orders, 1), daemon=True)
+    with (
+        JsonlQueue(path, path.with_name("cursor.json"), 1_000_000) as queue,
+        QueueWatcher(path) as watcher,
+    ):
+        if mode == "inotify" and not watcher.active:
+            raise SystemExit("inotify недоступен на этой платформе")
+        producer.start()
+        while len(latencies) < orders:
+            for record, position in queue.read_batch():
+                latencies.append(time.time() - record["t"])
+                queue.ack(position)
+            queue.cleanup()
+            if mode == "inotify":
+                await watcher.wait(poll_sec)
+            else:
+                await asyncio.sleep(poll_sec)
+    producer.join()
+    return latencies
+
+
+def _report(mode: str, latencies: list[float]) -> None:
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, round(len(ordered) * 0.99))]
+    print(
+        f"{mode:>8}: p50 {statistics.median(ordered) * 1000:7.1f} мс, "
+        f"p99 {p99 * 1000:7.1f} мс, максимум {ordered[-1] * 1000:7.1f} мс"
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=20)
+    parser.add_argument("--poll-sec", type=float, default=3.0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("poll", "inotify"):
+            latencies = asyncio.run(
+                _consume(Path(directory), mode, args.orders, args.poll_sec)
+            )
+            _report(mode, latencies)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
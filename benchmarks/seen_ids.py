@@ -0,0 +1,94 @@
+"""Стоимость сохранения обработанных ID при большом числе сохранённых записей.
+
+Запуск из корня проекта:
+
+    python -m benchmarks.seen_ids
+    python -m benchmarks.seen_ids --sizes 1000 10000 100000 --batches 200
+"""
+
+from __future__ import annotations
+
+import argparse
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import tempfile
+import time
+
+from seen_journal import SeenIdJournal
+from storage import read_json_object, write_json_atomic
+
+
+def _seed(path: Path, size: int) -> None:
+    now = datetime.now(timezone.utc)
+    records = {
+        f"seed-{index}": (now - timedelta(seconds=index)).isoformat()
+        for index in range(size)
+    }
+    write_json_atomic(path, records)
+
+
+def _rewrite_whole_file(path: Path, ids: set[str], max_count: int) -> set[str]:
+    """Прежнее сохранение: весь файл читается, обрезается и переписывается."""
+    now = datetime.now(timezone.utc)
+    cutoff = (now - timedelta(days=180)).isoformat()
+    records = {
+        order_id: timestamp
+        for order_id, timestamp in read_json_object(path).items()
+        if isinstance(timestamp, str) and timestamp >= cutoff
+    }
+    for order_id in ids:
+        records.setdefault(order_id, now.isoformat())
+    if len(records) > max_count:
+        records = dict(
+            sorted(records.items(), key=lambda item: item[1], reverse=True)[:max_count]
+        )
+    write_json_atomic(path, records)
+    return set(records)
+
+
+def _per_order_us(elapsed: float, orders: int) -> float:
+    return elapsed / orders * 1e6
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--batches", type=int, default=200, help="партий по одной заявке")
+    parser.add_argument(
+        "--old-batches",
+        type=int,
+        default=10,
+        help="партий для прежней перезаписи всего файла",
+    )
+    args = parser.parse_args(argv)
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            old_path = Path(directory) / "old.json"
+            _seed(old_path, size)
+            ids: set[str] = set(f"seed-{index}" for index in range(size))
+            started = time.perf_counter()
+            for batch in range(args.old_batches):
+                ids.add(f"old-{batch}")
+                ids = _rewrite_whole_file(old_path, ids, max_count=size * 2)
+            old = _per_order_us(time.perf_counter() - started, args.old_batches)
+
+            path = Path(directory) / "seen_ids.json"
+            _seed(path, size)
+            with SeenIdJournal(path, retention_days=180, max_count=size * 2) as seen:
+                started = time.perf_counter()
+                for batch in range(args.batches):
+                    seen.add((f"new-{batch}",))
+                journal = _per_order_us(time.perf_counter() - started, args.batches)
+
+        print(
+            f"{size:>8} ID: перезапись файла {old:10.1f} мкс/заявка, "
+            f"журнал {journal:8.1f} мкс/заявка"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,112 @@
+"""Время загрузки и память списка обработанных ID в обоих хранилищах.
+
+Запуск из корня проекта (Linux):
+
+    python -m benchmarks.seen_ids_memory
+    python -m benchmarks.seen_ids_memory --count 1000000
+
+Подготовка файлов и загрузка каждого хранилища идут в отдельных процессах,
+чтобы пиковая память (ru_maxrss) не смешивалась.
+"""
+
+from __future__ import annotations
+
+import argparse
+from array import array
+from pathlib import Path
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from seen_journal import CompactSeenIdJournal, SeenIdJournal, write_compact_snapshot
+from storage import write_json_atomic
+
+
+BACKENDS = {"journal": SeenIdJournal, "compact": CompactSeenIdJournal}
+FIRST_ID = 60_000_000
+
+
+def _prepare(directory: Path, backend: str, count: int) -> None:
+    path = directory / backend / "seen_ids.json"
+    now = int(time.time())
+    if backend == "compact":
+        ids = array("Q", range(FIRST_ID, FIRST_ID + count))
+        epochs = array("q", (now - count + index for index in range(count)))
+        write_compact_snapshot(path.with_suffix(".bin"), ids, epochs, {})
+    else:
+        write_json_atomic(
+            path,
+            {str(FIRST_ID + index): now - count + index for index in range(count)},
+        )
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm", encoding="ascii") as stream:
+        resident_pages = int(stream.read().split()[1])
+    return resident_pages * resource.getpagesize() / 2**20
+
+
+def _peak_rss_mb() -> float:
+    # На Linux ru_maxrss указывается в килобайтах.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(backend: str, path: Path, count: int) -> None:
+    before = _rss_mb()
+    journal = BACKENDS[backend](path, max_count=count)
+    started = time.perf_counter()
+    journal.load()
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    probes = 100_000
+    hits = sum(str(FIRST_ID + index * 7) in journal for index in range(probes))
+    lookup = (time.perf_counter() - started) / probes
+    print(
+        f"{backend:>8}: {len(journal):_} ID, загрузка {loaded:5.2f} с, "
+        f"память +{_rss_mb() - before:6.1f} МБ (пик {_peak_rss_mb():6.1f} МБ), "
+        f"проверка {lookup * 1e6:4.2f} мкс, совпадений {hits}".replace("_", " ")
+    )
+    journal.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--child", choices=sorted(BACKENDS), help=argparse.SUPPRESS)
+    parser.add_argument("--prepare", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--directory", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        path = args.directory / args.child / "seen_ids.json"
+        if args.prepare:
+            _prepare(args.directory, args.child, args.count)
+        else:
+            _measure(args.child, path, args.count)
+        return 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in BACKENDS:
+            for step in (["--prepare"], []):
+                subprocess.run(
+                    [
+                        sys.executable,
+                        "-m",
+                        "benchmarks.seen_ids_memory",
+                        "--count",
+                        str(args.count),
+                        "--child",
+                        backend,
+                        "--directory",
+                        directory,
+                        *step,
+                    ],
+                    check=True,
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+"""Время рассылки одной заявки всем подписчикам открытого режима.
+
+Запуск из корня проекта:
+
+    python -m benchmarks.telegram_fanout
+    python -m benchmarks.telegram_fanout --recipients 500 --latency-ms 80
+
+Бот обращается к локальной имитации Bot API (benchmarks.fake_bot_api) с
+лимитами Telegram. Прежняя отправка по одному получателю сравнивается с
+параллельным диспетчером TelegramAudience.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+
+from audience import TelegramAudience
+from benchmarks.fake_bot_api import FakeBotApi
+from config import Settings
+
+
+async def _sequential(bot: Bot, recipients: tuple[int, ...], text: str) -> int:
+    # Прежний цикл TelegramAudience._send_to: чат после 429 пропускался.
+    delivered = 0
+    for chat_id in recipients:
+        try:
+            await bot.send_message(chat_id, text)
+            delivered += 1
+        except TelegramRetryAfter:
+            pass
+    return delivered
+
+
+async def _run(mode: str, args: argparse.Namespace) -> None:
+    async with FakeBotApi(latency_sec=args.latency_ms / 1000) as api:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(api.url))
+        bot = Bot(token="123:benchmark", session=session)
+        with tempfile.TemporaryDirectory() as directory:
+            settings = Settings.load(
+                env_file=None,
+                values={"DATA_DIR": directory, "BOT_TOKEN": "123:benchmark"},
+            )
+            audience = TelegramAudience(settings)
+            for chat_id in range(1, args.recipients + 1):
+                audience._chat_ids.add(chat_id)
+
+            started = time.perf_counter()
+            if mode == "sequential":
+                delivered = await _sequential(bot, audience.recipients, "заявка")
+            else:
+                delivered = await audience.send(bot, "заявка")
+            elapsed = time.perf_counter() - started
+        await session.close()
+    print(
+        f"{mode:>10}: {elapsed:6.2f} с, доставлено {delivered}/{args.recipients}, "
+        f"ответов 429: {api.stats.rate_limited}"
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    args = parser.parse_args(argv)
+    for mode in ("sequential", "dispatcher"):
+        asyncio.run(_run(mode, args))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,6 +4,7 @@ from dataclasses import dataclass
 import os
 from os import environ
 from pathlib import Path
+import re
 from typing import Mapping
 from urllib.parse import unquote, urlsplit
 
@@ -148,10 +149,12 @@ class Settings:
     seen_ids_path: Path
     orders_path: Path
     bot_cursor_path: Path
+    order_queue_db_path: Path
     system_events_path: Path
     system_event_cursor_path: Path
     telegram_chats_path: Path
     telegram_error_mutes_path: Path
+    telegram_outbox_path: Path
     heartbeat_path: Path
     site_cooldown_path: Path
     version_state_path: Path
@@ -162,6 +165,8 @@ class Settings:
     card_selector: str
     headless: bool
     debug_filter: bool
+    filter_rules_path: Path
+    filter_cache_size: int
     selector_timeout_ms: int
     page_timeout_ms: int
     poll_base_sec: int
@@ -172,18 +177,41 @@ class Settings:
     heartbeat_interval_sec: int
     heartbeat_stale_sec: int
     watchdog_poll_sec: int
+    loop_lag_threshold_ms: int
     min_free_disk_mb: int
     trace_on_failure: bool
     debug_retention_days: int
     queue_compact_bytes: int
+    queue_batch_max_records: int
+    queue_batch_max_bytes: int
+    cursor_commit_records: int
+    cursor_commit_ms: int
+    cursor_fsync: bool
+    order_queue_backend: str
     seen_ids_retention_days: int
     seen_ids_max_count: int
+    seen_ids_backend: str
     backup_retention_days: int
+    parser_metrics_port: int
+    service_metrics_port: int
 
     bot_token: str
     admin_chat_id: int | None
     telegram_proxy: str | None
     telegram_proxy_rdns: bool
+    telegram_rate_per_sec: int
+    telegram_concurrency: int
+    telegram_alert_rate_per_sec: int
+    telegram_alert_concurrency: int
+    telegram_webhook_url: str | None
+    telegram_webhook_host: str
+    telegram_webhook_port: int
+    telegram_webhook_secret: str
+    delivery_retry_base_sec: int
+    delivery_retry_max_sec: int
+    delivery_max_attempts: int
+    order_digest_threshold: int
+    order_digest_window_ms: int
     profi_proxy: str | None
     profi_proxy_pool_path: Path
     profi_proxy_pool: tuple[str | None, ...]
@@ -260,10 +288,12 @@ class Settings:
             seen_ids_path=data_dir / "seen_ids.json",
             orders_path=data_dir / "new_orders.jsonl",
             bot_cursor_path=data_dir / "bot_cursor.json",
+            order_queue_db_path=data_dir / "orders.sqlite3",
             system_events_path=data_dir / "system_events.jsonl",
             system_event_cursor_path=data_dir / "system_event_cursor.json",
             telegram_chats_path=data_dir / "telegram_chats.json",
             telegram_error_mutes_path=data_dir / "telegram_error_mutes.json",
+            telegram_outbox_path=data_dir / "telegram_outbox.json",
             heartbeat_path=data_dir / "heartbeat.json",
             site_cooldown_path=data_dir / "site_cooldown.json",
             version_state_path=data_dir / "version_state.json",
@@ -276,6 +306,11 @@ class Settings:
             ).strip(),
             headless=_parse_bool(values, "HEADLESS", True),
             debug_filter=_parse_bool(values, "DEBUG_FILTER", False),
+            filter_rules_path=_resolve_path(
+                project_dir,
+                values.get("FILTER_RULES_FILE", "").strip() or "filter_rules.json",
+            ),
+            filter_cache_size=_parse_int(values, "FILTER_CACHE_SIZE", 4096),
             selector_timeout_ms=_parse_int(
                 values,
                 "SELECTOR_TIMEOUT_SEC",
@@ -328,6 +363,11 @@ class Settings:
                 30,
                 minimum=10,
             ),
+            loop_lag_threshold_ms=_parse_int(
+                values,
+                "LOOP_LAG_THRESHOLD_MS",
+                250,
+            ),
             min_free_disk_mb=_parse_int(
                 values,
                 "MIN_FREE_DISK_MB",
@@ -347,6 +387,36 @@ class Settings:
                 1_000_000,
                 minimum=10_000,
             ),
+            queue_batch_max_records=_parse_int(
+                values,
+                "QUEUE_BATCH_MAX_RECORDS",
+                100,
+                minimum=1,
+            ),
+            queue_batch_max_bytes=_parse_int(
+                values,
+                "QUEUE_BATCH_MAX_BYTES",
+                256_000,
+                minimum=4_096,
+            ),
+            cursor_commit_records=_parse_int(
+                values,
+                "CURSOR_COMMIT_RECORDS",
+                20,
+                minimum=1,
+            ),
+            cursor_commit_ms=_parse_int(
+                values,
+                "CURSOR_COMMIT_MS",
+                1_000,
+                minimum=0,
+            ),
+            cursor_fsync=_parse_bool(values, "CURSOR_FSYNC", False),
+            order_queue_backend=values.get(
+                "ORDER_QUEUE_BACKEND",
+                "jsonl",
+            ).strip().lower()
+            or "jsonl",
             seen_ids_retention_days=_parse_int(
                 values,
                 "SEEN_IDS_RETENTION_DAYS",
@@ -359,12 +429,19 @@ class Settings:
                 100_000,
                 minimum=1_000,
             ),
+            seen_ids_backend=values.get(
+                "SEEN_IDS_BACKEND",
+                "journal",
+            ).strip().lower()
+            or "journal",
             backup_retention_days=_parse_int(
                 values,
                 "BACKUP_RETENTION_DAYS",
                 30,
                 minimum=1,
             ),
+            parser_metrics_port=_parse_int(values, "PARSER_METRICS_PORT", 0),
+            service_metrics_port=_parse_int(values, "SERVICE_METRICS_PORT", 0),
             bot_token=values.get("BOT_TOKEN", "").strip(),
             admin_chat_id=_parse_optional_int(values, "ADMIN_CHAT_ID"),
             telegram_proxy=proxy,
@@ -373,6 +450,73 @@ class Settings:
                 "TELEGRAM_PROXY_RDNS",
                 True,
             ),
+            telegram_rate_per_sec=_parse_int(
+                values,
+                "TELEGRAM_RATE_PER_SEC",
+                25,
+                minimum=1,
+            ),
+            telegram_concurrency=_parse_int(
+                values,
+                "TELEGRAM_CONCURRENCY",
+                16,
+                minimum=1,
+            ),
+            telegram_alert_rate_per_sec=_parse_int(
+                values,
+                "TELEGRAM_ALERT_RATE_PER_SEC",
+                5,
+                minimum=1,
+            ),
+            telegram_alert_concurrency=_parse_int(
+                values,
+                "TELEGRAM_ALERT_CONCURRENCY",
+                4,
+                minimum=1,
+            ),
+            telegram_webhook_url=values.get("TELEGRAM_WEBHOOK_URL", "").strip() or None,
+            telegram_webhook_host=values.get(
+                "TELEGRAM_WEBHOOK_HOST",
+                "127.0.0.1",
+            ).strip()
+            or "127.0.0.1",
+            telegram_webhook_port=_parse_int(
+                values,
+                "TELEGRAM_WEBHOOK_PORT",
+                8081,
+                minimum=1,
+            ),
+            telegram_webhook_secret=values.get("TELEGRAM_WEBHOOK_SECRET", "").strip(),
+            delivery_retry_base_sec=_parse_int(
+                values,
+                "DELIVERY_RETRY_BASE_SEC",
+                5,
+                minimum=1,
+            ),
+            delivery_retry_max_sec=_parse_int(
+                values,
+                "DELIVERY_RETRY_MAX_SEC",
+                600,
+                minimum=1,
+            ),
+            delivery_max_attempts=_parse_int(
+                values,
+                "DELIVERY_MAX_ATTEMPTS",
+                30,
+                minimum=1,
+            ),
+            order_digest_threshold=_parse_int(
+                values,
+                "ORDER_DIGEST_THRESHOLD",
+                3,
+                minimum=0,
+            ),
+            order_digest_window_ms=_parse_int(
+                values,
+                "ORDER_DIGEST_WINDOW_MS",
+                0,
+                minimum=0,
+            ),
             profi_proxy=profi_proxy,
             profi_proxy_pool_path=profi_proxy_pool_path,
             profi_proxy_pool=profi_proxy_pool,
@@ -557,6 +701,7 @@ class Settings:
             self.site_cooldown_path,
             self.telegram_chats_path,
             self.telegram_error_mutes_path,
+            self.telegram_outbox_path,
         ):
             if private_file.exists():
                 try:
@@ -573,6 +718,10 @@ class Settings:
             errors.append("PROFI_CARD_SELECTOR не может быть пустым")
         if not self.profi_user_agent:
             errors.append("PROFI_USER_AGENT не может быть пустым")
+        if self.order_queue_backend not in {"jsonl", "sqlite"}:
+            errors.append("ORDER_QUEUE_BACKEND должен быть jsonl или sqlite")
+        if self.seen_ids_backend not in {"journal", "compact"}:
+            errors.append("SEEN_IDS_BACKEND должен быть journal или compact")
         if not self.profi_http_impersonate:
             errors.append("PROFI_HTTP_IMPERSONATE не может быть пустым")
         if not self.profi_browser_locale:
@@ -601,5 +750,30 @@ class Settings:
             errors.append(
                 "HEARTBEAT_STALE_SEC должен быть больше HEARTBEAT_INTERVAL_SEC"
             )
+        if self.telegram_webhook_url and not self.telegram_webhook_url.startswith(
+            "https://"
+        ):
+            errors.append("TELEGRAM_WEBHOOK_URL должен начинаться с https://")
+        if self.telegram_webhook_secret and not re.fullmatch(
+            r"[A-Za-z0-9_-]{1,256}",
+            self.telegram_webhook_secret,
+        ):
+            errors.append(
+                "TELEGRAM_WEBHOOK_SECRET: допустимы латинские буквы, цифры, _ и -"
+            )
+        for name, port in (
+            ("PARSER_METRICS_PORT", self.parser_metrics_port),
+            ("SERVICE_METRICS_PORT", self.service_metrics_port),
+            ("TELEGRAM_WEBHOOK_PORT", self.telegram_webhook_port),
+        ):
+            if port > 65_535:
+                errors.append(f"{name}: номер порта должен быть не больше 65535")
+        if (
+            self.parser_metrics_port
+            and self.parser_metrics_port == self.service_metrics_port
+        ):
+            errors.append(
+                "PARSER_METRICS_PORT и SERVICE_METRICS_PORT должны различаться"
+            )
 
         return errors
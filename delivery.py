@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+import logging
+from pathlib import Path
+from typing import Any, Iterable
+
+from storage import BackgroundJsonWriter, read_json_object, write_json_atomic
+
+
+logger = logging.getLogger("parser.storage")
+
+# Предел очереди одного чата: при долгой недоступности теряются самые старые.
+MAX_PENDING_PER_CHAT = 1000
+
+
+@dataclass(slots=True)
+class ChatBacklog:
+    pending: deque[int] = field(default_factory=deque)
+    attempts: int = 0
+    next_at: float = 0.0
+
+
+class DeliveryOutbox:
+    """Недоставленные сообщения по каждому получателю.
+
+    Текст сообщения хранится в файле один раз, чаты ссылаются на него по
+    номеру, поэтому сбой у многих получателей не размножает заявку. Файл
+    переписывается только при изменении очереди; пока все чаты доступны,
+    он пуст и не трогается. С writer файл записывается в его потоке, не
+    задерживая цикл событий; add() всё же дожидается записи, потому что
+    после него очередь заявок подтверждается.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        base_delay_sec: float,
+        max_delay_sec: float,
+        max_attempts: int,
+        writer: BackgroundJsonWriter | None = None,
+    ):
+        self.path = path
+        self.base_delay_sec = base_delay_sec
+        self.max_delay_sec = max_delay_sec
+        self.max_attempts = max_attempts
+        self.writer = writer
+        self._messages: dict[int, dict[str, Any]] = {}
+        self._chats: dict[int, ChatBacklog] = {}
+        self._next_id = 1
+        self._load()
+        self._stored = self.path.exists()
+
+    def __len__(self) -> int:
+        return sum(len(backlog.pending) for backlog in self._chats.values())
+
+    def has_pending(self, chat_id: int) -> bool:
+        return chat_id in self._chats
+
+    def add(self, chat_ids: Iterable[int], message: dict[str, Any]) -> int:
+        """Ставит одно сообщение в очередь нескольких чатов; возвращает их число."""
+        chat_ids = tuple(chat_ids)
+        if not chat_ids:
+            return 0
+        message_id = self._next_id
+        self._next_id += 1
+        self._messages[message_id] = message
+        for chat_id in chat_ids:
+            backlog = self._chats.setdefault(chat_id, ChatBacklog())
+            backlog.pending.append(message_id)
+            if len(backlog.pending) > MAX_PENDING_PER_CHAT:
+                backlog.pending.popleft()
+                logger.warning(
+                    "Очередь чата %s переполнена; самое старое сообщение удалено",
+                    chat_id,
+                )
+        self._save(durable=True)
+        return len(chat_ids)
+
+    def due(self, now: float) -> dict[int, dict[str, Any]]:
+        """Первое недоставленное сообщение каждого чата, которому пора повторить."""
+        return {
+            chat_id: self._messages[backlog.pending[0]]
+            for chat_id, backlog in self._chats.items()
+            if backlog.next_at <= now
+        }
+
+    def next_due(self) -> float | None:
+        return min((backlog.next_at for backlog in self._chats.values()), default=None)
+
+    def pop(self, chat_id: int) -> None:
+        """Убирает первое сообщение чата: оно доставлено или доставить нельзя."""
+        backlog = self._chats.get(chat_id)
+        if backlog is None:
+            return
+        backlog.pending.popleft()
+        backlog.attempts = 0
+        backlog.next_at = 0.0
+        if not backlog.pending:
+            del self._chats[chat_id]
+        self._save()
+
+    def failed(self, chat_id: int, now: float, retry_after: float = 0) -> bool:
+        """Откладывает чат с экспоненциальной паузой; False — сообщение удалено."""
+        backlog = self._chats.get(chat_id)
+        if backlog is None:
+            return False
+        backlog.attempts += 1
+        if backlog.attempts >= self.max_attempts:
+            self.pop(chat_id)
+            return False
+        delay = min(
+            self.base_delay_sec * 2 ** (backlog.attempts - 1),
+            self.max_delay_sec,
+        )
+        backlog.next_at = now + max(delay, retry_after)
+        self._save()
+        return True
+
+    def drop(self, chat_id: int) -> None:
+        if self._chats.pop(chat_id, None) is not None:
+            self._save()
+
+    def _load(self) -> None:
+        if self.writer is not None:
+            self.writer.flush()
+        payload = read_json_object(self.path)
+        messages = payload.get("messages")
+        chats = payload.get("chats")
+        if not isinstance(messages, dict) or not isinstance(chats, dict):
+            return
+        for raw_id, message in messages.items():
+            try:
+                message_id = int(raw_id)
+            except ValueError:
+                continue
+            if isinstance(message, dict):
+                self._messages[message_id] = message
+        for raw_chat_id, raw_backlog in chats.items():
+            try:
+                chat_id = int(raw_chat_id)
+                pending = deque(
+                    int(message_id)
+                    for message_id in raw_backlog.get("pending", ())
+                    if int(message_id) in self._messages
+                )
+                attempts = int(raw_backlog.get("attempts", 0))
+                next_at = float(raw_backlog.get("next_at", 0.0))
+            except (AttributeError, TypeError, ValueError):
+                logger.warning("Пропущена повреждённая очередь чата в %s", self.path)
+                continue
+            if pending:
+                self._chats[chat_id] = ChatBacklog(pending, attempts, next_at)
+        self._next_id = max(self._messages, default=0) + 1
+
+    def _save(self, *, durable: bool = False) -> None:
+        referenced = {
+            message_id
+            for backlog in self._chats.values()
+            for message_id in backlog.pending
+        }
+        self._messages = {
+            message_id: message
+            for message_id, message in self._messages.items()
+            if message_id in referenced
+        }
+        if not self._chats and not self._stored:
+            return
+        # Снимок не разделяет изменяемых очередей с потоком записи.
+        payload = {
+            "messages": {
+                str(message_id): message
+                for message_id, message in self._messages.items()
+            },
+            "chats": {
+                str(chat_id): {
+                    "pending": list(backlog.pending),
+                    "attempts": backlog.attempts,
+                    "next_at": backlog.next_at,
+                }
+                for chat_id, backlog in self._chats.items()
+            },
+        }
+        self._stored = True
+        if self.writer is not None:
+            self.writer.write(self.path, payload)
+            if durable:
+                self.writer.flush()
+            return
+        try:
+            write_json_atomic(self.path, payload)
+        except OSError:
+            logger.exception("Не удалось сохранить очередь доставки: %s", self.path)
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import random
+from typing import Iterator
+
+
+# Словарь покрывает все правила filters.py и пограничные случаи: ключевые
+# слова внутри других слов, неразрывные пробелы, ё, символы, которые
+# re.IGNORECASE считает равными латинским (ı, ſ, K).
+TARGET_WORDS = (
+    "телеграм",
+    "телеграмм-бот",
+    "telegram",
+    "Telegram-бота",
+    "тг",
+    "ТГ-бот",
+    "бот",
+    "бота",
+    "ботов",
+    "bots",
+    "bot",
+    "max",
+    "MAX-бота",
+    "макс",
+    "Макс",
+    "максимум",
+    "парсер",
+    "парсинг",
+    "парсить",
+    "спарсить",
+    "распарсить",
+    "parser",
+    "parsers",
+    "parsing",
+    "parse",
+    "parſe",
+    "PARSING",
+    "crm",
+    "CRM-системы",
+    "crm система",
+    "crmсистема",
+    "црм",
+    "срм-систему",
+    "си-ар-эм",
+    "си ар эм",
+    "сиарэм",
+)
+INTENT_WORDS = (
+    "нужно",
+    "нужен",
+    "Нужна",
+    "требуется",
+    "разработать",
+    "разработка",
+    "создать",
+    "сделать",
+    "написать",
+    "доработать",
+    "настроить",
+    "настройка",
+    "интеграция",
+    "ищу",
+    "хочу",
+    "надо",
+    "заказать",
+    "внедрение",
+)
+EXCLUSION_WORDS = (
+    "таргет",
+    "таргетинг",
+    "таргетированная реклама",
+    "контекстная реклама",
+    "директ",
+    "SMM",
+    "смм",
+    "продвижение",
+    "рекламная кампания",
+    "специалист по рекламе",
+    "настройка рекламы",
+    "ведение рекламы",
+    "instagram",
+    "Instagram-аккаунт",
+    "инстаграм",
+    "insta",
+    "ınsta",
+    "whatsapp",
+    "ватсап",
+    "facebook",
+    "discord",
+    "discorder",
+)
+BUDGET_WORDS = (
+    "бюджет",
+    "Бюджет:",
+    "budget",
+    "стоимость -",
+    "цена до",
+    "цена от",
+    "price:",
+    "руб.",
+    "руб",
+    "₽",
+    "р",
+    "rub",
+    "0",
+    "000",
+    "1500",
+    "3 000",
+    "4999",
+    "5000",
+    "5 000",
+    "10 000",
+    "120000",
+    "1 000 000 000 000",
+)
+FILLER_WORDS = (
+    "для",
+    "и",
+    "на",
+    "в",
+    "сайт",
+    "магазина",
+    "каталог",
+    "данные",
+    "API",
+    "срочно",
+    "задача",
+    "клиентов",
+    "заявки",
+    "Ёлка",
+    "отчёт",
+    "K",
+    "-",
+    ",",
+    ".",
+    "\xa0",
+    "\n",
+    "  ",
+)
+NEUTRAL_WORDS = (
+    "ремонт",
+    "квартиры",
+    "покраска",
+    "стен",
+    "репетитор",
+    "по",
+    "английскому",
+    "математике",
+    "уборка",
+    "офиса",
+    "перевозка",
+    "мебели",
+    "фотограф",
+    "свадьбу",
+    "юрист",
+    "консультация",
+    "бухгалтер",
+    "отчётность",
+    "сантехник",
+    "ботокс",
+    "максимально",
+    "партнёр",
+    "срок",
+    "цифровой",
+)
+_VOCABULARY = (
+    (TARGET_WORDS, 3),
+    (INTENT_WORDS, 3),
+    (EXCLUSION_WORDS, 1),
+    (BUDGET_WORDS, 3),
+    (FILLER_WORDS, 6),
+)
+
+
+def _words(rng: random.Random, count: int, targeted: bool) -> str:
+    vocabulary = _VOCABULARY if targeted else ((NEUTRAL_WORDS, 6), *_VOCABULARY[1:])
+    groups = [group for group, _weight in vocabulary]
+    weights = [weight for _group, weight in vocabulary]
+    parts = []
+    for _ in range(count):
+        word = rng.choice(rng.choices(groups, weights)[0])
+        # Иногда слова склеиваются без пробела, чтобы проверить границы слов.
+        parts.append(word if rng.random() > 0.1 else word + rng.choice(FILLER_WORDS))
+    return " ".join(parts)
+
+
+def synthetic_orders(
+    count: int,
+    seed: int = 0,
+    target_share: float = 1.0,
+) -> Iterator[dict[str, str]]:
+    """Детерминированный набор заявок в формате orders.jsonl для проверки фильтра.
+
+    target_share — доля заявок со словами целевых тематик; в реальной ленте
+    Profi.ru их единицы процентов.
+    """
+    rng = random.Random(seed)
+    for number in range(count):
+        targeted = rng.random() < target_share
+        order = {
+            "order_id": f"synthetic-{seed}-{number}",
+            "title": _words(rng, rng.randint(2, 10), targeted),
+            "description": _words(rng, rng.randint(0, 60), targeted),
+        }
+        if rng.random() < 0.3:
+            order["price"] = f"{rng.choice(BUDGET_WORDS)} {rng.choice(BUDGET_WORDS)}"
+        yield order
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass, field
+import gzip
+import json
+from pathlib import Path
+import time
+from typing import Any, Iterable, Iterator
+
+from filters import FilterDecision, FilterRules, evaluate_order
+
+
+NO_TARGET_GROUP = "без целевого правила"
+ACCEPTED = "принята"
+
+
+def iter_jsonl_orders(paths: Iterable[Path]) -> Iterator[dict[str, Any] | None]:
+    """Построчно читает JSONL (в том числе .gz); None — повреждённая строка."""
+    for path in paths:
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8", errors="replace") as stream:
+            for line in stream:
+                if not line.strip():
+                    continue
+                try:
+                    payload = json.loads(line)
+                except json.JSONDecodeError:
+                    yield None
+                    continue
+                yield payload if isinstance(payload, dict) else None
+
+
+def decision_label(decision: FilterDecision) -> tuple[str, str]:
+    group = decision.matched_rule.group if decision.matched_rule else NO_TARGET_GROUP
+    if decision.accepted:
+        return group, ACCEPTED
+    if decision.excluded_rule:
+        return group, decision.excluded_rule.group
+    return group, "отклонена"
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+@dataclass(frozen=True, slots=True)
+class DecisionChange:
+    order_id: str
+    title: str
+    before: tuple[str, str]
+    after: tuple[str, str]
+
+
+@dataclass(slots=True)
+class ReplayReport:
+    total: int = 0
+    corrupt: int = 0
+    evaluation_seconds: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+    decisions: Counter[tuple[str, str]] = field(default_factory=Counter)
+    changed: int = 0
+    changes: list[DecisionChange] = field(default_factory=list)
+
+    @property
+    def orders_per_second(self) -> float:
+        if not self.evaluation_seconds:
+            return 0.0
+        return self.total / self.evaluation_seconds
+
+
+def replay_orders(
+    orders: Iterable[dict[str, Any] | None],
+    rules: FilterRules,
+    *,
+    candidate: FilterRules | None = None,
+    max_changes: int = 20,
+) -> ReplayReport:
+    """Прогоняет заявки через фильтр и сравнивает с кандидатом правил."""
+    report = ReplayReport()
+    clock = time.perf_counter
+    for order in orders:
+        if order is None:
+            report.corrupt += 1
+            continue
+        started = clock()
+        decision = evaluate_order(order, rules)
+        elapsed = clock() - started
+        report.total += 1
+        report.evaluation_seconds += elapsed
+        report.latencies.append(elapsed)
+        label = decision_label(decision)
+        report.decisions[label] += 1
+
+        if candidate is None:
+            continue
+        candidate_label = decision_label(evaluate_order(order, candidate))
+        if candidate_label == label:
+            continue
+        report.changed += 1
+        if len(report.changes) < max_changes:
+            report.changes.append(
+                DecisionChange(
+                    order_id=str(order.get("order_id") or "—"),
+                    title=str(order.get("title") or "")[:80],
+                    before=label,
+                    after=candidate_label,
+                )
+            )
+    report.latencies.sort()
+    return report
+
+
+def format_report(report: ReplayReport, *, with_candidate: bool = False) -> list[str]:
+    lines = [
+        f"Заявок: {report.total}; повреждённых строк: {report.corrupt}",
+        f"Скорость фильтра: {report.orders_per_second:,.0f} заявок/с".replace(",", " "),
+        "Задержка, мкс: "
+        + ", ".join(
+            f"p{int(fraction * 100)}={percentile(report.latencies, fraction) * 1e6:.1f}"
+            for fraction in (0.5, 0.9, 0.99)
+        )
+        + f", max={(report.latencies[-1] if report.latencies else 0.0) * 1e6:.1f}",
+        "",
+        "Решения по группам:",
+    ]
+    for (group, outcome), count in sorted(
+        report.decisions.items(),
+        key=lambda item: (-item[1], item[0]),
+    ):
+        lines.append(f"  {count:>8}  {group} → {outcome}")
+
+    if with_candidate:
+        lines.extend(("", f"Решение изменится у {report.changed} заявок"))
+        for change in report.changes:
+            lines.append(
+                f"  {change.order_id}: {' → '.join(change.before)} ⇒ "
+                f"{' → '.join(change.after)} | {change.title}"
+            )
+    return lines
@@ -1,204 +1,489 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Mapping
 import re
 
+from order import Order
+from text_normalize import normalize_text as _normalize_text
+from text_normalize import order_text, to_text as _to_text
 
-TELEGRAM_BOT_PATTERNS = (
-    re.compile(
-        r"(?iu)(?:"
-        r"\b(?:телеграм\w*|telegram|тг)\b.*?\b(?:бот\w*|bots?)\b|"
-        r"\b(?:бот\w*|bots?)\b.*?\b(?:телеграм\w*|telegram|тг)\b"
-        r")"
-    ),
-)
-
-MAX_BOT_PATTERNS = (
-    re.compile(
-        r"(?iu)(?:"
-        r"\b(?:макс|max)\b.*?\b(?:бот\w*|bots?)\b|"
-        r"\b(?:бот\w*|bots?)\b.*?\b(?:макс|max)\b"
-        r")"
-    ),
-)
-
-CRM_PATTERNS = (
-    re.compile(r"(?iu)\bcrm\b"),
-    re.compile(r"(?iu)\bcrm[- ]?систем\w*\b"),
-    re.compile(r"(?iu)\bцрм\b"),
-    re.compile(r"(?iu)\bцрм[- ]?систем\w*\b"),
-    re.compile(r"(?iu)\bсрм\b"),
-    re.compile(r"(?iu)\bсрм[- ]?систем\w*\b"),
-    re.compile(r"(?iu)\bси[- ]?ар[- ]?эм\b"),
-)
-
-PARSER_PATTERNS = (
-    re.compile(r"(?iu)\bпарсер\w*\b"),
-    re.compile(r"(?iu)\bпарсинг\w*\b"),
-    re.compile(r"(?iu)\bпарсить\w*\b"),
-    re.compile(r"(?iu)\bспарс\w*\b"),
-    re.compile(r"(?iu)\bраспарс\w*\b"),
-    re.compile(r"(?iu)\bparser\w*\b"),
-    re.compile(r"(?iu)\bparsing\b"),
-    re.compile(r"(?iu)\bparse\b"),
-)
-
-TARGET_PATTERN_GROUPS = (
-    ("Telegram-боты", TELEGRAM_BOT_PATTERNS),
-    ("MAX-боты", MAX_BOT_PATTERNS),
-    ("Парсеры и парсинг", PARSER_PATTERNS),
-    ("Разработка CRM", CRM_PATTERNS),
-)
-
-TARGET_KEYWORD_PATTERNS = tuple(
-    pattern
-    for _group, patterns in TARGET_PATTERN_GROUPS
-    for pattern in patterns
-)
-
-MIN_BUDGET_RUB = 5_000
-
-DEV_KEYWORDS = (
-    "разработка",
-    "разработать",
-    "разработчик",
-    "создать",
-    "создание",
-    "сделать",
-    "написать",
-    "реализовать",
-    "доработать",
-    "настроить",
-    "настройка",
-    "внедрить",
-    "внедрение",
-    "интегрировать",
-    "интеграция",
-    "нужен",
-    "нужна",
-    "нужно",
-    "нужны",
-    "требуется",
-    "требуются",
-    "необходимо",
-    "надо",
-    "ищу",
-    "заказать",
-    "хочу",
-)
-
-DISALLOWED_TOPICS = (
-    "таргет",
-    "таргетинг",
-    "таргетированная реклама",
-    "контекстная реклама",
-    "директ",
-    "smm",
-    "смм",
-    "продвижение",
-    "рекламная кампания",
-    "специалист по рекламе",
-    "настройка рекламы",
-    "ведение рекламы",
-)
-
-DISALLOWED_PLATFORM_PATTERNS = (
-    re.compile(r"(?iu)\binstagram\b"),
-    re.compile(r"(?iu)\bинстаграм\b"),
-    re.compile(r"(?iu)\binsta\b"),
-    re.compile(r"(?iu)\bwhatsapp\b"),
-    re.compile(r"(?iu)\bватсап\b"),
-    re.compile(r"(?iu)\bfacebook\b"),
-    re.compile(r"(?iu)\bdiscord\b"),
-)
-
-BUDGET_PATTERNS = (
-    re.compile(r"(?iu)(?:бюджет|budget|стоимость|цена|price)\s*[:\-]?\s*(?:от|до)?\s*(\d[\d\s]{0,12})"),
-    re.compile(r"(?iu)(\d[\d\s]{3,12})\s*(?:₽|руб\.?|р\b|rub\b)"),
-)
-
-
-def _to_text(data: Any) -> str:
-    if data is None:
+
+logger = logging.getLogger("parser.filters")
+
+
+_RULE_FLAGS = re.IGNORECASE | re.UNICODE
+_ANY_SPAN = re.compile(r"(?s).+")
+
+
+def _top_level_chars(source: str) -> Iterator[tuple[int, str]]:
+    """Позиции служебных символов регулярки вне скобок, классов и экранирования."""
+    depth = 0
+    index = 0
+    in_class = False
+    while index < len(source):
+        char = source[index]
+        if char == "\\":
+            index += 2
+            continue
+        if in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+            if source.startswith("^", index + 1):
+                index += 1
+            if source.startswith("]", index + 1):
+                index += 1
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            if depth == 0:
+                yield index, char
+            depth -= 1
+        elif depth == 0:
+            yield index, char
+        index += 1
+
+
+def _top_level_branches(source: str) -> list[str]:
+    branches: list[str] = []
+    start = 0
+    for index, char in _top_level_chars(source):
+        if char == "|":
+            branches.append(source[start:index])
+            start = index + 1
+    branches.append(source[start:])
+    return branches
+
+
+def _group_end(branch: str) -> int | None:
+    """Индекс скобки, закрывающей группу (?:...) в начале ветки."""
+    return next(
+        (3 + index for index, char in _top_level_chars(branch[3:]) if char == ")"),
+        None,
+    )
+
+
+def _leading_chars(source: str) -> str | None:
+    """Буквы, с которых может начаться совпадение, или None, если их не вывести."""
+    chars = ""
+    for branch in _top_level_branches(source):
+        branch = branch.removeprefix(r"\b")
+        if branch.startswith("(?:"):
+            end = _group_end(branch)
+            leading = _leading_chars(branch[3:end]) if end is not None else None
+        elif branch[:1].isalnum():
+            end = 0
+            leading = branch[0]
+        else:
+            return None
+        if leading is None or branch[end + 1 : end + 2] in {"?", "*", "{"}:
+            return None
+        chars += leading
+    return chars
+
+
+def _leading_letter_guard(sources: Iterable[str]) -> str:
+    """Предпросмотр первой буквы или пустая строка, если буквы не вывести."""
+    letters: set[str] = set()
+    for source in sources:
+        chars = _leading_chars(source)
+        if chars is None:
+            return ""
+        letters.update(chars)
+    if not letters:
         return ""
+    return f"(?=[{''.join(map(re.escape, sorted(letters)))}])"
+
+
+def _starts_at_word_boundary(source: str) -> bool:
+    for branch in _top_level_branches(source):
+        if branch.startswith(r"\b"):
+            continue
+        if not branch.startswith("(?:"):
+            return False
+        end = _group_end(branch)
+        if end is None or not _starts_at_word_boundary(branch[3:end]):
+            return False
+        if branch[end + 1 : end + 2] in {"?", "*", "{"}:
+            return False
+    return True
 
-    if isinstance(data, str):
-        return data
-
-    if isinstance(data, dict):
-        parts: list[str] = []
-
-        for key in (
-            "title",
-            "text",
-            "description",
-            "details",
-            "snippet",
-            "category",
-            "budget",
-            "price",
-            "amount",
-        ):
-            value = data.get(key)
-            if isinstance(value, str) and value.strip():
-                normalized_value = value.strip()
-                if key in {"budget", "price", "amount"}:
-                    parts.append(f"{key}: {normalized_value}")
-                else:
-                    parts.append(normalized_value)
-            elif isinstance(value, (int, float)):
-                if key in {"budget", "price", "amount"}:
-                    parts.append(f"{key}: {value}")
-                else:
-                    parts.append(str(value))
-
-        if not parts:
-            for value in data.values():
-                if isinstance(value, str) and value.strip():
-                    parts.append(value.strip())
-                elif isinstance(value, (int, float)):
-                    parts.append(str(value))
-
-        return "\n".join(parts)
-
-    if isinstance(data, (list, tuple, set)):
-        return "\n".join(_to_text(x) for x in data)
-
-    return str(data)
-
-
-def _normalize_text(text: str) -> str:
-    text = (text or "").lower().replace("ё", "е").replace("\xa0", " ")
-    return " ".join(text.split())
-
-
-def _find_target_match(text: str) -> tuple[re.Match[str], str] | None:
-    for group, patterns in TARGET_PATTERN_GROUPS:
-        for pattern in patterns:
-            match = pattern.search(text)
-            if match is not None:
-                return match, group
-    return None
 
+def _word_rule_body(pattern: re.Pattern[str]) -> str | None:
+    """Тело правила, если любое его совпадение начинается на границе слова."""
+    if not isinstance(pattern, re.Pattern):
+        return None
+    if pattern.flags != _RULE_FLAGS or pattern.groups:
+        return None
+    source = pattern.pattern.removeprefix("(?iu)")
+    return source if _starts_at_word_boundary(source) else None
 
-def _contains_dev_intent(text: str) -> bool:
-    return any(keyword in text for keyword in DEV_KEYWORDS)
 
+class KeywordPairRule:
+    """Два ключевых слова в одной строке в любом порядке.
 
-def _contains_disallowed_topics(text: str) -> bool:
-    return any(keyword in text for keyword in DISALLOWED_TOPICS)
+    Находит то же, что прежний шаблон из веток «A … B» и «B … A» с ленивым
+    .*?, но за один проход по вхождениям ключевых слов: на длинном описании
+    с сотнями «телеграм» и без «бот» регулярка работала квадратично.
+    first и second описывают одно слово целиком.
+    """
 
+    __slots__ = ("first", "second", "_keywords")
+
+    def __init__(self, first: str, second: str):
+        self.first = re.compile(first, _RULE_FLAGS)
+        self.second = re.compile(second, _RULE_FLAGS)
+        self._keywords = re.compile(
+            rf"\b{_leading_letter_guard((first, second))}(?:{first}|{second})\b",
+            _RULE_FLAGS,
+        )
 
-def _contains_disallowed_platforms(text: str) -> bool:
-    for rx in DISALLOWED_PLATFORM_PATTERNS:
-        if rx.search(text):
-            return True
-    return False
+    def __repr__(self) -> str:
+        return f"KeywordPairRule({self.first.pattern!r}, {self.second.pattern!r})"
+
+    def search(self, text: str) -> re.Match[str] | None:
+        start = line_end = -1
+        wants_first = wants_second = False
+        fallback_end: int | None = None
+        for hit in self._keywords.finditer(text):
+            is_first = self.first.fullmatch(hit.group()) is not None
+            is_second = self.second.fullmatch(hit.group()) is not None
+            if start >= 0 and (line_end < 0 or hit.start() < line_end):
+                if (is_second and wants_second) or (is_first and not wants_second):
+                    return _ANY_SPAN.match(text, start, hit.end())
+                if is_first and wants_first and fallback_end is None:
+                    fallback_end = hit.end()
+                continue
+            # Первое слово строки: если для него нет пары до конца строки,
+            # пары нет и у остальных слов этой строки.
+            if fallback_end is not None:
+                return _ANY_SPAN.match(text, start, fallback_end)
+            start = hit.start()
+            line_end = text.find("\n", start)
+            wants_second = is_first
+            wants_first = is_second
+        if fallback_end is not None:
+            return _ANY_SPAN.match(text, start, fallback_end)
+        return None
+
+
+class _RuleScanner:
+    """Один проход по границам слов вместо отдельного search на каждое правило.
+
+    Для каждой категории возвращает правило с наименьшим номером среди
+    найденных и текст его самого левого совпадения, как при поочерёдном
+    pattern.search(). Правила, которые нельзя привязать к границе слова,
+    проверяются отдельно.
+    """
+
+    def __init__(self, categories: tuple[tuple[re.Pattern[str], ...], ...]):
+        self._rules: dict[str, tuple[int, int]] = {}
+        self._fallback: list[list[tuple[int, re.Pattern[str]]]] = []
+        self._anchored: list[re.Pattern[str] | None] = []
+        bodies: list[str] = []
+        combined: list[str] = []
+        for category, patterns in enumerate(categories):
+            alternatives: list[str] = []
+            fallback: list[tuple[int, re.Pattern[str]]] = []
+            for index, pattern in enumerate(patterns):
+                body = _word_rule_body(pattern)
+                if body is None:
+                    fallback.append((index, pattern))
+                    continue
+                name = f"r{category}_{index}"
+                self._rules[name] = (category, index)
+                bodies.append(body)
+                alternatives.append(f"(?P<{name}>{body})")
+            self._fallback.append(fallback)
+            self._anchored.append(
+                re.compile(f"(?=(?:{'|'.join(alternatives)}))", _RULE_FLAGS)
+                if alternatives
+                else None
+            )
+            combined.extend(alternatives)
+        # Проверка первой буквы отсекает большинство границ слов до перебора
+        # всех альтернатив.
+        self._combined = (
+            re.compile(
+                rf"\b{_leading_letter_guard(bodies)}(?=(?:{'|'.join(combined)}))",
+                _RULE_FLAGS,
+            )
+            if combined
+            else None
+        )
+
+    def scan(self, text: str) -> list[tuple[int, str] | None]:
+        found: list[tuple[int, str] | None] = [None] * len(self._fallback)
+        if self._combined is not None:
+            for hit in self._combined.finditer(text):
+                category, index = self._rules[hit.lastgroup]
+                self._offer(found, category, index, hit.group(hit.lastgroup))
+                # На той же позиции могут начинаться правила других категорий:
+                # в общей альтернативе их скрывает первая сработавшая ветка.
+                for later in range(category + 1, len(found)):
+                    anchored = self._anchored[later]
+                    if anchored is None:
+                        continue
+                    extra = anchored.match(text, hit.start())
+                    if extra is not None:
+                        _category, later_index = self._rules[extra.lastgroup]
+                        self._offer(
+                            found,
+                            later,
+                            later_index,
+                            extra.group(extra.lastgroup),
+                        )
+
+        for category, fallback in enumerate(self._fallback):
+            for index, pattern in fallback:
+                current = found[category]
+                if current is not None and current[0] < index:
+                    break
+                match = pattern.search(text)
+                if match is not None:
+                    found[category] = (index, match.group(0))
+                    break
+        return found
+
+    @staticmethod
+    def _offer(
+        found: list[tuple[int, str] | None],
+        category: int,
+        index: int,
+        phrase: str,
+    ) -> None:
+        current = found[category]
+        if current is None or index < current[0]:
+            found[category] = (index, phrase)
+
+
+class FilterRulesError(ValueError):
+    """Ошибка в файле правил фильтра."""
+
+
+def _string_list(document: Mapping[str, Any], key: str) -> tuple[str, ...]:
+    value = document.get(key)
+    if not isinstance(value, list) or not all(
+        isinstance(item, str) and item for item in value
+    ):
+        raise FilterRulesError(f"{key}: ожидается список непустых строк")
+    return tuple(value)
+
+
+def _compile(source: str, key: str) -> re.Pattern[str]:
+    try:
+        return re.compile(source, _RULE_FLAGS)
+    except re.error as exc:
+        raise FilterRulesError(f"{key}: неверное выражение {source!r}: {exc}") from exc
+
+
+def _compile_target_rule(rule: Any, key: str) -> re.Pattern[str] | KeywordPairRule:
+    if isinstance(rule, str) and rule:
+        return _compile(rule, key)
+    if (
+        isinstance(rule, dict)
+        and set(rule) == {"first", "second"}
+        and all(isinstance(rule[name], str) and rule[name] for name in rule)
+    ):
+        _compile(rule["first"], key)
+        _compile(rule["second"], key)
+        return KeywordPairRule(rule["first"], rule["second"])
+    raise FilterRulesError(
+        f"{key}: правило должно быть строкой или объектом с полями first и second"
+    )
+
+
+def _rule_source(rule: re.Pattern[str] | KeywordPairRule) -> str | dict[str, str]:
+    if isinstance(rule, KeywordPairRule):
+        return {"first": rule.first.pattern, "second": rule.second.pattern}
+    return rule.pattern
+
+
+@dataclass(frozen=True, slots=True)
+class FilterRules:
+    """Скомпилированный набор правил; заменяется целиком при перезагрузке."""
+
+    target_groups: tuple[tuple[str, tuple[re.Pattern[str] | KeywordPairRule, ...]], ...]
+    dev_keywords: tuple[str, ...]
+    disallowed_topics: tuple[str, ...]
+    disallowed_platforms: tuple[re.Pattern[str], ...]
+    budget_patterns: tuple[re.Pattern[str], ...]
+    min_budget_rub: int
+    version: str = ""
+    _scanner: _RuleScanner = field(init=False, repr=False, compare=False)
+    _target_rule_groups: tuple[str, ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if not self.version:
+            canonical = json.dumps(self.to_dict(), ensure_ascii=False, sort_keys=True)
+            object.__setattr__(
+                self,
+                "version",
+                hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:12],
+            )
+        object.__setattr__(
+            self,
+            "_scanner",
+            _RuleScanner((self.target_patterns, self.disallowed_platforms)),
+        )
+        object.__setattr__(
+            self,
+            "_target_rule_groups",
+            tuple(group for group, rules in self.target_groups for _rule in rules),
+        )
+
+    @property
+    def target_patterns(self) -> tuple[re.Pattern[str] | KeywordPairRule, ...]:
+        return tuple(rule for _group, rules in self.target_groups for rule in rules)
+
+    @classmethod
+    def from_dict(cls, document: Mapping[str, Any], version: str = "") -> "FilterRules":
+        groups = document.get("target_groups")
+        if not isinstance(groups, list) or not groups:
+            raise FilterRulesError("target_groups: ожидается непустой список групп")
+        target_groups = []
+        for number, group in enumerate(groups, start=1):
+            key = f"target_groups[{number}]"
+            if (
+                not isinstance(group, dict)
+                or not isinstance(group.get("name"), str)
+                or not group["name"].strip()
+                or not isinstance(group.get("rules"), list)
+                or not group["rules"]
+            ):
+                raise FilterRulesError(f"{key}: нужны поля name и непустой список rules")
+            target_groups.append(
+                (
+                    group["name"].strip(),
+                    tuple(_compile_target_rule(rule, key) for rule in group["rules"]),
+                )
+            )
+
+        budget_patterns = tuple(
+            _compile(source, "budget_patterns")
+            for source in _string_list(document, "budget_patterns")
+        )
+        if any(pattern.groups < 1 for pattern in budget_patterns):
+            raise FilterRulesError("budget_patterns: сумма должна быть в первой группе")
+        min_budget = document.get("min_budget_rub")
+        if isinstance(min_budget, bool) or not isinstance(min_budget, int) or min_budget < 0:
+            raise FilterRulesError("min_budget_rub: ожидается неотрицательное целое число")
+
+        return cls(
+            target_groups=tuple(target_groups),
+            dev_keywords=tuple(
+                _normalize_text(keyword)
+                for keyword in _string_list(document, "dev_keywords")
+            ),
+            disallowed_topics=tuple(
+                _normalize_text(keyword)
+                for keyword in _string_list(document, "disallowed_topics")
+            ),
+            disallowed_platforms=tuple(
+                _compile(source, "disallowed_platforms")
+                for source in _string_list(document, "disallowed_platforms")
+            ),
+            budget_patterns=budget_patterns,
+            min_budget_rub=min_budget,
+            version=version,
+        )
 
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "min_budget_rub": self.min_budget_rub,
+            "target_groups": [
+                {"name": group, "rules": [_rule_source(rule) for rule in rules]}
+                for group, rules in self.target_groups
+            ],
+            "dev_keywords": list(self.dev_keywords),
+            "disallowed_topics": list(self.disallowed_topics),
+            "disallowed_platforms": [pattern.pattern for pattern in self.disallowed_platforms],
+            "budget_patterns": [pattern.pattern for pattern in self.budget_patterns],
+        }
+
+
+def load_filter_rules(path: Path) -> FilterRules:
+    """Читает и компилирует файл правил; версия — хэш самих правил."""
+    try:
+        raw = path.read_bytes()
+    except OSError as exc:
+        raise FilterRulesError(f"Не удалось прочитать правила фильтра {path}: {exc}") from exc
+    try:
+        document = json.loads(raw.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise FilterRulesError(f"{path}: файл правил не является JSON: {exc}") from exc
+    if not isinstance(document, dict):
+        raise FilterRulesError(f"{path}: ожидается JSON-объект")
+    return FilterRules.from_dict(document)
+
+
+class FilterRulesStore:
+    """Держит актуальные правила и перечитывает файл, когда меняется его mtime.
+
+    Ошибочный файл не заменяет уже загруженные правила: парсер продолжает
+    работать со старыми, пока файл не исправят.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._mtime_ns: int | None = None
+        try:
+            self._mtime_ns = path.stat().st_mtime_ns
+        except OSError:
+            pass
+        self._rules = load_filter_rules(path)
 
-def _extract_budget_value(text: str) -> int | None:
-    for rx in BUDGET_PATTERNS:
+    def current(self) -> FilterRules:
+        try:
+            mtime_ns = self.path.stat().st_mtime_ns
+        except OSError as exc:
+            if self._mtime_ns is not None:
+                logger.warning("Файл правил фильтра недоступен: %s", exc)
+                self._mtime_ns = None
+            return self._rules
+        if mtime_ns == self._mtime_ns:
+            return self._rules
+
+        self._mtime_ns = mtime_ns
+        try:
+            rules = load_filter_rules(self.path)
+        except FilterRulesError as exc:
+            logger.warning("Правила фильтра не обновлены, работают прежние: %s", exc)
+            return self._rules
+        if rules.version != self._rules.version:
+            logger.info(
+                "Правила фильтра обновлены: версия %s -> %s",
+                self._rules.version,
+                rules.version,
+            )
+        self._rules = rules
+        return rules
+
+
+DEFAULT_RULES_PATH = Path(__file__).resolve().with_name("filter_rules.json")
+DEFAULT_RULES = load_filter_rules(DEFAULT_RULES_PATH)
+
+TARGET_PATTERN_GROUPS = DEFAULT_RULES.target_groups
+TARGET_KEYWORD_PATTERNS = DEFAULT_RULES.target_patterns
+DEV_KEYWORDS = DEFAULT_RULES.dev_keywords
+DISALLOWED_TOPICS = DEFAULT_RULES.disallowed_topics
+DISALLOWED_PLATFORM_PATTERNS = DEFAULT_RULES.disallowed_platforms
+BUDGET_PATTERNS = DEFAULT_RULES.budget_patterns
+MIN_BUDGET_RUB = DEFAULT_RULES.min_budget_rub
+
+
+def _contains_dev_intent(text: str, rules: FilterRules) -> bool:
+    return any(keyword in text for keyword in rules.dev_keywords)
+
+
+def _extract_budget_value(text: str, rules: FilterRules) -> int | None:
+    for rx in rules.budget_patterns:
         match = rx.search(text)
         if not match:
             continue
@@ -219,35 +504,16 @@ def _extract_budget_value(text: str) -> int | None:
     return None
 
 
-def _budget_matches(text: str) -> bool:
-    budget = _extract_budget_value(text)
+def _budget_matches(text: str, rules: FilterRules, budget: int | None = None) -> bool:
+    if budget is None:
+        budget = _extract_budget_value(text, rules)
     if budget is None:
         return True
-    return budget >= MIN_BUDGET_RUB
-
-
-def order_matches_filter(data: Any) -> bool:
-    text = _normalize_text(_to_text(data))
-
-    if not text:
-        return False
-
-    if _find_target_match(text) is None:
-        return False
+    return budget >= rules.min_budget_rub
 
-    if not _contains_dev_intent(text):
-        return False
 
-    if _contains_disallowed_topics(text):
-        return False
-
-    if _contains_disallowed_platforms(text):
-        return False
-
-    if not _budget_matches(text):
-        return False
-
-    return True
+def order_matches_filter(data: Any, rules: FilterRules | None = None) -> bool:
+    return evaluate_order(data, rules).accepted
 
 
 @dataclass(frozen=True)
@@ -263,19 +529,34 @@ class FilterDecision:
     excluded_rule: FilterRule | None = None
 
 
-def evaluate_order(data: Any) -> FilterDecision:
-    """Объясняет решение фильтра, не изменяя исходные правила отбора."""
-    text = _normalize_text(_to_text(data))
+def _filter_input(data: Any) -> tuple[str, int | None]:
+    # Order уже несёт готовый текст и разобранную цену из карточки.
+    if isinstance(data, Order):
+        return data.filter_text, data.budget
+    return order_text(data), None
+
+
+def evaluate_order(data: Any, rules: FilterRules | None = None) -> FilterDecision:
+    """Объясняет решение фильтра; без rules используются правила по умолчанию."""
+    text, budget = _filter_input(data)
+    return _evaluate_text(text, rules or DEFAULT_RULES, budget)
+
+
+def _evaluate_text(
+    text: str,
+    rules: FilterRules,
+    budget: int | None = None,
+) -> FilterDecision:
     if not text:
         return FilterDecision(accepted=False)
 
-    target = _find_target_match(text)
+    target, platform = rules._scanner.scan(text)
     if target is None:
         return FilterDecision(accepted=False)
 
-    target_match, target_group = target
-    matched_rule = FilterRule(target_match.group(0), target_group)
-    if not _contains_dev_intent(text):
+    target_index, target_phrase = target
+    matched_rule = FilterRule(target_phrase, rules._target_rule_groups[target_index])
+    if not _contains_dev_intent(text, rules):
         return FilterDecision(
             accepted=False,
             matched_rule=matched_rule,
@@ -286,7 +567,7 @@ def evaluate_order(data: Any) -> FilterDecision:
         )
 
     disallowed_topic = next(
-        (keyword for keyword in DISALLOWED_TOPICS if keyword in text),
+        (keyword for keyword in rules.disallowed_topics if keyword in text),
         None,
     )
     if disallowed_topic:
@@ -296,32 +577,75 @@ def evaluate_order(data: Any) -> FilterDecision:
             excluded_rule=FilterRule(disallowed_topic, "Исключённая тематика"),
         )
 
-    platform_match = next(
-        (
-            match
-            for pattern in DISALLOWED_PLATFORM_PATTERNS
-            if (match := pattern.search(text))
-        ),
-        None,
-    )
-    if platform_match:
+    if platform is not None:
         return FilterDecision(
             accepted=False,
             matched_rule=matched_rule,
             excluded_rule=FilterRule(
-                platform_match.group(0),
+                platform[1],
                 "Исключённая платформа",
             ),
         )
 
-    if not _budget_matches(text):
+    if not _budget_matches(text, rules, budget):
         return FilterDecision(
             accepted=False,
             matched_rule=matched_rule,
             excluded_rule=FilterRule(
-                f"цена ниже {MIN_BUDGET_RUB:,} руб.".replace(",", " "),
+                f"цена ниже {rules.min_budget_rub:,} руб.".replace(",", " "),
                 "Бюджет",
             ),
         )
 
     return FilterDecision(accepted=True, matched_rule=matched_rule)
+
+
+class DecisionCache:
+    """LRU-кэш решений фильтра по хэшу нормализованного текста и версии правил.
+
+    Один и тот же текст приходит повторно: при DEBUG_FILTER, после истечения
+    срока хранения seen_ids и при перепубликации заявки под новым ID. Смена
+    версии правил очищает кэш.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._version: str | None = None
+        self._entries: OrderedDict[
+            tuple[str, bytes, int | None], FilterDecision
+        ] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def evaluate(self, data: Any, rules: FilterRules | None = None) -> FilterDecision:
+        rules = rules or DEFAULT_RULES
+        if self.maxsize <= 0:
+            return evaluate_order(data, rules)
+        if rules.version != self._version:
+            self._entries.clear()
+            self._version = rules.version
+
+        text, budget = _filter_input(data)
+        key = (
+            rules.version,
+            hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest(),
+            budget,
+        )
+        decision = self._entries.get(key)
+        if decision is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return decision
+
+        self.misses += 1
+        decision = _evaluate_text(text, rules, budget)
+        self._entries[key] = decision
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return decision
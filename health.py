@@ -4,7 +4,8 @@ from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
-from storage import append_jsonl
+from ipc import FRAME_EVENT, publish
+from storage import append_segmented_jsonl
 
 
 EVENT_SITE_ERROR = "site_error"
@@ -22,15 +23,13 @@ def emit_system_event(
     message: str,
     **details: Any,
 ) -> None:
-    append_jsonl(
-        path,
-        {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "type": event_type,
-            "message": message,
-            "details": details,
-        },
-    )
+    event = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "type": event_type,
+        "message": message,
+        "details": details,
+    }
+    publish(FRAME_EVENT, event, append_segmented_jsonl(path, event))
 
 
 class SiteHealthReporter:
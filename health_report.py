@@ -33,12 +33,28 @@ def _age_text(timestamp: datetime | None) -> str:
     return f"{seconds // 3600} ч. назад"
 
 
+def _counters_text(heartbeat: dict) -> str:
+    if "checks" not in heartbeat:
+        return ""
+    return (
+        f"Проверок с запуска: {heartbeat['checks']}, ошибок: {heartbeat['failures']}, "
+        f"заявок: {heartbeat['orders']}\n"
+    )
+
+
+_chromium_path: Path | None = None
+
+
 def chromium_installed() -> bool:
-    try:
-        with sync_playwright() as playwright:
-            return Path(playwright.chromium.executable_path).exists()
-    except Exception:
-        return False
+    # Запуск Playwright занимает секунды, а найденный путь к браузеру не меняется.
+    global _chromium_path
+    if _chromium_path is None:
+        try:
+            with sync_playwright() as playwright:
+                _chromium_path = Path(playwright.chromium.executable_path)
+        except Exception:
+            return False
+    return _chromium_path.exists()
 
 
 def build_health_report(
@@ -100,6 +116,7 @@ def build_health_report(
         f"Парсер: {parser_state}\n"
         f"Heartbeat: {_age_text(alive_at)}\n"
         f"Успешная проверка Profi.ru: {_age_text(success_at)}\n"
+        f"{_counters_text(heartbeat)}"
         f"{disk_icon} Свободно на диске: {free_mb} МБ\n\n"
         f"Playwright: {_package_version('playwright')}\n"
         f"curl_cffi: {_package_version('curl-cffi')}\n"
@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
 from datetime import datetime, timezone
 import logging
+import mmap
 import os
 from pathlib import Path
+import struct
 from threading import Event, Lock, Thread
-from typing import Any
+import time
+from typing import Any, Iterator
+import zlib
 
+from ipc import FRAME_HEARTBEAT, publish
 from storage import read_json_object, write_json_atomic
 
 
@@ -29,8 +35,181 @@ def parse_utc_timestamp(value: Any) -> datetime | None:
     return parsed.astimezone(timezone.utc)
 
 
+STATUS_CODES = {"starting": 0, "ok": 1, "error": 2, "paused": 3}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+PHASES = ("refresh", "wait_cards", "collect", "store")
+
+_MAGIC = b"PHB1"
+_HEADER = struct.Struct("<4sHxxQ")
+_SEQ = struct.Struct("<Q")
+_SEQ_OFFSET = 8
+_BODY = struct.Struct(f"<qddddI4xQQQQ{len(PHASES)}dH256s")
+_CRC = struct.Struct("<I")
+RECORD_SIZE = _HEADER.size + _BODY.size + _CRC.size
+
+
+def binary_heartbeat_path(path: Path) -> Path:
+    return path.with_suffix(".bin")
+
+
+def _timestamp(value: Any) -> float:
+    parsed = parse_utc_timestamp(value)
+    return parsed.timestamp() if parsed else 0.0
+
+
+def _iso(timestamp: float) -> str | None:
+    if not timestamp:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def _encode_message(message: str) -> bytes:
+    encoded = message.encode("utf-8")[:256]
+    return encoded.decode("utf-8", errors="ignore").encode("utf-8")
+
+
+class HeartbeatRecord:
+    """Запись фиксированного размера в mmap-файле, обновляемая на месте.
+
+    Запись защищена sequence lock: перед изменением счётчик становится
+    нечётным, после — снова чётным. Читатель копирует запись без блокировок
+    и повторяет чтение, если счётчик изменился или не сошлась CRC (на
+    процессорах со слабым порядком памяти Python не даёт барьеров).
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(descriptor).st_size < RECORD_SIZE:
+                os.ftruncate(descriptor, RECORD_SIZE)
+            self._map = mmap.mmap(descriptor, RECORD_SIZE)
+        finally:
+            os.close(descriptor)
+        magic, _version, seq = _HEADER.unpack_from(self._map)
+        self._seq = seq + (seq & 1) if magic == _MAGIC else 0
+        _HEADER.pack_into(self._map, 0, _MAGIC, 1, self._seq)
+
+    def write(self, payload: dict[str, Any]) -> None:
+        phases = payload.get("phases") or {}
+        message = _encode_message(str(payload.get("message") or ""))
+        body = _BODY.pack(
+            int(payload.get("pid") or 0),
+            _timestamp(payload.get("process_started_at")),
+            _timestamp(payload.get("process_alive_at")),
+            float(payload.get("alive_monotonic") or 0.0),
+            _timestamp(payload.get("last_success_at")),
+            STATUS_CODES.get(str(payload.get("status")), 0),
+            int(payload.get("checks") or 0),
+            int(payload.get("successes") or 0),
+            int(payload.get("failures") or 0),
+            int(payload.get("orders") or 0),
+            *(float(phases.get(phase) or 0.0) for phase in PHASES),
+            len(message),
+            message,
+        )
+        self._seq += 1
+        _SEQ.pack_into(self._map, _SEQ_OFFSET, self._seq)
+        self._map[_HEADER.size:_HEADER.size + _BODY.size] = body
+        _CRC.pack_into(self._map, _HEADER.size + _BODY.size, zlib.crc32(body))
+        self._seq += 1
+        _SEQ.pack_into(self._map, _SEQ_OFFSET, self._seq)
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def _decode_record(view: mmap.mmap) -> dict[str, Any] | None:
+    for _attempt in range(100):
+        magic, _version, seq = _HEADER.unpack_from(view)
+        if magic != _MAGIC:
+            return None
+        if seq & 1:
+            time.sleep(0)
+            continue
+        data = view[_HEADER.size:RECORD_SIZE]
+        if _SEQ.unpack_from(view, _SEQ_OFFSET)[0] != seq:
+            continue
+        body = data[:_BODY.size]
+        if zlib.crc32(body) != _CRC.unpack_from(data, _BODY.size)[0]:
+            continue
+        (
+            pid,
+            started,
+            alive,
+            alive_monotonic,
+            last_success,
+            status,
+            checks,
+            successes,
+            failures,
+            orders,
+            *rest,
+        ) = _BODY.unpack(body)
+        phases = dict(zip(PHASES, rest[:len(PHASES)]))
+        message_length, message = rest[len(PHASES):]
+        return {
+            "process_started_at": _iso(started),
+            "process_alive_at": _iso(alive),
+            "alive_monotonic": alive_monotonic,
+            "last_success_at": _iso(last_success),
+            "status": STATUS_NAMES.get(status, "starting"),
+            "message": message[:message_length].decode("utf-8", errors="replace"),
+            "pid": pid,
+            "checks": checks,
+            "successes": successes,
+            "failures": failures,
+            "orders": orders,
+            "phases": phases,
+        }
+    return None
+
+
+_READERS: dict[Path, tuple[int, mmap.mmap]] = {}
+_READERS_LOCK = Lock()
+
+
+def read_heartbeat_record(path: Path) -> dict[str, Any] | None:
+    """Согласованная копия двоичного heartbeat; отображение файла кешируется."""
+    try:
+        inode = path.stat().st_ino
+    except OSError:
+        return None
+    with _READERS_LOCK:
+        cached = _READERS.get(path)
+        if cached is None or cached[0] != inode:
+            if cached is not None:
+                cached[1].close()
+            try:
+                with path.open("rb") as file:
+                    view = mmap.mmap(file.fileno(), RECORD_SIZE, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                _READERS.pop(path, None)
+                return None
+            _READERS[path] = cached = (inode, view)
+        return _decode_record(cached[1])
+
+
+def heartbeat_age_seconds(heartbeat: dict[str, Any]) -> float | None:
+    """Возраст признака жизни; монотонные часы не зависят от перевода времени."""
+    alive_monotonic = heartbeat.get("alive_monotonic")
+    if isinstance(alive_monotonic, (int, float)) and alive_monotonic > 0:
+        age = time.monotonic() - alive_monotonic
+        if age >= 0:
+            return age
+    alive_at = parse_utc_timestamp(heartbeat.get("process_alive_at"))
+    if alive_at is None:
+        return None
+    return max(0.0, (datetime.now(timezone.utc) - alive_at).total_seconds())
+
+
 class HeartbeatReporter:
-    """Пишет независимый признак жизни и время последней успешной проверки."""
+    """Пишет независимый признак жизни и время последней успешной проверки.
+
+    Каждое обновление записывается на месте в двоичный heartbeat.bin;
+    JSON-копия для людей обновляется при смене состояния и по таймеру.
+    """
 
     def __init__(self, path: Path, interval_sec: int):
         self.path = path
@@ -38,18 +217,29 @@ class HeartbeatReporter:
         self._lock = Lock()
         self._stop_event = Event()
         self._thread: Thread | None = None
+        self._record: HeartbeatRecord | None = None
         previous = read_json_object(path)
         self._payload: dict[str, Any] = {
             "process_started_at": utc_now_iso(),
             "process_alive_at": utc_now_iso(),
+            "alive_monotonic": time.monotonic(),
             "last_success_at": previous.get("last_success_at"),
             "status": "starting",
             "message": "Парсер запускается",
             "pid": os.getpid(),
+            "checks": 0,
+            "successes": 0,
+            "failures": 0,
+            "orders": 0,
+            "phases": {},
         }
 
     def start(self) -> None:
-        self._write()
+        try:
+            self._record = HeartbeatRecord(binary_heartbeat_path(self.path))
+        except (OSError, ValueError):
+            logger.exception("Двоичный heartbeat недоступен; остаётся JSON")
+        self._write(export=True)
         self._thread = Thread(
             target=self._run,
             name="parser-heartbeat",
@@ -68,6 +258,11 @@ class HeartbeatReporter:
         self._stop_event.set()
         if self._thread is not None:
             self._thread.join(timeout=2)
+        with self._lock:
+            self._write_unlocked(export=True)
+            if self._record is not None:
+                self._record.close()
+                self._record = None
 
     def mark_success(self) -> None:
         now = utc_now_iso()
@@ -76,6 +271,8 @@ class HeartbeatReporter:
             last_success_at=now,
             status="ok",
             message="Страница заказов успешно проверена",
+            checks=self._payload["checks"] + 1,
+            successes=self._payload["successes"] + 1,
         )
 
     def mark_failure(self, message: str) -> None:
@@ -83,6 +280,8 @@ class HeartbeatReporter:
             process_alive_at=utc_now_iso(),
             status="error",
             message=message,
+            checks=self._payload["checks"] + 1,
+            failures=self._payload["failures"] + 1,
         )
 
     def mark_paused(self, message: str) -> None:
@@ -92,25 +291,77 @@ class HeartbeatReporter:
             message=message,
         )
 
+    def count_orders(self, count: int) -> None:
+        self._update(orders=self._payload["orders"] + count)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Запоминает длительность последнего выполнения фазы цикла."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            phases = {**self._payload["phases"], name: time.perf_counter() - started}
+            self._update(phases=phases)
+
     def _run(self) -> None:
         while not self._stop_event.wait(self.interval_sec):
-            self._update(process_alive_at=utc_now_iso())
+            with self._lock:
+                self._payload.update(
+                    process_alive_at=utc_now_iso(),
+                    alive_monotonic=time.monotonic(),
+                )
+                self._write_unlocked(export=True)
 
     def _update(self, **values: Any) -> None:
         with self._lock:
+            export = any(
+                key in values and values[key] != self._payload.get(key)
+                for key in ("status", "message")
+            )
+            if "process_alive_at" in values:
+                values["alive_monotonic"] = time.monotonic()
             self._payload.update(values)
-            self._write_unlocked()
+            self._write_unlocked(export=export)
 
-    def _write(self) -> None:
+    def _write(self, *, export: bool) -> None:
         with self._lock:
-            self._write_unlocked()
+            self._write_unlocked(export=export)
+
+    def _write_unlocked(self, *, export: bool) -> None:
+        if self._record is not None:
+            self._record.write(self._payload)
+        if self._record is None or export:
+            publish(FRAME_HEARTBEAT, dict(self._payload))
+            try:
+                write_json_atomic(self.path, self._payload)
+            except OSError:
+                logger.exception("Не удалось записать heartbeat: %s", self.path)
 
-    def _write_unlocked(self) -> None:
-        try:
-            write_json_atomic(self.path, self._payload)
-        except OSError:
-            logger.exception("Не удалось записать heartbeat: %s", self.path)
 
+def read_heartbeat(path: Path, pid: int | None = None) -> dict[str, Any]:
+    """Последний heartbeat текущего парсера.
 
-def read_heartbeat(path: Path) -> dict[str, Any]:
-    return read_json_object(path)
+    Двоичная запись берётся, если она от процесса pid или от того же запуска,
+    что и JSON-копия. Иначе heartbeat.bin может остаться от прежнего парсера,
+    и побеждает запись с более поздним process_alive_at.
+    """
+    record = read_heartbeat_record(binary_heartbeat_path(path))
+    if record is not None and pid is not None and record.get("pid") == pid:
+        # Обычный опрос watchdog: JSON-копию не читаем.
+        return record
+    document = read_json_object(path)
+    if record is None:
+        return document
+    if (
+        record.get("pid") == document.get("pid")
+        and record.get("process_started_at") == document.get("process_started_at")
+    ):
+        return record
+    record_alive = parse_utc_timestamp(record.get("process_alive_at"))
+    document_alive = parse_utc_timestamp(document.get("process_alive_at"))
+    if document_alive is not None and (
+        record_alive is None or document_alive > record_alive
+    ):
+        return document
+    return record
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+import json
+import logging
+import os
+import sys
+from threading import Lock
+from typing import Any, Callable, Iterable, Iterator
+
+from order import Order
+from storage import QueuePosition
+
+
+logger = logging.getLogger("parser.ipc")
+
+# Супервизор выставляет переменную дочернему парсеру; без неё кадры не пишутся.
+IPC_ENV = "PROFI_PARSER_IPC"
+FRAME_PREFIX = b"\x1eprofi-ipc "
+
+FRAME_ORDER = "order"
+FRAME_EVENT = "event"
+FRAME_HEARTBEAT = "heartbeat"
+
+Span = tuple[QueuePosition, QueuePosition]
+
+_write_lock = Lock()
+
+
+def ipc_enabled() -> bool:
+    return os.environ.get(IPC_ENV) == "1"
+
+
+def publish(kind: str, payload: dict[str, Any], span: Span | None = None) -> None:
+    """Передаёт кадр супервизору через stdout.
+
+    Канал не гарантирует доставку: записи уже лежат в файлах очередей, а
+    потерянный или обрезанный кадр супервизор просто пропустит.
+    """
+    if not ipc_enabled():
+        return
+    frame: dict[str, Any] = {"kind": kind, "payload": payload}
+    if span is not None:
+        start, end = span
+        frame["span"] = [start.segment, start.offset, end.segment, end.offset]
+    line = FRAME_PREFIX.decode("ascii") + json.dumps(frame, ensure_ascii=False) + "\n"
+    with _write_lock:
+        try:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+        except (OSError, ValueError):
+            pass
+
+
+def publish_records(
+    kind: str,
+    records: Iterable[dict[str, Any] | Order],
+    spans: list[Span],
+) -> None:
+    for index, record in enumerate(records):
+        payload = record.to_dict() if isinstance(record, Order) else record
+        publish(kind, payload, spans[index] if index < len(spans) else None)
+
+
+def _frame_span(frame: dict[str, Any]) -> Span | None:
+    raw = frame.get("span")
+    try:
+        start_segment, start_offset, end_segment, end_offset = (int(item) for item in raw)
+    except (TypeError, ValueError):
+        return None
+    return (
+        QueuePosition(start_segment, start_offset),
+        QueuePosition(end_segment, end_offset),
+    )
+
+
+class ParserChannel:
+    """Принимает кадры парсера из его stdout и раздаёт подписчикам.
+
+    Заявки и системные события попадают прямо в очередь отправщика и будят
+    его, последний heartbeat хранится в памяти для watchdog.
+    """
+
+    def __init__(self):
+        self.heartbeat: dict[str, Any] | None = None
+        self.frames = 0
+        self._handlers: dict[str, list[Callable[[dict[str, Any]], None]]] = {}
+
+    def feed(self, line: bytes) -> bool:
+        """Обрабатывает строку stdout; False — обычная строка журнала."""
+        if not line.startswith(FRAME_PREFIX):
+            return False
+        try:
+            frame = json.loads(line[len(FRAME_PREFIX):])
+            kind = frame["kind"]
+            payload = frame["payload"]
+        except (json.JSONDecodeError, UnicodeDecodeError, TypeError, KeyError):
+            logger.warning("Пропущен повреждённый кадр парсера")
+            return True
+        if not isinstance(payload, dict):
+            return True
+        self.frames += 1
+        if kind == FRAME_HEARTBEAT:
+            self.heartbeat = payload
+        for handler in list(self._handlers.get(kind, ())):
+            handler(frame)
+        return True
+
+    @contextmanager
+    def route(self, kind: str, queue: Any, watcher: Any) -> Iterator[None]:
+        """Пока контекст открыт, кадры kind передаются в queue и будят watcher."""
+
+        def handle(frame: dict[str, Any]) -> None:
+            span = _frame_span(frame)
+            offer = getattr(queue, "offer", None)
+            if span is not None and offer is not None:
+                offer(frame["payload"], *span)
+            watcher.notify()
+
+        handlers = self._handlers.setdefault(kind, [])
+        handlers.append(handle)
+        try:
+            yield
+        finally:
+            handlers.remove(handle)
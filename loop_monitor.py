@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from pathlib import Path
+import sys
+import threading
+import time
+import traceback
+
+from metrics import REGISTRY
+
+
+PROJECT_DIR = Path(__file__).resolve().parent
+SAMPLE_INTERVAL_SEC = 0.1
+
+LOOP_LAG = REGISTRY.histogram(
+    "profi_event_loop_lag_seconds",
+    "Опоздание цикла событий сервиса относительно заданного интервала",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+LOOP_STALLS = REGISTRY.counter(
+    "profi_event_loop_stalls",
+    "Остановки цикла событий дольше LOOP_LAG_THRESHOLD_MS",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class LoopStall:
+    lag_sec: float
+    task: str
+    location: str
+
+
+def _describe_task(task: asyncio.Task | None) -> str:
+    if task is None:
+        return "вне задачи"
+    coroutine = task.get_coro()
+    name = getattr(coroutine, "__qualname__", None) or repr(coroutine)
+    return f"{task.get_name()} ({name})"
+
+
+def _describe_frame(frame) -> str:
+    stack = traceback.extract_stack(frame)
+    if not stack:
+        return "неизвестно"
+    # Строка проекта полезнее, чем место внутри стандартной библиотеки.
+    inner = stack[-1]
+    for entry in reversed(stack):
+        path = Path(entry.filename)
+        if path.is_relative_to(PROJECT_DIR) and "site-packages" not in path.parts:
+            inner = entry
+            break
+    return f"{Path(inner.filename).name}:{inner.lineno} в {inner.name}"
+
+
+class LoopLagMonitor:
+    """Замеряет опоздание цикла событий и находит задачу, которая его держит.
+
+    Корутина run() засыпает на SAMPLE_INTERVAL_SEC и сравнивает время
+    пробуждения с ожидаемым. Отдельный поток замечает пробуждение, которое
+    задерживается дольше порога, пока цикл ещё стоит, и запоминает текущую
+    задачу и строку кода потока цикла.
+    """
+
+    def __init__(
+        self,
+        threshold_sec: float,
+        log,
+        *,
+        interval_sec: float = SAMPLE_INTERVAL_SEC,
+    ):
+        self.threshold_sec = threshold_sec
+        self.interval_sec = interval_sec
+        self.log = log
+        self.last_stall: LoopStall | None = None
+        self._expected_at = 0.0
+        self._suspect: tuple[str, str] | None = None
+        self._stopped = threading.Event()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        watcher = threading.Thread(
+            target=self._watch,
+            args=(loop, threading.get_ident()),
+            name="loop-lag-watch",
+            daemon=True,
+        )
+        self._stopped.clear()
+        watcher.start()
+        try:
+            while True:
+                self._suspect = None
+                self._expected_at = time.monotonic() + self.interval_sec
+                await asyncio.sleep(self.interval_sec)
+                lag = max(0.0, time.monotonic() - self._expected_at)
+                self._expected_at = 0.0
+                LOOP_LAG.observe(lag)
+                if lag >= self.threshold_sec:
+                    self._report(lag)
+        finally:
+            self._stopped.set()
+
+    def _report(self, lag: float) -> None:
+        task, location = self._suspect or ("не определена", "неизвестно")
+        self.last_stall = LoopStall(lag, task, location)
+        LOOP_STALLS.inc()
+        self.log.warning(
+            "Цикл событий стоял %.0f мс: задача %s, %s",
+            lag * 1000,
+            task,
+            location,
+        )
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, loop_thread: int) -> None:
+        while not self._stopped.wait(self.threshold_sec / 4):
+            expected_at = self._expected_at
+            if (
+                not expected_at
+                or self._suspect is not None
+                or time.monotonic() - expected_at < self.threshold_sec
+            ):
+                continue
+            frame = sys._current_frames().get(loop_thread)
+            self._suspect = (
+                _describe_task(asyncio.current_task(loop)),
+                _describe_frame(frame) if frame is not None else "неизвестно",
+            )
@@ -1,28 +1,60 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
 import logging
+import os
 import random
 import time
+from typing import Iterator
 
 from playwright.sync_api import sync_playwright
 
 from client import BrowserUnavailableError, ProfiClient, SiteResponseError
 from config import ConfigurationError, Settings
-from filters import evaluate_order
+from filters import (
+    DecisionCache,
+    FilterRules,
+    FilterRulesError,
+    FilterRulesStore,
+)
 from health import (
     ACCESS_CHALLENGE_EXIT_CODE,
     SESSION_EXPIRED_EXIT_CODE,
     SiteHealthReporter,
 )
 from heartbeat import HeartbeatReporter
+from ipc import FRAME_ORDER, publish_records
 from logger_setup import setup_logger
+from metrics import REGISTRY, chromium_rss_bytes, start_metrics_server
+from order import Order
 from parser import parse_order_snippet
+from queues import open_order_queue
 from site_cooldown import activate_site_cooldown
-from storage import append_jsonl, load_seen_ids, save_seen_ids
+from seen_journal import SeenIdJournal, open_seen_ids
 
 
 logger = logging.getLogger("parser")
 
+POLLS = REGISTRY.counter(
+    "profi_parser_polls",
+    "Проверки страницы заказов по результату",
+    ("result",),
+)
+PHASE_SECONDS = REGISTRY.histogram(
+    "profi_parser_phase_seconds",
+    "Длительность этапов проверки страницы заказов",
+    ("phase",),
+)
+ORDERS_FOUND = REGISTRY.counter(
+    "profi_parser_orders_found",
+    "Новые карточки заказов, переданные фильтру",
+)
+ORDER_DECISIONS = REGISTRY.counter(
+    "profi_parser_orders",
+    "Решения фильтра по целевой группе и причине исключения",
+    ("decision", "group", "reason"),
+)
+
 
 class SessionExpiredError(RuntimeError):
     pass
@@ -160,12 +192,15 @@ def _record_browser_failure(
 
 def _collect_matching_orders(
     client: ProfiClient,
-    seen_ids: set[str],
+    seen_ids: SeenIdJournal,
     *,
+    rules: FilterRules,
+    decisions: DecisionCache,
     debug_filter: bool,
-) -> list[dict]:
+) -> list[Order]:
     cards = client.cards_locator()
-    orders: list[dict] = []
+    orders: list[Order] = []
+    batch_ids: set[str] = set()
 
     for index in range(cards.count()):
         try:
@@ -174,11 +209,17 @@ def _collect_matching_orders(
             logger.exception("Не удалось разобрать карточку #%d", index + 1)
             continue
 
-        order_id = order.get("order_id")
-        if not order_id or order_id in seen_ids:
+        order_id = order.order_id
+        if not order_id or order_id in seen_ids or order_id in batch_ids:
             continue
 
-        decision = evaluate_order(order)
+        decision = decisions.evaluate(order, rules)
+        ORDERS_FOUND.inc()
+        ORDER_DECISIONS.inc(
+            decision="accepted" if decision.accepted else "rejected",
+            group=decision.matched_rule.group if decision.matched_rule else "",
+            reason=decision.excluded_rule.group if decision.excluded_rule else "",
+        )
         if debug_filter:
             logger.info(
                 "Фильтр: id=%s, принят=%s, правило=%r, исключение=%r, заголовок=%r",
@@ -186,18 +227,49 @@ def _collect_matching_orders(
                 decision.accepted,
                 decision.matched_rule.phrase if decision.matched_rule else None,
                 decision.excluded_rule.phrase if decision.excluded_rule else None,
-                order.get("title"),
+                order.title,
             )
 
         if not decision.accepted:
             continue
 
-        seen_ids.add(str(order_id))
+        batch_ids.add(order_id)
         orders.append(order)
 
     return orders
 
 
+@contextmanager
+def _metrics_endpoint(
+    settings: Settings,
+    decisions: DecisionCache,
+) -> Iterator[None]:
+    server = start_metrics_server(settings.parser_metrics_port, logger)
+    if server is None:
+        yield
+        return
+    REGISTRY.gauge_callback(
+        "profi_chromium_rss_bytes",
+        "Суммарный RSS процессов Chromium парсера",
+        lambda: chromium_rss_bytes(os.getpid()),
+    )
+    REGISTRY.gauge_callback(
+        "profi_filter_cache_lookups",
+        "Обращения к кэшу решений фильтра с момента запуска",
+        lambda: {("hit",): decisions.hits, ("miss",): decisions.misses},
+        ("result",),
+    )
+    REGISTRY.gauge_callback(
+        "profi_filter_cache_entries",
+        "Решений фильтра в кэше",
+        lambda: len(decisions),
+    )
+    try:
+        yield
+    finally:
+        server.stop()
+
+
 def run_parser(settings: Settings) -> None:
     settings.ensure_directories()
     setup_logger("parser", settings.log_dir)
@@ -211,20 +283,23 @@ def run_parser(settings: Settings) -> None:
         health.session_expired(message)
         raise SessionExpiredError(message)
 
+    filter_rules = FilterRulesStore(settings.filter_rules_path)
+    decisions = DecisionCache(settings.filter_cache_size)
     with (
+        _metrics_endpoint(settings, decisions),
         HeartbeatReporter(
             settings.heartbeat_path,
             settings.heartbeat_interval_sec,
         ) as heartbeat,
-        sync_playwright() as playwright,
-    ):
-        seen_ids = load_seen_ids(settings.seen_ids_path)
-        seen_ids = save_seen_ids(
+        open_seen_ids(
             settings.seen_ids_path,
-            seen_ids,
+            backend=settings.seen_ids_backend,
             retention_days=settings.seen_ids_retention_days,
             max_count=settings.seen_ids_max_count,
-        )
+        ) as seen_ids,
+        open_order_queue(settings) as order_queue,
+        sync_playwright() as playwright,
+    ):
         health.parser_started()
         logger.info(
             "Мониторинг запущен. Интервал: %s–%s сек.; обработано ранее: %d",
@@ -255,7 +330,8 @@ def run_parser(settings: Settings) -> None:
 
             while True:
                 try:
-                    client.soft_refresh()
+                    with PHASE_SECONDS.time(phase="refresh"), heartbeat.phase("refresh"):
+                        client.soft_refresh()
 
                     ip_limit = client.detect_ip_rotation_limit()
 
@@ -263,7 +339,9 @@ def run_parser(settings: Settings) -> None:
                     if challenge:
                         _raise_access_challenge(client, health, heartbeat, challenge)
 
-                    if not client.wait_cards():
+                    with PHASE_SECONDS.time(phase="wait_cards"), heartbeat.phase("wait_cards"):
+                        cards_visible = client.wait_cards()
+                    if not cards_visible:
                         ip_limit = client.detect_ip_rotation_limit()
                         challenge = client.detect_access_challenge()
                         if challenge:
@@ -291,6 +369,7 @@ def run_parser(settings: Settings) -> None:
                             "site_error",
                         )
                         heartbeat.mark_failure(message)
+                        POLLS.inc(result="no_cards")
                         logger.warning(
                             "Карточки не найдены; уменьшаю частоту запросов"
                         )
@@ -302,20 +381,21 @@ def run_parser(settings: Settings) -> None:
 
                     health.record_success()
                     heartbeat.mark_success()
-                    new_orders = _collect_matching_orders(
-                        client,
-                        seen_ids,
-                        debug_filter=settings.debug_filter,
-                    )
-                    if new_orders:
-                        for order in new_orders:
-                            append_jsonl(settings.orders_path, order)
-                        seen_ids = save_seen_ids(
-                            settings.seen_ids_path,
+                    POLLS.inc(result="ok")
+                    with PHASE_SECONDS.time(phase="collect"), heartbeat.phase("collect"):
+                        new_orders = _collect_matching_orders(
+                            client,
                             seen_ids,
-                            retention_days=settings.seen_ids_retention_days,
-                            max_count=settings.seen_ids_max_count,
+                            rules=filter_rules.current(),
+                            decisions=decisions,
+                            debug_filter=settings.debug_filter,
                         )
+                    if new_orders:
+                        with PHASE_SECONDS.time(phase="store"), heartbeat.phase("store"):
+                            spans = order_queue.append_many(new_orders)
+                            publish_records(FRAME_ORDER, new_orders, spans)
+                            seen_ids.add(order.order_id for order in new_orders)
+                        heartbeat.count_orders(len(new_orders))
                         logger.info("Новых подходящих заявок: %d", len(new_orders))
 
                 except SessionExpiredError:
@@ -342,6 +422,7 @@ def run_parser(settings: Settings) -> None:
                         heartbeat.mark_paused(message)
                         raise AccessChallengeError(message) from exc
                     message = f"Profi.ru ограничил запросы: HTTP {exc.status}"
+                    POLLS.inc(result="http_error")
                     _record_browser_failure(
                         health,
                         client,
@@ -357,6 +438,7 @@ def run_parser(settings: Settings) -> None:
                     continue
                 except BrowserUnavailableError as exc:
                     message = f"Ошибка браузера: {exc}"
+                    POLLS.inc(result="browser_error")
                     _record_browser_failure(
                         health,
                         client,
@@ -375,6 +457,7 @@ def run_parser(settings: Settings) -> None:
                     continue
                 except Exception as exc:
                     message = f"Ошибка получения заказов: {exc}"
+                    POLLS.inc(result="error")
                     _record_browser_failure(
                         health,
                         client,
@@ -418,6 +501,9 @@ def main() -> int:
     except ConfigurationError as exc:
         print(f"ОШИБКА НАСТРОЕК: {exc}")
         return 2
+    except FilterRulesError as exc:
+        print(f"ОШИБКА ПРАВИЛ ФИЛЬТРА: {exc}")
+        return 2
     except KeyboardInterrupt:
         print("\nПарсер остановлен пользователем.")
         return 0
@@ -8,6 +8,7 @@ from pathlib import Path
 from dotenv import dotenv_values
 
 from config import DEFAULT_ENV_FILE, Settings
+from filters import FilterRulesError, load_filter_rules
 from version import APP_VERSION
 
 
@@ -42,15 +43,17 @@ def create_safe_backup(
         if value is not None
         and not any(marker in key.upper() for marker in SECRET_NAME_MARKERS)
     }
-    filter_path = settings.project_dir / "filters.py"
-    filter_rules_source = (
-        filter_path.read_text(encoding="utf-8") if filter_path.exists() else None
-    )
+    try:
+        rules = load_filter_rules(settings.filter_rules_path)
+    except FilterRulesError as exc:
+        filter_rules = {"error": str(exc)}
+    else:
+        filter_rules = {"version": rules.version, **rules.to_dict()}
     payload = {
         "created_at": datetime.now(timezone.utc).isoformat(),
         "app_version": APP_VERSION,
         "env_without_secrets": safe_env,
-        "filter_rules_source": filter_rules_source,
+        "filter_rules": filter_rules,
     }
     backup_path = settings.backup_dir / (
         f"safe-backup-{datetime.now(timezone.utc).date().isoformat()}.json"
@@ -0,0 +1,417 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import math
+import os
+from pathlib import Path
+from threading import Lock, Thread
+import time
+from typing import Callable, Iterator, Mapping
+
+
+logger = logging.getLogger("parser.metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+CHROMIUM_PROCESS_NAMES = ("chrome", "chromium", "headless_shell")
+
+LabelValues = tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(
+    names: tuple[str, ...],
+    values: LabelValues,
+    extra: tuple[tuple[str, str], ...] = (),
+) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = Lock()
+
+    def _key(self, labels: Mapping[str, object]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name}: ожидаются метки {self.labelnames}, получено {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    @abstractmethod
+    def samples(self) -> list[str]:
+        """Строки значений метрики в текстовом формате Prometheus."""
+
+    def render(self) -> list[str]:
+        return [*self.header(), *self.samples()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        if amount < 0:
+            raise ValueError(f"{self.name}: счётчик не может уменьшаться")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: object) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def header(self) -> list[str]:
+        return [
+            f"# HELP {self.name}_total {self.documentation}",
+            f"# TYPE {self.name}_total {self.kind}",
+        ]
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0.0)]
+        return [
+            f"{self.name}_total{_format_labels(self.labelnames, key)} "
+            f"{_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def value(self, **labels: object) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class CallbackGauge(_Metric):
+    """Значение вычисляется в момент запроса /metrics."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Mapping[LabelValues, float] | float],
+        labelnames: tuple[str, ...] = (),
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def samples(self) -> list[str]:
+        try:
+            result = self.callback()
+        except Exception:
+            logger.exception("Не удалось вычислить метрику %s", self.name)
+            return []
+        items = result.items() if isinstance(result, Mapping) else (((), result),)
+        return [
+            f"{self.name}{_format_labels(self.labelnames, tuple(key))} "
+            f"{_format_value(value)}"
+            for key, value in sorted(items)
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name,
+        documentation,
+        labelnames=(),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: object) -> int:
+        with self._lock:
+            return sum(self._counts.get(self._key(labels), ()))
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(
+                (key, list(counts), self._sums[key])
+                for key, counts in self._counts.items()
+            )
+        lines: list[str] = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{_format_labels(self.labelnames, key, (('le', _format_value(bound)),))} "
+                    f"{cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик одного процесса в текстовом формате Prometheus."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, CallbackGauge):
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name,
+        documentation,
+        labelnames=(),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_callback(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Mapping[LabelValues, float] | float],
+        labelnames: tuple[str, ...] = (),
+    ) -> CallbackGauge:
+        """Регистрирует или заменяет вычисляемую метрику."""
+        return self._register(CallbackGauge(name, documentation, callback, labelnames))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] not in {"/metrics", "/"}:
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+class MetricsServer:
+    """HTTP-эндпоинт /metrics только на 127.0.0.1."""
+
+    def __init__(
+        self,
+        port: int,
+        registry: MetricsRegistry = REGISTRY,
+        host: str = "127.0.0.1",
+    ):
+        handler = type(
+            "MetricsHandler",
+            (_MetricsHandler,),
+            {"registry": registry},
+        )
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread: Thread | None = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "MetricsServer":
+        self._thread = Thread(
+            target=self._server.serve_forever,
+            name="metrics-http",
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def __enter__(self) -> "MetricsServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.stop()
+
+
+def start_metrics_server(port: int, log=None) -> MetricsServer | None:
+    """Запускает эндпоинт, если порт задан; ошибка привязки не роняет сервис."""
+    if not port:
+        return None
+    try:
+        server = MetricsServer(port).start()
+    except OSError as exc:
+        (log or logger).warning("Эндпоинт метрик 127.0.0.1:%s недоступен: %s", port, exc)
+        return None
+    (log or logger).info("Метрики доступны на http://127.0.0.1:%s/metrics", port)
+    return server
+
+
+def _child_pids(proc: Path) -> dict[int, list[int]]:
+    children: dict[int, list[int]] = {}
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            continue
+        # Имя процесса в скобках может содержать пробелы.
+        fields = stat.rsplit(")", 1)[-1].split()
+        if len(fields) < 2:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry.name))
+    return children
+
+
+def chromium_rss_bytes(root_pid: int | None, proc: Path = Path("/proc")) -> int:
+    """Суммирует RSS процессов Chromium среди потомков root_pid (только Linux)."""
+    if root_pid is None or not proc.is_dir():
+        return 0
+    page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+    children = _child_pids(proc)
+    total = 0
+    pending = list(children.get(root_pid, ()))
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, ()))
+        try:
+            name = (proc / str(pid) / "comm").read_text(encoding="utf-8").strip()
+            if not name.startswith(CHROMIUM_PROCESS_NAMES):
+                continue
+            resident_pages = int(
+                (proc / str(pid) / "statm").read_text(encoding="utf-8").split()[1]
+            )
+        except (OSError, ValueError, IndexError):
+            continue
+        total += resident_pages * page_size
+    return total
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import re
+from typing import Any, Mapping
+
+from text_normalize import order_text
+
+
+ORDER_FIELDS = (
+    "order_id",
+    "title",
+    "href",
+    "price",
+    "description",
+    "location",
+    "preferred_time",
+    "client_name",
+    "posted_ago",
+)
+
+_NUMBER = re.compile(r"\d[\d\s]*")
+_AMOUNT = r"(\d(?:[\d\s]*\d)?)"
+# Диапазон только в явном виде: «от X до Y» или «X–Y».
+_BUDGET_RANGES = (
+    re.compile(rf"от\s*{_AMOUNT}\D*?\bдо\s*{_AMOUNT}"),
+    re.compile(rf"{_AMOUNT}\s*(?:₽|руб\.?)?\s*[-–—]\s*{_AMOUNT}"),
+)
+
+
+def _optional_text(value: Any) -> str | None:
+    if value is None:
+        return None
+    text = str(value)
+    return text if text.strip() else None
+
+
+def parse_budget_range(price: str | None) -> tuple[int | None, int | None]:
+    """Границы цены из карточки: «до 5 000 ₽» → (None, 5000)."""
+    if not price:
+        return None, None
+    prefix = price.strip().lower()
+    for pattern in _BUDGET_RANGES:
+        match = pattern.match(prefix)
+        if match:
+            low, high = (int(re.sub(r"\D", "", raw)) for raw in match.groups())
+            return low, high
+    # Остальные числа — не границы: «2 500 ₽ за 60 мин» стоит 2 500 ₽.
+    numbers = [int(re.sub(r"\D", "", raw)) for raw in _NUMBER.findall(price)]
+    if not numbers:
+        return None, None
+    if prefix.startswith("до"):
+        return None, numbers[0]
+    if prefix.startswith("от"):
+        return numbers[0], None
+    return numbers[0], numbers[0]
+
+
+@dataclass(frozen=True, slots=True)
+class Order:
+    """Заявка Profi.ru, которую парсер создаёт один раз для всего конвейера.
+
+    budget_min и budget_max — границы цены из карточки. Нормализованный текст
+    для фильтра (filter_text) считается при первом обращении: отправщик,
+    которому он не нужен, восстанавливает заявку из словаря без нормализации.
+    """
+
+    order_id: str | None
+    title: str | None = None
+    href: str | None = None
+    price: str | None = None
+    description: str | None = None
+    location: str | None = None
+    preferred_time: str | None = None
+    client_name: str | None = None
+    posted_ago: str | None = None
+    budget_min: int | None = None
+    budget_max: int | None = None
+    _filter_text: str | None = field(
+        default=None,
+        init=False,
+        repr=False,
+        compare=False,
+    )
+
+    @classmethod
+    def from_dict(cls, payload: Mapping[str, Any]) -> "Order":
+        fields = {name: _optional_text(payload.get(name)) for name in ORDER_FIELDS}
+        budget_min, budget_max = parse_budget_range(fields["price"])
+        return cls(
+            **fields,
+            budget_min=budget_min,
+            budget_max=budget_max,
+        )
+
+    @property
+    def filter_text(self) -> str:
+        if self._filter_text is None:
+            fields = {name: getattr(self, name) for name in ORDER_FIELDS}
+            object.__setattr__(self, "_filter_text", order_text(fields))
+        return self._filter_text
+
+    @property
+    def budget(self) -> int | None:
+        """Сумма для ценового фильтра: нижняя граница, иначе верхняя."""
+        value = self.budget_min if self.budget_min is not None else self.budget_max
+        return value or None
+
+    def to_dict(self) -> dict[str, Any]:
+        payload = {name: getattr(self, name) for name in ORDER_FIELDS}
+        payload["budget_min"] = self.budget_min
+        payload["budget_max"] = self.budget_max
+        return payload
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Any
+from order import Order
 
 
 def normalize(value: str | None) -> str | None:
@@ -26,7 +26,7 @@ def _get_attribute(locator, name: str) -> str | None:
         return None
 
 
-def parse_order_snippet(card_locator) -> dict[str, Any]:
+def parse_order_snippet(card_locator) -> Order:
     """Извлекает данные из одной карточки заказа Profi.ru."""
     data_testid = _get_attribute(card_locator, "data-testid") or ""
     order_id = (
@@ -39,7 +39,7 @@ def parse_order_snippet(card_locator) -> dict[str, Any]:
         card_locator.locator("h3")
     )
 
-    return {
+    return Order.from_dict({
         "order_id": normalize(order_id),
         "title": title,
         "href": _get_attribute(card_locator, "href"),
@@ -51,4 +51,4 @@ def parse_order_snippet(card_locator) -> dict[str, Any]:
         ),
         "client_name": _get_text(card_locator.locator("div:has(svg) span").nth(0)),
         "posted_ago": _get_text(card_locator.locator('span:has-text("назад")').first),
-    }
+    })
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+from pathlib import Path
+import struct
+import sys
+
+
+logger = logging.getLogger("parser.storage")
+
+IN_MODIFY = 0x00000002
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Страховочная перепроверка на случай пропущенного события (например, NFS).
+RECHECK_SEC = 60.0
+
+
+def _libc() -> ctypes.CDLL | None:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class QueueWatcher:
+    """Будит отправщика сразу после записи в файл очереди.
+
+    На Linux каталог очереди отслеживается через inotify в цикле asyncio;
+    учитываются файлы, имя которых начинается с имени очереди (сегменты,
+    манифест, WAL SQLite). На других платформах wait() — пауза, которую
+    может прервать notify().
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.active = False
+        self._fd: int | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._changed = asyncio.Event()
+
+    def __enter__(self) -> "QueueWatcher":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.close()
+
+    def start(self) -> bool:
+        libc = _libc()
+        if libc is None:
+            return False
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.warning("inotify недоступен: %s", os.strerror(ctypes.get_errno()))
+            return False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        watch = libc.inotify_add_watch(
+            fd,
+            os.fsencode(self.path.parent),
+            IN_MODIFY | IN_CREATE | IN_MOVED_TO,
+        )
+        loop = asyncio.get_running_loop()
+        try:
+            if watch < 0:
+                raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+            loop.add_reader(fd, self._drain)
+        except (OSError, NotImplementedError) as exc:
+            os.close(fd)
+            logger.warning("Слежение за очередью %s недоступно: %s", self.path, exc)
+            return False
+        self._fd, self._loop, self.active = fd, loop, True
+        return True
+
+    def close(self) -> None:
+        if self._fd is None:
+            return
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.remove_reader(self._fd)
+        os.close(self._fd)
+        self._fd, self._loop, self.active = None, None, False
+
+    def notify(self) -> None:
+        """Будит ожидающего отправщика (например, по кадру от парсера)."""
+        self._changed.set()
+
+    async def wait(self, poll_sec: float) -> None:
+        """Ждёт изменения очереди или notify(); без inotify — не дольше poll_sec."""
+        timeout = max(poll_sec, RECHECK_SEC) if self.active else poll_sec
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._changed.clear()
+
+    def _drain(self) -> None:
+        prefix = os.fsencode(self.path.name)
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            if not data:
+                return
+            offset = 0
+            while offset < len(data):
+                _wd, _mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if name.startswith(prefix):
+                    self._changed.set()
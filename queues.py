@@ -0,0 +1,397 @@
+from __future__ import annotations
+
+from collections import deque
+from contextlib import contextmanager
+import json
+import logging
+from pathlib import Path
+import sqlite3
+from threading import Lock
+from typing import Any, Iterable, Iterator
+
+from config import Settings
+from instance_lock import InterProcessFileLock
+from order import Order
+from storage import (
+    DEFAULT_BATCH_BYTES,
+    DEFAULT_BATCH_RECORDS,
+    CursorWriter,
+    JsonlBatchReader,
+    QueuePosition,
+    append_segmented_jsonl,
+    drop_consumed_segments,
+    iter_segmented_batch,
+    load_queue_position,
+    queue_end,
+    read_segmented_batch,
+    save_queue_position,
+    segmented_lag_bytes,
+    segmented_start,
+)
+
+
+logger = logging.getLogger("parser.storage")
+
+QueueRecord = tuple[dict[str, Any] | None, QueuePosition | int]
+
+
+def _payload(record: dict[str, Any] | Order) -> dict[str, Any]:
+    return record.to_dict() if isinstance(record, Order) else record
+
+
+class JsonlQueue:
+    """Сегментированная JSONL-очередь с позицией читателя в отдельном файле.
+
+    Заполненные сегменты удаляются, как только читатель перешёл дальше, даже
+    если он ещё не догнал головной сегмент. read_batch() читает записи
+    потоком, не больше max_records строк и max_bytes байт за раз.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        cursor_path: Path,
+        segment_bytes: int,
+        *,
+        max_records: int = DEFAULT_BATCH_RECORDS,
+        max_bytes: int = DEFAULT_BATCH_BYTES,
+        commit_every: int = 1,
+        commit_interval_sec: float = 0.0,
+        fsync: bool = False,
+    ):
+        self.path = path
+        self.cursor_path = cursor_path
+        self.segment_bytes = segment_bytes
+        self._cursor = CursorWriter(
+            cursor_path,
+            every=commit_every,
+            interval_sec=commit_interval_sec,
+            fsync=fsync,
+        )
+        self.position = self._cursor.committed
+        self._reader = JsonlBatchReader(max_records, max_bytes)
+        self._offered: deque[tuple[dict[str, Any], QueuePosition, QueuePosition]] = (
+            deque(maxlen=max_records)
+        )
+
+    @property
+    def batch_limited(self) -> bool:
+        """Последняя порция упёрлась в лимит: в очереди могут остаться записи."""
+        return self._reader.limited
+
+    def __enter__(self) -> "JsonlQueue":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._cursor.close()
+
+    def append(
+        self,
+        record: dict[str, Any] | Order,
+    ) -> tuple[QueuePosition, QueuePosition]:
+        return append_segmented_jsonl(self.path, record, self.segment_bytes)
+
+    def append_many(
+        self,
+        records: Iterable[dict[str, Any] | Order],
+    ) -> list[tuple[QueuePosition, QueuePosition]]:
+        """Добавляет записи; возвращает позиции начала и конца каждой."""
+        return [self.append(record) for record in records]
+
+    def offer(
+        self,
+        record: dict[str, Any],
+        start: QueuePosition,
+        end: QueuePosition,
+    ) -> None:
+        """Запись, полученная от парсера напрямую; файл остаётся источником истины.
+
+        Если записи идут подряд от текущей позиции, read_batch() отдаёт их без
+        чтения файла; при любом разрыве очередь читается из файла как обычно.
+        """
+        self._offered.append((record, start, end))
+
+    def skip_existing(self) -> bool:
+        """Новый читатель начинает с конца очереди; True, если что-то пропущено."""
+        if self.position != QueuePosition():
+            return False
+        end = queue_end(self.path)
+        if end == self.position:
+            return False
+        self.ack(end)
+        return True
+
+    def read_batch(self) -> Iterator[QueueRecord]:
+        while self._offered and self._offered[0][2] <= self.position:
+            self._offered.popleft()
+        if self._offered and self._offered[0][1] == self.position:
+            self._reader.start()
+            return self._read_offered()
+        start = segmented_start(self.path, self.position)
+        if start != self.position:
+            self.ack(start)
+        return iter_segmented_batch(self.path, start, self._reader)
+
+    def _read_offered(self) -> Iterator[QueueRecord]:
+        position = self.position
+        for record, start, end in list(self._offered):
+            if start != position:
+                break
+            yield record, end
+            position = end
+
+    def ack(self, position: QueuePosition) -> None:
+        self.position = position
+        self._cursor.update(position)
+
+    def cleanup(self) -> None:
+        """Сохраняет позицию и удаляет сегменты до сохранённой позиции."""
+        self._cursor.flush()
+        drop_consumed_segments(self.path, self._cursor.committed)
+
+    def lag_bytes(self) -> int:
+        return segmented_lag_bytes(self.path, load_queue_position(self.cursor_path))
+
+
+class SqliteQueue:
+    """Очередь в SQLite (WAL): записи и позиции читателей в одной базе.
+
+    Добавление и подтверждение — короткие транзакции по первичному ключу,
+    поэтому парсер и отправщик работают с базой одновременно без файловых
+    блокировок. cleanup() удаляет прочитанные всеми читателями записи
+    порциями, не дожидаясь, пока очередь опустеет целиком.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        consumer: str = "telegram",
+        batch_size: int = 100,
+        cleanup_batch: int = 500,
+    ):
+        self.path = path
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.cleanup_batch = cleanup_batch
+        self.batch_limited = False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+        self._connection = sqlite3.connect(
+            path,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        path.chmod(0o600)
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS records (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS consumers (
+                    name TEXT PRIMARY KEY,
+                    position INTEGER NOT NULL
+                );
+                """
+            )
+
+    def __enter__(self) -> "SqliteQueue":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def append(self, record: dict[str, Any] | Order) -> list[Any]:
+        return self.append_many((record,))
+
+    def append_many(self, records: Iterable[dict[str, Any] | Order]) -> list[Any]:
+        """Добавляет записи одной транзакцией; позиции для канала не сообщаются."""
+        rows = [
+            (json.dumps(_payload(record), ensure_ascii=False),)
+            for record in records
+        ]
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.executemany(
+                "INSERT INTO records (payload) VALUES (?)",
+                rows,
+            )
+        return []
+
+    def position(self) -> int | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT position FROM consumers WHERE name = ?",
+                (self.consumer,),
+            ).fetchone()
+        return None if row is None else int(row[0])
+
+    def skip_existing(self) -> bool:
+        """Новый читатель начинает с конца очереди; True, если что-то пропущено."""
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            registered = self._connection.execute(
+                "SELECT 1 FROM consumers WHERE name = ?",
+                (self.consumer,),
+            ).fetchone()
+            if registered:
+                return False
+            last_seq = self._last_seq()
+            self._connection.execute(
+                "INSERT INTO consumers (name, position) VALUES (?, ?)",
+                (self.consumer, last_seq),
+            )
+        return last_seq > 0
+
+    def read_batch(self) -> list[QueueRecord]:
+        position = self.position() or 0
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT seq, payload FROM records WHERE seq > ? ORDER BY seq LIMIT ?",
+                (position, self.batch_size),
+            ).fetchall()
+        self.batch_limited = len(rows) == self.batch_size
+        records: list[QueueRecord] = []
+        for seq, payload in rows:
+            try:
+                record = json.loads(payload)
+            except json.JSONDecodeError:
+                record = None
+            records.append((record if isinstance(record, dict) else None, int(seq)))
+        return records
+
+    def ack(self, position: int) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO consumers (name, position) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET "
+                "position = max(position, excluded.position)",
+                (self.consumer, position),
+            )
+
+    def cleanup(self) -> int:
+        """Удаляет одну порцию записей, прочитанных всеми читателями."""
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            (consumed,) = self._connection.execute(
+                "SELECT min(position) FROM consumers"
+            ).fetchone()
+            if consumed is None:
+                return 0
+            cursor = self._connection.execute(
+                "DELETE FROM records WHERE seq IN ("
+                "SELECT seq FROM records WHERE seq <= ? ORDER BY seq LIMIT ?)",
+                (consumed, self.cleanup_batch),
+            )
+            return cursor.rowcount
+
+    def lag_bytes(self) -> int:
+        position = self.position() or 0
+        with self._lock:
+            (lag,) = self._connection.execute(
+                "SELECT coalesce(sum(length(CAST(payload AS BLOB)) + 1), 0) "
+                "FROM records WHERE seq > ?",
+                (position,),
+            ).fetchone()
+        return int(lag)
+
+    def import_jsonl(self, path: Path, cursor_path: Path) -> int:
+        """Переносит непрочитанный хвост JSONL-очереди при переходе на SQLite."""
+        if not path.exists() and not any(path.parent.glob(f"{path.name}.*")):
+            return 0
+        lock_path = path.with_name(f".{path.name}.lock")
+        with InterProcessFileLock(lock_path):
+            records, _start = read_segmented_batch(
+                path,
+                load_queue_position(cursor_path),
+            )
+            payloads = [record for record, _next in records if record is not None]
+            if self.position() is None:
+                # Читатель уже был у JSONL-очереди: перенесённое не пропускаем.
+                with self._lock:
+                    last_seq = self._last_seq()
+                self.ack(last_seq)
+            if payloads:
+                self.append_many(payloads)
+            end = queue_end(path)
+            if path.exists():
+                path.write_text("", encoding="utf-8")
+            save_queue_position(cursor_path, QueuePosition(end.segment, 0))
+            drop_consumed_segments(path, QueuePosition(end.segment, 0))
+        if payloads:
+            logger.info("В SQLite-очередь перенесено заявок: %d", len(payloads))
+        return len(payloads)
+
+    def _last_seq(self) -> int:
+        # sqlite_sequence хранит последний выданный номер даже после очистки.
+        row = self._connection.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'records'"
+        ).fetchone()
+        return int(row[0]) if row else 0
+
+
+# Очереди, которые сейчас читают отправщики. Метрика отставания берёт их
+# экземпляры и не открывает очередь заново на каждый запрос /metrics.
+_PUBLISHED: dict[str, JsonlQueue | SqliteQueue] = {}
+
+
+@contextmanager
+def publish_lag(name: str, queue: JsonlQueue | SqliteQueue) -> Iterator[None]:
+    _PUBLISHED[name] = queue
+    try:
+        yield
+    finally:
+        if _PUBLISHED.get(name) is queue:
+            del _PUBLISHED[name]
+
+
+def published_lag_bytes() -> dict[tuple[str, ...], float]:
+    """Непрочитанный объём открытых отправщиками очередей по имени."""
+    return {
+        (name,): float(queue.lag_bytes())
+        for name, queue in list(_PUBLISHED.items())
+    }
+
+
+def open_order_queue(settings: Settings) -> JsonlQueue | SqliteQueue:
+    """Очередь заявок между парсером и Telegram по ORDER_QUEUE_BACKEND."""
+    if settings.order_queue_backend == "sqlite":
+        return SqliteQueue(
+            settings.order_queue_db_path,
+            batch_size=settings.queue_batch_max_records,
+        )
+    return JsonlQueue(
+        settings.orders_path,
+        settings.bot_cursor_path,
+        settings.queue_compact_bytes,
+        max_records=settings.queue_batch_max_records,
+        max_bytes=settings.queue_batch_max_bytes,
+        commit_every=settings.cursor_commit_records,
+        commit_interval_sec=settings.cursor_commit_ms / 1000,
+        fsync=settings.cursor_fsync,
+    )
+
+
+def open_system_event_queue(settings: Settings) -> JsonlQueue:
+    return JsonlQueue(
+        settings.system_events_path,
+        settings.system_event_cursor_path,
+        settings.queue_compact_bytes,
+        max_records=settings.queue_batch_max_records,
+        max_bytes=settings.queue_batch_max_bytes,
+        commit_every=settings.cursor_commit_records,
+        commit_interval_sec=settings.cursor_commit_ms / 1000,
+        fsync=settings.cursor_fsync,
+    )
@@ -10,15 +10,27 @@ from typing import Any
 
 from aiogram import Bot
 from aiogram.enums import ParseMode
-from aiogram.exceptions import TelegramRetryAfter
 
 from audience import TelegramAudience
 from config import ConfigurationError, Settings
 from health import ACCESS_CHALLENGE_EXIT_CODE, SESSION_EXPIRED_EXIT_CODE
 from instance_lock import AlreadyRunningError, SingleInstanceLock
+from ipc import FRAME_ORDER, IPC_ENV, ParserChannel
 from lifecycle import notify_service_started, notify_service_stopped
 from logger_setup import setup_logger
 from maintenance import maintenance_loop
+from loop_monitor import LoopLagMonitor
+from metrics import REGISTRY, chromium_rss_bytes, start_metrics_server
+from order import Order
+from queue_watch import QueueWatcher
+from queues import (
+    JsonlQueue,
+    QueueRecord,
+    SqliteQueue,
+    open_order_queue,
+    publish_lag,
+    published_lag_bytes,
+)
 from runtime_control import ParserPauseControl
 from session_recovery import SessionRecoveryManager
 from site_cooldown import (
@@ -26,31 +38,39 @@ from site_cooldown import (
     format_remaining_time,
     load_site_cooldown,
 )
-from storage import (
-    compact_jsonl_if_consumed,
-    load_cursor,
-    read_jsonl_batch,
-    save_cursor,
-)
 from telegram_control import (
     system_event_notifier,
     telegram_command_polling,
 )
 from telegram_transport import create_telegram_session
-from tg_formatter import format_order
+from tg_formatter import format_order, pack_digests
 from watchdog import heartbeat_watchdog
 
 
 CURRENT_PARSER_PROCESS: Process | None = None
 PARSER_RESTART_REQUESTED = False
+# Кадр IPC с длинным описанием заявки не помещается в стандартные 64 КБ.
+PARSER_OUTPUT_LIMIT = 4 * 1024 * 1024
 
+PARSER_RESTARTS = REGISTRY.counter(
+    "profi_parser_restarts",
+    "Перезапуски процесса парсера по причине",
+    ("reason",),
+)
 
-def read_order_batch(
-    path: Path,
-    offset: int,
-) -> tuple[list[tuple[dict[str, Any] | None, int]], int]:
-    """Совместимое имя для чтения очереди заказов."""
-    return read_jsonl_batch(path, offset)
+
+def _register_service_metrics() -> None:
+    REGISTRY.gauge_callback(
+        "profi_queue_lag_bytes",
+        "Байты очереди, ещё не обработанные отправкой в Telegram",
+        published_lag_bytes,
+        ("queue",),
+    )
+    REGISTRY.gauge_callback(
+        "profi_chromium_rss_bytes",
+        "Суммарный RSS процессов Chromium дочернего парсера",
+        lambda: chromium_rss_bytes(parser_pid()),
+    )
 
 
 def request_parser_restart() -> None:
@@ -89,7 +109,11 @@ async def _send_error_with_screenshot(
     *,
     since: float,
 ) -> int:
-    screenshot = _latest_debug_screenshot(settings, since=since)
+    screenshot = await asyncio.to_thread(
+        _latest_debug_screenshot,
+        settings,
+        since=since,
+    )
     if screenshot is not None:
         return await audience.send_error_photo(bot, str(screenshot), text)
     return await audience.send_error(bot, text)
@@ -99,6 +123,7 @@ async def start_parser_process(settings: Settings, log) -> Process:
     environment = os.environ.copy()
     environment["PYTHONUTF8"] = "1"
     environment["PYTHONIOENCODING"] = "utf-8"
+    environment[IPC_ENV] = "1"
 
     for key in (
         "LD_PRELOAD",
@@ -117,6 +142,7 @@ async def start_parser_process(settings: Settings, log) -> Process:
         stderr=asyncio.subprocess.STDOUT,
         cwd=str(settings.project_dir),
         env=environment,
+        limit=PARSER_OUTPUT_LIMIT,
     )
 
     global CURRENT_PARSER_PROCESS
@@ -125,11 +151,18 @@ async def start_parser_process(settings: Settings, log) -> Process:
     return process
 
 
-async def pipe_process_output(process: Process, log) -> None:
+async def pipe_process_output(
+    process: Process,
+    log,
+    channel: ParserChannel | None = None,
+) -> None:
+    """Пишет вывод парсера в журнал, передавая кадры IPC в channel."""
     if process.stdout is None:
         return
 
     while line := await process.stdout.readline():
+        if channel is not None and channel.feed(line):
+            continue
         log.info("[ПАРСЕР] %s", line.decode("utf-8", errors="replace").rstrip())
 
 
@@ -188,26 +221,34 @@ async def wait_for_active_site_cooldown(
 
 async def send_order_message(
     bot: Bot,
-    settings: Settings,
-    log,
     text: str,
     audience: TelegramAudience,
 ) -> bool:
-    while True:
-        try:
-            delivered = await audience.send(
-                bot,
-                text,
-                parse_mode=ParseMode.HTML,
-                disable_web_page_preview=True,
-            )
-            if delivered == 0:
-                return False
-            await asyncio.sleep(1)
-            return True
-        except TelegramRetryAfter as exc:
-            log.warning("Лимит Telegram; повтор через %s сек.", exc.retry_after)
-            await asyncio.sleep(exc.retry_after + 2)
+    """Рассылает заявку; недоставленное остаётся в очереди своего чата."""
+    delivered = await audience.send_order(
+        bot,
+        text,
+        parse_mode=ParseMode.HTML,
+        disable_web_page_preview=True,
+    )
+    return delivered > 0
+
+
+async def _read_order_burst(
+    queue: JsonlQueue | SqliteQueue,
+    settings: Settings,
+) -> list[QueueRecord]:
+    """Порция заявок; с ORDER_DIGEST_WINDOW_MS одиночная ждёт соседних."""
+    records = list(queue.read_batch())
+    if (
+        settings.order_digest_threshold
+        and settings.order_digest_window_ms
+        and 0 < len(records) < settings.order_digest_threshold
+        and not queue.batch_limited
+    ):
+        await asyncio.sleep(settings.order_digest_window_ms / 1000)
+        records = list(queue.read_batch())
+    return records
 
 
 async def order_notifier(
@@ -215,58 +256,96 @@ async def order_notifier(
     bot: Bot,
     log,
     audience: TelegramAudience | None = None,
+    channel: ParserChannel | None = None,
 ) -> None:
     audience = audience or TelegramAudience(settings, log)
-    offset = load_cursor(settings.bot_cursor_path)
+    channel = channel or ParserChannel()
+    with (
+        open_order_queue(settings) as queue,
+        QueueWatcher(queue.path) as watcher,
+        channel.route(FRAME_ORDER, queue, watcher),
+        publish_lag("orders", queue),
+    ):
+        if isinstance(queue, SqliteQueue):
+            queue.import_jsonl(settings.orders_path, settings.bot_cursor_path)
+        if audience.has_recipients and queue.skip_existing():
+            log.info("Существующие заявки пропущены; ожидаю новые")
 
-    if offset == 0 and settings.orders_path.exists() and audience.has_recipients:
-        offset = settings.orders_path.stat().st_size
-        save_cursor(settings.bot_cursor_path, offset)
-        log.info("Существующие заявки пропущены; ожидаю новые")
+        log.info("Отправка заявок в Telegram запущена")
+        while True:
+            try:
+                if not audience.has_recipients:
+                    log.info("Ожидаю первого получателя Telegram")
+                    await audience.wait_until_available()
 
-    log.info("Отправка заявок в Telegram запущена")
-    while True:
-        try:
-            if not audience.has_recipients:
-                log.info("Ожидаю первого получателя Telegram")
-                await audience.wait_until_available()
-            records, normalized_offset = read_jsonl_batch(settings.orders_path, offset)
-            if normalized_offset != offset:
-                offset = normalized_offset
-                save_cursor(settings.bot_cursor_path, offset)
-
-            for order, next_offset in records:
-                if order is None:
-                    log.warning("Пропущена повреждённая строка в файле заявок")
+                backlog = drained = False
+                records = await _read_order_burst(queue, settings)
+                orders: list[tuple[Order, Any]] = []
+                for payload, position in records:
+                    if payload is None:
+                        log.warning("Пропущена повреждённая строка в файле заявок")
+                    else:
+                        orders.append((Order.from_dict(payload), position))
+
+                threshold = settings.order_digest_threshold
+                if threshold and len(orders) >= threshold:
+                    messages = pack_digests([order for order, _ in orders])
                 else:
-                    delivered = await send_order_message(
-                        bot,
-                        settings,
-                        log,
-                        format_order(order),
-                        audience,
-                    )
+                    messages = [(format_order(order), 1) for order, _ in orders]
+
+                sent = 0
+                for text, count in messages:
+                    delivered = await send_order_message(bot, text, audience)
                     if not delivered:
                         log.warning("Заявка ожидает первого получателя Telegram")
                         break
-                    log.info("Заявка отправлена: %s", order.get("order_id", "без ID"))
-
-                offset = next_offset
-                save_cursor(settings.bot_cursor_path, offset)
+                    packed = orders[sent:sent + count]
+                    sent += count
+                    log.info(
+                        "Заявка отправлена: %s",
+                        ", ".join(order.order_id or "без ID" for order, _ in packed),
+                    )
+                    queue.ack(packed[-1][1])
+                else:
+                    # Заявки уже подтверждены; остаются только повреждённые строки.
+                    if len(orders) < len(records):
+                        queue.ack(records[-1][1])
+                    # Порция упёрлась в лимит: остаток читаем без паузы.
+                    backlog = queue.batch_limited
+                    drained = not backlog
+
+                queue.cleanup()
+
+                if drained:
+                    await watcher.wait(settings.bot_poll_sec)
+                elif not backlog:
+                    await asyncio.sleep(settings.bot_poll_sec)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception(
+                    "Ошибка Telegram; повторяю через %s сек.",
+                    settings.bot_poll_sec,
+                )
+                await asyncio.sleep(settings.bot_poll_sec)
 
-            offset = compact_jsonl_if_consumed(
-                settings.orders_path,
-                settings.bot_cursor_path,
-                offset,
-                settings.queue_compact_bytes,
-            )
 
-            await asyncio.sleep(settings.bot_poll_sec)
+async def delivery_retry_worker(
+    settings: Settings,
+    bot: Bot,
+    log,
+    audience: TelegramAudience,
+) -> None:
+    """Повторно отправляет заявки чатам, которым они не дошли с первого раза."""
+    while True:
+        try:
+            delay = await audience.retry_pending(bot)
         except asyncio.CancelledError:
             raise
         except Exception:
-            log.exception("Ошибка Telegram; повторяю через %s сек.", settings.bot_poll_sec)
-            await asyncio.sleep(settings.bot_poll_sec)
+            log.exception("Ошибка повторной отправки в Telegram")
+            delay = settings.bot_poll_sec
+        await audience.wait_for_pending(delay)
 
 
 async def supervise_parser(
@@ -276,6 +355,7 @@ async def supervise_parser(
     recovery: SessionRecoveryManager,
     audience: TelegramAudience,
     control: ParserPauseControl,
+    channel: ParserChannel | None = None,
 ) -> None:
     global CURRENT_PARSER_PROCESS, PARSER_RESTART_REQUESTED
     restart_count = 0
@@ -292,7 +372,9 @@ async def supervise_parser(
             )
             parser_started_at = time.time()
             process = await start_parser_process(settings, log)
-            output_task = asyncio.create_task(pipe_process_output(process, log))
+            output_task = asyncio.create_task(
+                pipe_process_output(process, log, channel)
+            )
             try:
                 return_code = await process.wait()
             finally:
@@ -301,11 +383,13 @@ async def supervise_parser(
             if PARSER_RESTART_REQUESTED:
                 PARSER_RESTART_REQUESTED = False
                 restart_count = 0
+                PARSER_RESTARTS.inc(reason="requested")
                 log.info("Перезапуск после обновления сессии")
                 continue
 
             if return_code == SESSION_EXPIRED_EXIT_CODE:
                 restart_count = 0
+                PARSER_RESTARTS.inc(reason="session_expired")
                 log.warning("Парсер остановлен из-за завершения сессии Profi.ru")
                 await recovery.start(
                     "Сайт завершил сессию или запросил повторный вход",
@@ -317,6 +401,7 @@ async def supervise_parser(
 
             if return_code == ACCESS_CHALLENGE_EXIT_CODE:
                 restart_count = 0
+                PARSER_RESTARTS.inc(reason="access_challenge")
                 if load_site_cooldown(settings.site_cooldown_path) is not None:
                     log.info("Получен обязательный лимит Profi.ru; включаю таймер паузы")
                     continue
@@ -357,6 +442,7 @@ async def supervise_parser(
                 return
 
             restart_count += 1
+            PARSER_RESTARTS.inc(reason="crash")
             log.error("Парсер завершился с кодом %s", return_code)
 
             if restart_count >= settings.site_error_threshold and not crash_alert_sent:
@@ -410,6 +496,10 @@ async def _run_service(settings: Settings) -> None:
     bot = _create_bot(settings)
     audience = TelegramAudience(settings, bot_log)
     control = ParserPauseControl()
+    channel = ParserChannel()
+    metrics_server = start_metrics_server(settings.service_metrics_port, run_log)
+    if metrics_server is not None:
+        _register_service_metrics()
     recovery = SessionRecoveryManager(
         settings,
         bot,
@@ -423,10 +513,21 @@ async def _run_service(settings: Settings) -> None:
     )
     tasks = [
         asyncio.create_task(
-            supervise_parser(settings, run_log, bot, recovery, audience, control)
+            supervise_parser(
+                settings,
+                run_log,
+                bot,
+                recovery,
+                audience,
+                control,
+                channel,
+            )
+        ),
+        asyncio.create_task(order_notifier(settings, bot, bot_log, audience, channel)),
+        asyncio.create_task(delivery_retry_worker(settings, bot, bot_log, audience)),
+        asyncio.create_task(
+            system_event_notifier(settings, bot, bot_log, audience, channel)
         ),
-        asyncio.create_task(order_notifier(settings, bot, bot_log, audience)),
-        asyncio.create_task(system_event_notifier(settings, bot, bot_log, audience)),
         asyncio.create_task(
             telegram_command_polling(
                 settings,
@@ -446,10 +547,14 @@ async def _run_service(settings: Settings) -> None:
                 control,
                 bot_log,
                 parser_pid,
+                channel,
             )
         ),
         asyncio.create_task(maintenance_loop(settings, run_log)),
     ]
+    if settings.loop_lag_threshold_ms:
+        monitor = LoopLagMonitor(settings.loop_lag_threshold_ms / 1000, run_log)
+        tasks.append(asyncio.create_task(monitor.run()))
     run_log.info("Парсер, уведомления и Telegram-команды запущены")
 
     try:
@@ -481,6 +586,8 @@ async def _run_service(settings: Settings) -> None:
         except Exception:
             bot_log.exception("Не удалось отправить уведомление об остановке")
         await bot.session.close()
+        if metrics_server is not None:
+            metrics_server.stop()
         run_log.info("Работа завершена")
 
 
@@ -499,11 +606,15 @@ async def run_telegram_only(settings: Settings) -> None:
         recovery = SessionRecoveryManager(settings, bot, log, audience=audience)
         tasks = [
             asyncio.create_task(order_notifier(settings, bot, log, audience)),
+            asyncio.create_task(delivery_retry_worker(settings, bot, log, audience)),
             asyncio.create_task(system_event_notifier(settings, bot, log, audience)),
             asyncio.create_task(
                 telegram_command_polling(settings, bot, recovery, log, audience)
             ),
         ]
+        if settings.loop_lag_threshold_ms:
+            monitor = LoopLagMonitor(settings.loop_lag_threshold_ms / 1000, log)
+            tasks.append(asyncio.create_task(monitor.run()))
         try:
             await asyncio.gather(*tasks)
         finally:
@@ -0,0 +1,541 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timezone
+from heapq import merge
+import json
+import logging
+import os
+from pathlib import Path
+import struct
+import sys
+from threading import Lock, Thread
+import time
+from typing import Any, Iterable, Iterator, TextIO
+
+from storage import write_json_atomic
+
+
+logger = logging.getLogger("parser.storage")
+
+_COMPACT_MAGIC = b"PSID"
+_COMPACT_HEADER = struct.Struct("<4sIQ")
+_MAX_NUMERIC_ID_DIGITS = 19
+
+
+def _epoch(value: object, default: int) -> int:
+    """Unix-время записи; ISO-строки остались от прежнего формата файла."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return default
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp())
+    return default
+
+
+def _numeric_id(order_id: str) -> int | None:
+    # Число без ведущих нулей однозначно превращается обратно в ту же строку.
+    if (
+        order_id.isascii()
+        and order_id.isdigit()
+        and len(order_id) <= _MAX_NUMERIC_ID_DIGITS
+        and (order_id == "0" or order_id[0] != "0")
+    ):
+        return int(order_id)
+    return None
+
+
+def _little_endian(values: array) -> array:
+    if sys.byteorder == "little":
+        return values
+    swapped = array(values.typecode, values)
+    swapped.byteswap()
+    return swapped
+
+
+def read_compact_snapshot(path: Path) -> tuple[array, array, dict[str, int]]:
+    """Читает seen_ids.bin: отсортированные числовые ID, их время и прочие ID."""
+    payload = path.read_bytes()
+    magic, version, count = _COMPACT_HEADER.unpack_from(payload)
+    if magic != _COMPACT_MAGIC or version != 1:
+        raise ValueError(f"неизвестный формат {path}")
+    ids_end = _COMPACT_HEADER.size + count * 8
+    ids = array("Q")
+    ids.frombytes(payload[_COMPACT_HEADER.size:ids_end])
+    epochs = array("q")
+    epochs.frombytes(payload[ids_end:ids_end + count * 8])
+    if len(ids) != count or len(epochs) != count:
+        raise ValueError(f"файл {path} обрезан")
+    if sys.byteorder != "little":
+        ids.byteswap()
+        epochs.byteswap()
+    other = json.loads(payload[ids_end + count * 8:] or b"{}")
+    return ids, epochs, {str(key): int(value) for key, value in other.items()}
+
+
+def write_compact_snapshot(
+    path: Path,
+    ids: array,
+    epochs: array,
+    other: dict[str, int],
+) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(f".{path.name}.tmp")
+    with temporary_path.open("wb") as stream:
+        stream.write(_COMPACT_HEADER.pack(_COMPACT_MAGIC, 1, len(ids)))
+        _little_endian(ids).tofile(stream)
+        _little_endian(epochs).tofile(stream)
+        stream.write(json.dumps(other, ensure_ascii=False).encode("utf-8"))
+        stream.flush()
+        os.fsync(stream.fileno())
+    temporary_path.chmod(0o600)
+    temporary_path.replace(path)
+    # После сжатия удаляются JSON-снимок и .journal.1, поэтому ждём диска.
+    directory = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+class SeenIdJournal:
+    """Обработанные ID заявок: снимок, журнал добавлений и индекс в памяти.
+
+    Индекс — OrderedDict {id: Unix-время} в порядке добавления, поэтому срок
+    хранения и max_count снимают записи со старого конца без разбора дат и
+    сортировки. Снимок seen_ids.json хранит те же пары в том же порядке. Новые
+    ID дописываются строками ["id", время] в seen_ids.json.journal, поэтому
+    запись партии не зависит от числа уже сохранённых ID. Когда журнал
+    вырастает относительно индекса, он переименовывается в .journal.1, а
+    снимок пишется в фоновом потоке. При загрузке снимок, .journal.1 и журнал
+    читаются по порядку, а оборванная последняя строка пропускается, так что
+    сбой на любом шаге не теряет ID.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        retention_days: int | None = None,
+        max_count: int | None = None,
+        compact_ratio: float = 0.5,
+        min_compact_records: int = 1024,
+        compact_interval_sec: float = 86_400,
+    ):
+        self.path = path
+        self.compact_path = path.with_suffix(".bin")
+        self.journal_path = path.with_name(f"{path.name}.journal")
+        self.rotated_path = path.with_name(f"{path.name}.journal.1")
+        self.retention_days = retention_days
+        self.max_count = max_count
+        self.compact_ratio = compact_ratio
+        self.min_compact_records = min_compact_records
+        self.compact_interval_sec = compact_interval_sec
+        self.compactions = 0
+        self._records: OrderedDict[str, int] = OrderedDict()
+        self._journal_records = 0
+        self._journal: TextIO | None = None
+        self._thread: Thread | None = None
+        self._compacted_at = time.monotonic()
+
+    def __enter__(self) -> "SeenIdJournal":
+        self.load()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.close()
+
+    def __contains__(self, order_id: object) -> bool:
+        return order_id in self._records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._records)
+
+    def load(self) -> None:
+        """Восстанавливает индекс и сразу сжимает журнал с учётом срока хранения."""
+        now = int(time.time())
+        self._load_snapshot(now)
+        for journal in (self.rotated_path, self.journal_path):
+            self._replay(journal, now)
+        self._restore_time_order()
+        self._expire(now)
+        self.compact(background=False)
+
+    def add(self, ids: Iterable[str]) -> int:
+        """Дописывает в журнал новые ID одной записью; возвращает их число."""
+        self._apply_compaction()
+        fresh = [
+            order_id
+            for order_id in dict.fromkeys(str(item) for item in ids if item)
+            if order_id not in self
+        ]
+        if not fresh:
+            return 0
+
+        now = int(time.time())
+        journal = self._open_journal()
+        journal.write(
+            "".join(
+                json.dumps([order_id, now], ensure_ascii=False) + "\n"
+                for order_id in fresh
+            )
+        )
+        journal.flush()
+        os.fsync(journal.fileno())
+        for order_id in fresh:
+            self._insert(order_id, now)
+        self._journal_records += len(fresh)
+        self._expire(now)
+
+        if self._compaction_due():
+            self.compact()
+        return len(fresh)
+
+    def compact(self, *, background: bool = True) -> None:
+        """Переписывает снимок и освобождает журнал; фоновый режим не блокирует парсер."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._apply_compaction()
+        self._close_journal()
+        if not self.rotated_path.exists() and self.journal_path.exists():
+            self.journal_path.replace(self.rotated_path)
+            self._journal_records = 0
+        self._compacted_at = time.monotonic()
+
+        snapshot = self._snapshot()
+        if not background:
+            self._write_snapshot(snapshot)
+            self._apply_compaction()
+            return
+        self._thread = Thread(
+            target=self._write_snapshot,
+            args=(snapshot,),
+            name="seen-ids-compaction",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._thread.join()
+        self._apply_compaction()
+        self._close_journal()
+
+    def _load_snapshot(self, now: int) -> None:
+        self._records = OrderedDict(self._read_snapshot(now))
+
+    def _insert(self, order_id: str, epoch: int) -> None:
+        self._records.setdefault(order_id, epoch)
+
+    def _expire(self, now: int) -> None:
+        records = self._records
+        if self.retention_days is not None:
+            cutoff = now - self.retention_days * 86_400
+            while records and next(iter(records.values())) < cutoff:
+                records.popitem(last=False)
+        if self.max_count is not None:
+            while len(records) > self.max_count:
+                records.popitem(last=False)
+
+    def _restore_time_order(self) -> None:
+        # Снимок нового формата и журнал уже упорядочены; сортировка нужна
+        # только для файла с ISO-строками, после смены хранилища или после
+        # сбоя во время сжатия.
+        timestamps = list(self._records.values())
+        if any(earlier > later for earlier, later in zip(timestamps, timestamps[1:])):
+            self._records = OrderedDict(
+                sorted(self._records.items(), key=lambda item: item[1])
+            )
+
+    def _snapshot(self) -> Any:
+        return dict(self._records)
+
+    def _write_snapshot(self, snapshot: Any) -> None:
+        try:
+            self._persist(snapshot)
+            self.rotated_path.unlink(missing_ok=True)
+        except OSError:
+            logger.exception("Не удалось сжать журнал обработанных заявок: %s", self.path)
+            return
+        self.compactions += 1
+
+    def _persist(self, records: dict[str, int]) -> None:
+        # Снимок должен быть на диске до удаления .journal.1 — единственной
+        # другой копии этих ID.
+        write_json_atomic(self.path, records, fsync=True)
+        # Снимок другого хранилища устарел: при загрузке берётся более новый.
+        self.compact_path.unlink(missing_ok=True)
+
+    def _apply_compaction(self) -> None:
+        pass
+
+    def _compaction_due(self) -> bool:
+        if self._journal_records >= max(
+            self.min_compact_records,
+            self.compact_ratio * len(self),
+        ):
+            return True
+        return time.monotonic() - self._compacted_at >= self.compact_interval_sec
+
+    def _compact_snapshot_is_newer(self) -> bool:
+        if not self.compact_path.exists():
+            return False
+        if not self.path.exists():
+            return True
+        return self.compact_path.stat().st_mtime_ns > self.path.stat().st_mtime_ns
+
+    def _read_snapshot(self, now: int) -> Iterable[tuple[str, int]]:
+        if self._compact_snapshot_is_newer():
+            try:
+                ids, epochs, other = read_compact_snapshot(self.compact_path)
+            except (OSError, ValueError, struct.error):
+                logger.warning(
+                    "Список обработанных заявок повреждён; начинаю с пустого списка: %s",
+                    self.compact_path,
+                )
+                return ()
+            return [*zip(map(str, ids), epochs), *other.items()]
+
+        if not self.path.exists():
+            return ()
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            logger.warning(
+                "Список обработанных заявок повреждён; начинаю с пустого списка: %s",
+                self.path,
+            )
+            return ()
+
+        if isinstance(data, list):
+            return [(str(order_id), now) for order_id in data if order_id]
+        if not isinstance(data, dict):
+            logger.error("Некорректный формат списка обработанных заявок: %s", self.path)
+            return ()
+
+        return [
+            (str(order_id), _epoch(timestamp, now))
+            for order_id, timestamp in data.items()
+            if order_id
+        ]
+
+    def _replay(self, journal: Path, now: int) -> None:
+        if not journal.exists():
+            return
+        corrupt = 0
+        with journal.open("r", encoding="utf-8", errors="replace") as stream:
+            for line in stream:
+                if not line.endswith("\n"):
+                    # Запись оборвалась при сбое: ID не попал в индекс и будет
+                    # обработан заново, как если бы запись не начиналась.
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    order_id, timestamp = json.loads(line)
+                except (ValueError, TypeError):
+                    corrupt += 1
+                    continue
+                if order_id:
+                    self._insert(str(order_id), _epoch(timestamp, now))
+                    self._journal_records += 1
+        if corrupt:
+            logger.warning(
+                "Пропущено повреждённых строк журнала обработанных заявок: %d (%s)",
+                corrupt,
+                journal,
+            )
+
+    def _open_journal(self) -> TextIO:
+        if self._journal is None:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            self._journal = self.journal_path.open("a", encoding="utf-8")
+            self.journal_path.chmod(0o600)
+            if not _ends_with_newline(self.journal_path):
+                # Не даём новой записи склеиться с оборванной строкой.
+                self._journal.write("\n")
+        return self._journal
+
+    def _close_journal(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+class CompactSeenIdJournal(SeenIdJournal):
+    """Тот же журнал, но индекс — отсортированные array.array ID и времени.
+
+    Числовые ID Profi.ru занимают 16 байт вместо сотен байт записи словаря,
+    проверка `in` — двоичный поиск. Новые ID до сжатия лежат в небольшом
+    словаре, ID с буквами или ведущими нулями — в отдельном словаре. Снимок
+    seen_ids.bin загружается одним чтением без разбора JSON. Срок хранения и
+    max_count применяются при сжатии, так что между сжатиями список может
+    ненадолго превышать лимит.
+    """
+
+    def __init__(self, path: Path, **options: Any):
+        super().__init__(path, **options)
+        self._ids = array("Q")
+        self._epochs = array("q")
+        self._recent: dict[int, int] = {}
+        self._other: dict[str, int] = {}
+        self._lock = Lock()
+        self._merged: tuple[
+            array, array, dict[int, int], dict[str, int], dict[str, int]
+        ] | None = None
+
+    def __contains__(self, order_id: object) -> bool:
+        if not isinstance(order_id, str):
+            return False
+        number = _numeric_id(order_id)
+        if number is None:
+            return order_id in self._other
+        if number in self._recent:
+            return True
+        ids = self._ids
+        index = bisect_left(ids, number)
+        return index < len(ids) and ids[index] == number
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._recent) + len(self._other)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from map(str, self._ids)
+        yield from map(str, self._recent)
+        yield from self._other
+
+    def _load_snapshot(self, now: int) -> None:
+        self._recent.clear()
+        self._other.clear()
+        if self._compact_snapshot_is_newer():
+            try:
+                self._ids, self._epochs, self._other = read_compact_snapshot(
+                    self.compact_path
+                )
+                return
+            except (OSError, ValueError, struct.error):
+                logger.warning(
+                    "Список обработанных заявок повреждён; начинаю с пустого списка: %s",
+                    self.compact_path,
+                )
+                self._ids, self._epochs = array("Q"), array("q")
+                return
+        # Переход с seen_ids.json: записи временно уходят в словарь новых ID
+        # и собираются в массивы при первом сжатии внутри load().
+        self._ids, self._epochs = array("Q"), array("q")
+        for order_id, epoch in self._read_snapshot(now):
+            self._insert(order_id, epoch)
+
+    def _insert(self, order_id: str, epoch: int) -> None:
+        if order_id in self:
+            return
+        number = _numeric_id(order_id)
+        if number is None:
+            self._other[order_id] = epoch
+        else:
+            self._recent[number] = epoch
+
+    def _expire(self, now: int) -> None:
+        pass
+
+    def _restore_time_order(self) -> None:
+        pass
+
+    def _snapshot(self) -> Any:
+        # Массивы не меняются на месте, а только заменяются, поэтому их можно
+        # отдать фоновому потоку без копирования.
+        return self._ids, self._epochs, dict(self._recent), dict(self._other)
+
+    def _persist(self, snapshot: Any) -> None:
+        ids, epochs, recent, other = snapshot
+        now = int(time.time())
+        cutoff = (
+            now - self.retention_days * 86_400
+            if self.retention_days is not None
+            else None
+        )
+        merged_ids = array("Q")
+        merged_epochs = array("q")
+        for number, epoch in merge(zip(ids, epochs), sorted(recent.items())):
+            if cutoff is None or epoch >= cutoff:
+                merged_ids.append(number)
+                merged_epochs.append(epoch)
+        kept_other = {
+            order_id: epoch
+            for order_id, epoch in other.items()
+            if cutoff is None or epoch >= cutoff
+        }
+        if self.max_count is not None:
+            merged_ids, merged_epochs = _newest(
+                merged_ids,
+                merged_epochs,
+                max(0, self.max_count - len(kept_other)),
+            )
+
+        write_compact_snapshot(self.compact_path, merged_ids, merged_epochs, kept_other)
+        self.path.unlink(missing_ok=True)
+        with self._lock:
+            self._merged = (merged_ids, merged_epochs, recent, other, kept_other)
+
+    def _apply_compaction(self) -> None:
+        with self._lock:
+            merged, self._merged = self._merged, None
+        if merged is None:
+            return
+        ids, epochs, recent, other, kept_other = merged
+        self._ids, self._epochs = ids, epochs
+        # Удаляем только то, что попало в снимок; ID, добавленные во время
+        # сжатия, остаются в словарях до следующего раза.
+        for number in recent:
+            self._recent.pop(number, None)
+        for order_id in other.keys() - kept_other.keys():
+            self._other.pop(order_id, None)
+
+
+def _newest(ids: array, epochs: array, limit: int) -> tuple[array, array]:
+    excess = len(ids) - limit
+    if excess <= 0:
+        return ids, epochs
+    threshold = sorted(epochs)[excess - 1]
+    ties_to_drop = excess - sum(1 for epoch in epochs if epoch < threshold)
+    kept_ids = array("Q")
+    kept_epochs = array("q")
+    for number, epoch in zip(ids, epochs):
+        if epoch < threshold:
+            continue
+        if epoch == threshold and ties_to_drop:
+            ties_to_drop -= 1
+            continue
+        kept_ids.append(number)
+        kept_epochs.append(epoch)
+    return kept_ids, kept_epochs
+
+
+def open_seen_ids(
+    path: Path,
+    *,
+    backend: str = "journal",
+    retention_days: int | None = None,
+    max_count: int | None = None,
+) -> SeenIdJournal:
+    """Создаёт хранилище обработанных ID для SEEN_IDS_BACKEND."""
+    journal_class = CompactSeenIdJournal if backend == "compact" else SeenIdJournal
+    return journal_class(path, retention_days=retention_days, max_count=max_count)
+
+
+def _ends_with_newline(path: Path) -> bool:
+    with path.open("rb") as stream:
+        if stream.seek(0, os.SEEK_END) == 0:
+            return True
+        stream.seek(-1, os.SEEK_END)
+        return stream.read(1) == b"\n"
@@ -1030,7 +1030,7 @@ class SessionRecoveryManager:
         return cooldown.remaining_seconds() if cooldown is not None else 0
 
     async def _send(self, text: str) -> int:
-        return await self.audience.send(self.bot, text)
+        return await self.audience.send_recovery(self.bot, text)
 
     async def _send_error(self, text: str) -> int:
         return await self.audience.send_error(self.bot, text)
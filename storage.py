@@ -1,25 +1,38 @@
 from __future__ import annotations
 
+import atexit
+from dataclasses import dataclass
 import json
 import logging
+import os
 from pathlib import Path
-from datetime import datetime, timedelta, timezone
-from typing import Any
+import threading
+import time
+from typing import Any, BinaryIO, Iterator
 
 from instance_lock import InterProcessFileLock
+from order import Order
 
 logger = logging.getLogger("parser.storage")
 
 
-def write_json_atomic(path: Path, payload: Any) -> None:
+def write_json_atomic(path: Path, payload: Any, *, fsync: bool = False) -> None:
+    """Атомарно заменяет JSON-файл; fsync=True дожидается записи на диск."""
     path.parent.mkdir(parents=True, exist_ok=True)
     temporary_path = path.with_name(f".{path.name}.tmp")
-    temporary_path.write_text(
-        json.dumps(payload, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
+    with temporary_path.open("w", encoding="utf-8") as file:
+        file.write(json.dumps(payload, ensure_ascii=False, indent=2))
+        if fsync:
+            file.flush()
+            os.fsync(file.fileno())
     temporary_path.chmod(0o600)
     temporary_path.replace(path)
+    if fsync:
+        directory = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
 
 
 def read_json_object(path: Path) -> dict[str, Any]:
@@ -32,69 +45,64 @@ def read_json_object(path: Path) -> dict[str, Any]:
     return payload if isinstance(payload, dict) else {}
 
 
-def load_seen_ids(path: Path) -> set[str]:
-    if not path.exists():
-        return set()
-
-    try:
-        data = json.loads(path.read_text(encoding="utf-8"))
-    except (OSError, json.JSONDecodeError):
-        logger.warning(
-            "Список обработанных заявок повреждён; начинаю с пустого списка: %s",
-            path,
-        )
-        return set()
-
-    if isinstance(data, dict):
-        return {str(item) for item in data if item}
-    if not isinstance(data, list):
-        logger.error("Некорректный формат списка обработанных заявок: %s", path)
-        return set()
-    return {str(item) for item in data if item}
-
-
-def save_seen_ids(
-    path: Path,
-    ids: set[str],
-    *,
-    retention_days: int | None = None,
-    max_count: int | None = None,
-) -> set[str]:
-    now = datetime.now(timezone.utc)
-    now_text = now.isoformat()
-    existing = read_json_object(path)
-    records: dict[str, str] = {
-        str(order_id): str(timestamp)
-        for order_id, timestamp in existing.items()
-        if order_id and isinstance(timestamp, str)
-    }
-    for order_id in ids:
-        records.setdefault(str(order_id), now_text)
-
-    if retention_days is not None:
-        cutoff = now - timedelta(days=retention_days)
-        retained: dict[str, str] = {}
-        for order_id, timestamp in records.items():
+class BackgroundJsonWriter:
+    """Атомарная запись JSON-файлов в отдельном потоке.
+
+    write() не ждёт диска, поэтому цикл событий не стоит на записи. Если
+    прежний снимок файла ещё не записан, новый заменяет его: на диск попадает
+    последнее состояние. flush() дожидается записи всего поставленного.
+    """
+
+    def __init__(self, name: str = "json-writer"):
+        self.name = name
+        self._condition = threading.Condition()
+        self._pending: dict[Path, Any] = {}
+        self._writing = False
+        self._thread: threading.Thread | None = None
+
+    def write(self, path: Path, payload: Any) -> None:
+        with self._condition:
+            self._pending[path] = payload
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name=self.name,
+                    daemon=True,
+                )
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._pending and not self._writing,
+                timeout,
+            )
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending)
+                path = next(iter(self._pending))
+                payload = self._pending.pop(path)
+                self._writing = True
             try:
-                parsed = datetime.fromisoformat(timestamp)
-                if parsed.tzinfo is None:
-                    parsed = parsed.replace(tzinfo=timezone.utc)
-            except ValueError:
-                parsed = now
-            if parsed >= cutoff:
-                retained[order_id] = timestamp
-        records = retained
-
-    if max_count is not None and len(records) > max_count:
-        records = dict(
-            sorted(records.items(), key=lambda item: item[1], reverse=True)[:max_count]
-        )
+                write_json_atomic(path, payload)
+            except OSError:
+                logger.exception("Не удалось сохранить %s", path)
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
 
-    write_json_atomic(path, records)
-    return set(records)
+JSON_WRITER = BackgroundJsonWriter()
+atexit.register(JSON_WRITER.flush, 10)
 
 
-def append_jsonl(path: Path, obj: dict[str, Any]) -> None:
+def append_jsonl(path: Path, obj: dict[str, Any] | Order) -> None:
+    if isinstance(obj, Order):
+        obj = obj.to_dict()
     path.parent.mkdir(parents=True, exist_ok=True)
     lock_path = path.with_name(f".{path.name}.lock")
     with InterProcessFileLock(lock_path):
@@ -144,6 +152,114 @@ def save_cursor(path: Path, offset: int) -> None:
     write_json_atomic(path, {"offset": max(0, int(offset))})
 
 
+DEFAULT_BATCH_RECORDS = 100
+DEFAULT_BATCH_BYTES = 256_000
+
+
+def _decode_record(line: bytes) -> dict[str, Any] | None:
+    try:
+        payload = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+class JsonlBatchReader:
+    """Потоковое чтение JSONL ограниченными порциями через один буфер.
+
+    Порция заканчивается после max_records строк или max_bytes байт (None —
+    без ограничения). Недописанная последняя строка, которую парсер ещё
+    пишет, не считается повреждённой: её начало остаётся в ридере и
+    дочитывается при следующем вызове с той же позиции.
+    """
+
+    def __init__(
+        self,
+        max_records: int | None = DEFAULT_BATCH_RECORDS,
+        max_bytes: int | None = DEFAULT_BATCH_BYTES,
+        *,
+        chunk_bytes: int = 64 * 1024,
+    ):
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.limited = False
+        self._buffer = bytearray(chunk_bytes)
+        self._pending = bytearray()
+        self._pending_at: tuple[str, int, int] | None = None
+        self._records = 0
+        self._bytes = 0
+
+    def start(self) -> None:
+        """Начинает новую порцию: счётчики лимитов обнуляются."""
+        self.limited = False
+        self._records = 0
+        self._bytes = 0
+
+    def lines(
+        self,
+        stream: BinaryIO,
+        offset: int,
+    ) -> Iterator[tuple[dict[str, Any] | None, int]]:
+        """Записи файла с offset и позиция после каждой, пока не исчерпан лимит."""
+        if self._exhausted():
+            return
+        stat = os.fstat(stream.fileno())
+        key = (str(stream.name), stat.st_ino, offset)
+        if key != self._pending_at or stat.st_size < offset + len(self._pending):
+            self._pending.clear()
+        self._pending_at = None
+        stream.seek(offset + len(self._pending))
+
+        view = memoryview(self._buffer)
+        try:
+            while size := stream.readinto(self._buffer):
+                start = 0
+                while (newline := self._buffer.find(b"\n", start, size)) != -1:
+                    if self._pending:
+                        self._pending += view[start:newline + 1]
+                        line = bytes(self._pending)
+                        self._pending.clear()
+                    else:
+                        line = bytes(view[start:newline + 1])
+                    start = newline + 1
+                    offset += len(line)
+                    self._records += 1
+                    self._bytes += len(line)
+                    yield _decode_record(line), offset
+                    if self._exhausted():
+                        self._pending.clear()
+                        return
+                self._pending += view[start:size]
+        finally:
+            view.release()
+        if self._pending:
+            self._pending_at = (str(stream.name), stat.st_ino, offset)
+
+    def _exhausted(self) -> bool:
+        self.limited = (
+            self.max_records is not None and self._records >= self.max_records
+        ) or (self.max_bytes is not None and self._bytes >= self.max_bytes)
+        return self.limited
+
+
+def iter_jsonl_batch(
+    path: Path,
+    offset: int,
+    reader: JsonlBatchReader | None = None,
+) -> Iterator[tuple[dict[str, Any] | None, int]]:
+    """Потоковый вариант read_jsonl_batch: записи выдаются по одной."""
+    reader = reader or JsonlBatchReader()
+    reader.start()
+    try:
+        stream = path.open("rb")
+    except FileNotFoundError:
+        return
+    with stream:
+        if os.fstat(stream.fileno()).st_size < offset:
+            offset = 0
+        yield from reader.lines(stream, offset)
+
+
 def read_jsonl_batch(
     path: Path,
     offset: int,
@@ -153,36 +269,284 @@ def read_jsonl_batch(
         return [], offset
 
     normalized_offset = offset if path.stat().st_size >= offset else 0
-    records: list[tuple[dict[str, Any] | None, int]] = []
+    reader = JsonlBatchReader(max_records=None, max_bytes=None)
+    return list(iter_jsonl_batch(path, normalized_offset, reader)), normalized_offset
 
-    with path.open("r", encoding="utf-8") as file:
-        file.seek(normalized_offset)
-        while line := file.readline():
-            next_offset = file.tell()
-            try:
-                payload = json.loads(line)
-            except json.JSONDecodeError:
-                payload = None
-            records.append((payload if isinstance(payload, dict) else None, next_offset))
 
-    return records, normalized_offset
+DEFAULT_SEGMENT_BYTES = 1_000_000
 
 
-def compact_jsonl_if_consumed(
-    path: Path,
-    cursor_path: Path,
-    offset: int,
-    threshold_bytes: int,
-) -> int:
-    if not path.exists() or path.stat().st_size < threshold_bytes:
-        return offset
+@dataclass(frozen=True, slots=True, order=True)
+class QueuePosition:
+    """Позиция читателя сегментированной очереди: номер сегмента и байт в нём."""
+
+    segment: int = 0
+    offset: int = 0
+
+
+def segment_path(path: Path, segment: int) -> Path:
+    return path.with_name(f"{path.name}.{segment:06d}")
+
+
+def _manifest_path(path: Path) -> Path:
+    return path.with_name(f"{path.name}.manifest.json")
+
+
+def _segment_head(path: Path) -> int:
+    """Номер сегмента, который сейчас лежит в самом файле path."""
+    try:
+        head = max(0, int(read_json_object(_manifest_path(path)).get("head", 0)))
+    except (TypeError, ValueError):
+        head = 0
+    # Сбой между переименованием сегмента и записью манифеста.
+    while segment_path(path, head).exists():
+        head += 1
+    return head
 
+
+def _sealed_segments(path: Path) -> list[int]:
+    prefix = f"{path.name}."
+    segments = []
+    for candidate in path.parent.glob(f"{path.name}.*"):
+        suffix = candidate.name[len(prefix):]
+        if suffix.isdigit():
+            segments.append(int(suffix))
+    return sorted(segments)
+
+
+SEAL_ATTEMPTS = 3
+SEAL_RETRY_SEC = 0.05
+
+
+def _seal_segment(path: Path, head: int) -> bool:
+    """Переименовывает головной сегмент; False — запечатывание отложено.
+
+    В Windows открытый читателем файл нельзя переименовать. Запись тогда
+    продолжается в тот же сегмент, а следующая попытка будет при следующей записи.
+    """
+    for attempt in range(SEAL_ATTEMPTS):
+        try:
+            path.replace(segment_path(path, head))
+            return True
+        except PermissionError:
+            if attempt + 1 < SEAL_ATTEMPTS:
+                time.sleep(SEAL_RETRY_SEC)
+    logger.warning("Сегмент %s занят читателем; запечатывание отложено", path)
+    return False
+
+
+def append_segmented_jsonl(
+    path: Path,
+    obj: dict[str, Any] | Order,
+    segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+) -> tuple[QueuePosition, QueuePosition]:
+    """Дописывает запись в головной сегмент, запечатывая его по достижении размера.
+
+    Головной сегмент всегда лежит в path, запечатанные — в path.NNNNNN.
+    Манифест хранит номер головного сегмента; переименование выполняется до
+    записи манифеста, и читатели восстанавливают номер по запечатанным файлам.
+    Возвращает позиции начала и конца записанной строки.
+    """
+    if isinstance(obj, Order):
+        obj = obj.to_dict()
+    line = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+    path.parent.mkdir(parents=True, exist_ok=True)
     lock_path = path.with_name(f".{path.name}.lock")
     with InterProcessFileLock(lock_path):
-        current_size = path.stat().st_size if path.exists() else 0
-        if offset < current_size:
-            return offset
-        path.write_text("", encoding="utf-8")
+        head = _segment_head(path)
+        if path.exists() and path.stat().st_size >= segment_bytes and _seal_segment(
+            path, head
+        ):
+            head += 1
+            write_json_atomic(_manifest_path(path), {"head": head})
+        with path.open("ab") as file:
+            start = file.tell()
+            file.write(line)
         path.chmod(0o600)
-        save_cursor(cursor_path, 0)
-        return 0
+    return QueuePosition(head, start), QueuePosition(head, start + len(line))
+
+
+def load_queue_position(path: Path) -> QueuePosition:
+    """Позиция читателя; прежний файл {"offset": N} относится к сегменту 0."""
+    payload = read_json_object(path)
+    try:
+        return QueuePosition(
+            max(0, int(payload.get("segment", 0))),
+            max(0, int(payload.get("offset", 0))),
+        )
+    except (TypeError, ValueError):
+        logger.warning("Не удалось прочитать позицию очереди: %s", path)
+        return QueuePosition()
+
+
+def save_queue_position(
+    path: Path,
+    position: QueuePosition,
+    *,
+    fsync: bool = False,
+) -> None:
+    write_json_atomic(
+        path,
+        {"segment": position.segment, "offset": position.offset},
+        fsync=fsync,
+    )
+
+
+class CursorWriter:
+    """Групповая запись позиции читателя очереди.
+
+    Позиция сохраняется после every подтверждений, не реже чем раз в
+    interval_sec при следующем подтверждении, а также в flush() и close().
+    На диске позиция может только отставать от отправленного, поэтому после
+    сбоя повторяются не больше every записей, но ни одна не теряется.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        every: int = 1,
+        interval_sec: float = 0.0,
+        fsync: bool = False,
+    ):
+        self.path = path
+        self.every = max(1, every)
+        self.interval_sec = interval_sec
+        self.fsync = fsync
+        self.committed = load_queue_position(path)
+        self.commits = 0
+        self._pending: QueuePosition | None = None
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def update(self, position: QueuePosition) -> None:
+        self._pending = position
+        self._uncommitted += 1
+        if (
+            self._uncommitted >= self.every
+            or time.monotonic() - self._last_commit >= self.interval_sec
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending is not None:
+            save_queue_position(self.path, self._pending, fsync=self.fsync)
+            self.committed = self._pending
+            self.commits += 1
+        self._pending = None
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def close(self) -> None:
+        self.flush()
+
+
+def _segment_size(path: Path, segment: int, head: int) -> int | None:
+    sealed = segment_path(path, segment)
+    for file in (sealed, path) if segment == head else (sealed,):
+        try:
+            return file.stat().st_size
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def _open_segment(path: Path, segment: int, head: int) -> BinaryIO | None:
+    sealed = segment_path(path, segment)
+    try:
+        return sealed.open("rb")
+    except FileNotFoundError:
+        if segment != head:
+            return None
+    try:
+        stream = path.open("rb")
+    except FileNotFoundError:
+        return None
+    if sealed.exists():
+        # Сегмент запечатали между попытками: в path уже следующий сегмент.
+        stream.close()
+        return sealed.open("rb")
+    return stream
+
+
+def segmented_start(path: Path, position: QueuePosition) -> QueuePosition:
+    """Фактическая позиция чтения после прочитанных до конца или удалённых сегментов."""
+    head = _segment_head(path)
+    segment, offset = min(position.segment, head), position.offset
+    if position.segment > head:
+        offset = 0
+    while segment < head:
+        size = _segment_size(path, segment, head)
+        if size is not None and offset < size:
+            break
+        segment, offset = segment + 1, 0
+    size = _segment_size(path, segment, head) or 0
+    return QueuePosition(segment, offset if offset <= size else 0)
+
+
+def iter_segmented_batch(
+    path: Path,
+    start: QueuePosition,
+    reader: JsonlBatchReader | None = None,
+) -> Iterator[tuple[dict[str, Any] | None, QueuePosition]]:
+    """Записи всех сегментов начиная с start в пределах лимитов reader."""
+    reader = reader or JsonlBatchReader()
+    reader.start()
+    head = _segment_head(path)
+    segment, offset = start.segment, start.offset
+    while segment <= head and not reader.limited:
+        stream = _open_segment(path, segment, head)
+        if stream is not None:
+            with stream:
+                for payload, offset in reader.lines(stream, offset):
+                    yield payload, QueuePosition(segment, offset)
+        segment, offset = segment + 1, 0
+
+
+def read_segmented_batch(
+    path: Path,
+    position: QueuePosition,
+) -> tuple[list[tuple[dict[str, Any] | None, QueuePosition]], QueuePosition]:
+    """Читает все новые записи начиная с position.
+
+    Вторым значением возвращается фактическая начальная позиция (см.
+    segmented_start).
+    """
+    start = segmented_start(path, position)
+    reader = JsonlBatchReader(max_records=None, max_bytes=None)
+    return list(iter_segmented_batch(path, start, reader)), start
+
+
+def drop_consumed_segments(path: Path, position: QueuePosition) -> int:
+    """Удаляет запечатанные сегменты до position; головной файл не трогается."""
+    removed = 0
+    for segment in _sealed_segments(path):
+        if segment >= position.segment:
+            break
+        segment_path(path, segment).unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+
+def segmented_lag_bytes(path: Path, position: QueuePosition) -> int:
+    head = _segment_head(path)
+    lag = 0
+    for segment in [*_sealed_segments(path), head]:
+        if segment < position.segment:
+            continue
+        file = segment_path(path, segment) if segment != head else path
+        size = file.stat().st_size if file.exists() else 0
+        lag += max(0, size - position.offset) if segment == position.segment else size
+    return lag
+
+
+def queue_files(path: Path) -> list[Path]:
+    """Файлы очереди по порядку: запечатанные сегменты, затем головной."""
+    files = [segment_path(path, segment) for segment in _sealed_segments(path)]
+    return [*files, path] if path.exists() else files
+
+
+def queue_end(path: Path) -> QueuePosition:
+    """Позиция сразу после последней записи очереди."""
+    head = _segment_head(path)
+    return QueuePosition(head, _segment_size(path, head, head) or 0)
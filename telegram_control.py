@@ -2,26 +2,27 @@ from __future__ import annotations
 
 import asyncio
 from pathlib import Path
+import secrets
 from typing import Any
+from urllib.parse import urlsplit
 
 from aiogram import Bot, Dispatcher, F, Router
 from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
 from aiogram.filters import Command
 from aiogram.types import BotCommand, Message
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
 from audience import TelegramAudience
 from config import Settings
 from health import EVENT_SESSION_EXPIRED, EVENT_SITE_ERROR, EVENT_SITE_RECOVERED
 from health_report import build_health_report
+from ipc import FRAME_EVENT, ParserChannel
+from queue_watch import QueueWatcher
+from queues import open_system_event_queue, publish_lag
 from runtime_control import ParserPauseControl
 from session_recovery import SessionRecoveryManager, normalize_sms_code
 from site_cooldown import format_remaining_time
-from storage import (
-    compact_jsonl_if_consumed,
-    load_cursor,
-    read_jsonl_batch,
-    save_cursor,
-)
 from version import APP_VERSION
 
 
@@ -221,6 +222,59 @@ def build_dispatcher(
     return dispatcher
 
 
+BOT_COMMANDS = (
+    BotCommand(command="status", description="состояние парсера и сессии"),
+    BotCommand(command="health", description="полная диагностика сервиса"),
+    BotCommand(command="version", description="версия проекта"),
+    BotCommand(command="errors", description="состояние уведомлений об ошибках"),
+    BotCommand(command="errors_off", description="отключить сообщения об ошибках"),
+    BotCommand(command="errors_on", description="включить сообщения об ошибках"),
+    BotCommand(command="renew", description="перевыпустить cookies через SMS"),
+    BotCommand(command="cancel", description="отменить восстановление сессии"),
+    BotCommand(command="resume", description="продолжить после блокировки"),
+    BotCommand(command="help", description="справка по командам"),
+)
+
+
+def _log_access_mode(audience: TelegramAudience, log) -> None:
+    if audience.open_mode:
+        log.warning(
+            "ADMIN_CHAT_ID не задан: бот доступен любому пользователю в личном чате"
+        )
+    else:
+        log.info("Telegram-команды доступны только ADMIN_CHAT_ID")
+
+
+def _retry_delay_after(exc: Exception, retry_delay: int, log, action: str) -> int:
+    if isinstance(exc, TelegramRetryAfter):
+        retry_delay = max(retry_delay, int(exc.retry_after) + 2)
+        log.warning(
+            "Telegram временно ограничил запросы; повтор через %s сек.",
+            retry_delay,
+        )
+    elif isinstance(exc, TelegramNetworkError):
+        log.warning(
+            "Telegram недоступен через сеть/прокси: %s. Повтор через %s сек.",
+            exc,
+            retry_delay,
+        )
+    elif isinstance(exc, OSError):
+        log.warning(
+            "Ошибка %s: %s. Повтор через %s сек.",
+            action,
+            exc,
+            retry_delay,
+        )
+    else:
+        log.error(
+            "Неожиданная ошибка %s; повтор через %s сек.",
+            action,
+            retry_delay,
+            exc_info=exc,
+        )
+    return retry_delay
+
+
 async def telegram_command_polling(
     settings: Settings,
     bot: Bot,
@@ -229,32 +283,20 @@ async def telegram_command_polling(
     audience: TelegramAudience | None = None,
     control: ParserPauseControl | None = None,
 ) -> None:
+    if settings.telegram_webhook_url:
+        await telegram_command_webhook(settings, bot, recovery, log, audience, control)
+        return
+
     audience = audience or TelegramAudience(settings, log)
-    if audience.open_mode:
-        log.warning(
-            "ADMIN_CHAT_ID не задан: бот доступен любому пользователю в личном чате"
-        )
-    else:
-        log.info("Telegram-команды доступны только ADMIN_CHAT_ID")
+    _log_access_mode(audience, log)
 
     retry_delay = 5
     while True:
         dispatcher = build_dispatcher(settings, recovery, audience, control)
         try:
-            await bot.set_my_commands(
-                [
-                    BotCommand(command="status", description="состояние парсера и сессии"),
-                    BotCommand(command="health", description="полная диагностика сервиса"),
-                    BotCommand(command="version", description="версия проекта"),
-                    BotCommand(command="errors", description="состояние уведомлений об ошибках"),
-                    BotCommand(command="errors_off", description="отключить сообщения об ошибках"),
-                    BotCommand(command="errors_on", description="включить сообщения об ошибках"),
-                    BotCommand(command="renew", description="перевыпустить cookies через SMS"),
-                    BotCommand(command="cancel", description="отменить восстановление сессии"),
-                    BotCommand(command="resume", description="продолжить после блокировки"),
-                    BotCommand(command="help", description="справка по командам"),
-                ]
-            )
+            await bot.set_my_commands(list(BOT_COMMANDS))
+            # getUpdates не работает, пока у бота остаётся webhook.
+            await bot.delete_webhook()
             log.info("Приём команд Telegram запущен")
             retry_delay = 5
             await dispatcher.start_polling(
@@ -266,28 +308,100 @@ async def telegram_command_polling(
             log.warning("Telegram polling завершился; запускаю его повторно")
         except asyncio.CancelledError:
             raise
-        except TelegramRetryAfter as exc:
-            retry_delay = max(retry_delay, int(exc.retry_after) + 2)
-            log.warning(
-                "Telegram временно ограничил запросы; повтор через %s сек.",
-                retry_delay,
-            )
-        except TelegramNetworkError as exc:
-            log.warning(
-                "Telegram недоступен через сеть/прокси: %s. Повтор через %s сек.",
-                exc,
-                retry_delay,
-            )
-        except Exception:
-            log.exception(
-                "Неожиданная ошибка Telegram polling; повтор через %s сек.",
-                retry_delay,
-            )
+        except Exception as exc:
+            retry_delay = _retry_delay_after(exc, retry_delay, log, "Telegram polling")
 
         await asyncio.sleep(retry_delay)
         retry_delay = min(retry_delay * 2, 60)
 
 
+async def start_webhook_server(
+    settings: Settings,
+    bot: Bot,
+    dispatcher: Dispatcher,
+    secret: str,
+) -> web.AppRunner:
+    """Поднимает локальный приём обновлений за обратным прокси."""
+    app = web.Application()
+    handler = SimpleRequestHandler(
+        dispatcher=dispatcher,
+        bot=bot,
+        secret_token=secret,
+    )
+    # register() добавил бы закрытие сессии бота при остановке сервера.
+    path = urlsplit(settings.telegram_webhook_url or "").path or "/"
+    app.router.add_route("POST", path, handler.handle)
+    setup_application(app, dispatcher, bot=bot)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(
+        runner,
+        settings.telegram_webhook_host,
+        settings.telegram_webhook_port,
+    )
+    try:
+        await site.start()
+    except BaseException:
+        await runner.cleanup()
+        raise
+    return runner
+
+
+async def telegram_command_webhook(
+    settings: Settings,
+    bot: Bot,
+    recovery: SessionRecoveryManager,
+    log,
+    audience: TelegramAudience | None = None,
+    control: ParserPauseControl | None = None,
+) -> None:
+    """Принимает команды через webhook вместо long polling."""
+    audience = audience or TelegramAudience(settings, log)
+    _log_access_mode(audience, log)
+    secret = settings.telegram_webhook_secret or secrets.token_urlsafe(32)
+    dispatcher = build_dispatcher(settings, recovery, audience, control)
+    retry_delay = 5
+    while True:
+        # Порт может быть занят или адрес ещё не поднят: ждём, как polling.
+        try:
+            runner = await start_webhook_server(settings, bot, dispatcher, secret)
+            break
+        except OSError as exc:
+            retry_delay = _retry_delay_after(
+                exc, retry_delay, log, "запуска webhook-сервера"
+            )
+        await asyncio.sleep(retry_delay)
+        retry_delay = min(retry_delay * 2, 60)
+    log.info(
+        "Webhook Telegram слушает %s:%s",
+        settings.telegram_webhook_host,
+        settings.telegram_webhook_port,
+    )
+    try:
+        retry_delay = 5
+        while True:
+            try:
+                await bot.set_my_commands(list(BOT_COMMANDS))
+                await bot.set_webhook(
+                    settings.telegram_webhook_url,
+                    secret_token=secret,
+                    allowed_updates=dispatcher.resolve_used_update_types(),
+                )
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                retry_delay = _retry_delay_after(
+                    exc, retry_delay, log, "регистрации webhook"
+                )
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, 60)
+        log.info("Приём команд Telegram через webhook запущен")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
 def _format_system_event(event: dict[str, Any]) -> str | None:
     event_type = event.get("type")
     message = str(event.get("message") or "Без описания")
@@ -351,62 +465,63 @@ async def system_event_notifier(
     bot: Bot,
     log,
     audience: TelegramAudience | None = None,
+    channel: ParserChannel | None = None,
 ) -> None:
     audience = audience or TelegramAudience(settings, log)
-    offset = load_cursor(settings.system_event_cursor_path)
-
-    while True:
-        try:
-            records, normalized_offset = read_jsonl_batch(
-                settings.system_events_path,
-                offset,
-            )
-            if normalized_offset != offset:
-                offset = normalized_offset
-                save_cursor(settings.system_event_cursor_path, offset)
-
-            for event, next_offset in records:
-                if event is None:
-                    log.warning("Пропущена повреждённая строка системных событий")
-                else:
-                    notification = _format_system_event(event)
-                    if notification:
-                        delivered = await _deliver_system_event(
-                            settings,
-                            bot,
-                            audience,
-                            event,
-                        )
-                        if delivered == 0:
-                            if audience.has_recipients and not audience.has_error_recipients:
-                                log.info(
-                                    "Системное уведомление отключено всеми получателями"
-                                )
-                                delivered = -1
-                            else:
-                                log.info("Системное уведомление ожидает получателя")
-                                await audience.wait_until_available()
-                                delivered = await _deliver_system_event(
-                                    settings,
-                                    bot,
-                                    audience,
-                                    event,
-                                )
+    channel = channel or ParserChannel()
+    with (
+        open_system_event_queue(settings) as queue,
+        QueueWatcher(queue.path) as watcher,
+        channel.route(FRAME_EVENT, queue, watcher),
+        publish_lag("system_events", queue),
+    ):
+        while True:
+            try:
+                backlog = drained = False
+                # Порция читается целиком: файл сегмента не остаётся открытым,
+                # пока уведомление ждёт Telegram.
+                for event, position in list(queue.read_batch()):
+                    if event is None:
+                        log.warning("Пропущена повреждённая строка системных событий")
+                    else:
+                        notification = _format_system_event(event)
+                        if notification:
+                            delivered = await _deliver_system_event(
+                                settings,
+                                bot,
+                                audience,
+                                event,
+                            )
                             if delivered == 0:
-                                break
-                offset = next_offset
-                save_cursor(settings.system_event_cursor_path, offset)
-
-            offset = compact_jsonl_if_consumed(
-                settings.system_events_path,
-                settings.system_event_cursor_path,
-                offset,
-                settings.queue_compact_bytes,
-            )
-
-            await asyncio.sleep(settings.bot_poll_sec)
-        except asyncio.CancelledError:
-            raise
-        except Exception:
-            log.exception("Ошибка отправки системного уведомления")
-            await asyncio.sleep(settings.bot_poll_sec)
+                                if audience.has_recipients and not audience.has_error_recipients:
+                                    log.info(
+                                        "Системное уведомление отключено всеми получателями"
+                                    )
+                                    delivered = -1
+                                else:
+                                    log.info("Системное уведомление ожидает получателя")
+                                    await audience.wait_until_available()
+                                    delivered = await _deliver_system_event(
+                                        settings,
+                                        bot,
+                                        audience,
+                                        event,
+                                    )
+                                if delivered == 0:
+                                    break
+                    queue.ack(position)
+                else:
+                    backlog = queue.batch_limited
+                    drained = not backlog
+
+                queue.cleanup()
+
+                if drained:
+                    await watcher.wait(settings.bot_poll_sec)
+                elif not backlog:
+                    await asyncio.sleep(settings.bot_poll_sec)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Ошибка отправки системного уведомления")
+                await asyncio.sleep(settings.bot_poll_sec)
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+import heapq
+import itertools
+import time
+from typing import AsyncIterator, Awaitable, Callable, Iterable
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from metrics import REGISTRY
+
+
+TELEGRAM_RETRIES = REGISTRY.counter(
+    "profi_telegram_retries",
+    "Отправки, отложенные из-за лимита Telegram на чат",
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "profi_telegram_queue_depth",
+    "Отправки в Telegram, ожидающие своей очереди, по классу",
+    ("lane",),
+)
+
+# Ограничения Bot API: около 30 сообщений в секунду на бота, одно сообщение
+# в секунду в личный чат и 20 в минуту в группу.
+PRIVATE_CHAT_INTERVAL_SEC = 1.0
+GROUP_CHAT_INTERVAL_SEC = 3.0
+
+# Классы исходящих сообщений в порядке приоритета.
+LANE_ORDERS = "orders"
+LANE_RECOVERY = "recovery"
+LANE_ALERTS = "alerts"
+
+
+class ChatPaused(Exception):
+    """Чат ещё ждёт окончания TelegramRetryAfter; отправка не выполнялась."""
+
+    def __init__(self, chat_id: int, retry_after: float):
+        super().__init__(f"чат {chat_id} на паузе ещё {retry_after:.1f} сек.")
+        self.chat_id = chat_id
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Токен-бакет: rate токенов в секунду, не больше capacity подряд."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated) * self.rate,
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def refund(self) -> None:
+        self._tokens = min(self.capacity, self._tokens + 1)
+
+
+class PriorityGate:
+    """Выдаёт токены общего бакета ожидающим в порядке приоритета."""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._order = itertools.count()
+        self._pump: asyncio.Task[None] | None = None
+
+    async def acquire(self, priority: int) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        await waiter
+
+    async def _run(self) -> None:
+        while self._waiters:
+            await self.bucket.acquire()
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+            if not self._waiters:
+                self.bucket.refund()
+                return
+            heapq.heappop(self._waiters)[2].set_result(None)
+
+
+@dataclass(frozen=True, slots=True)
+class Lane:
+    """Класс исходящих сообщений: приоритет и собственный бюджет."""
+
+    priority: int
+    rate_per_sec: float
+    concurrency: int
+
+
+class _LaneState:
+    def __init__(self, name: str, lane: Lane):
+        self.name = name
+        self.priority = lane.priority
+        self.slots = asyncio.Semaphore(lane.concurrency)
+        self.bucket = TokenBucket(
+            lane.rate_per_sec,
+            capacity=max(1.0, lane.rate_per_sec / 5),
+        )
+        self.waiting = 0
+
+
+class TelegramDispatcher:
+    """Единый планировщик исходящих сообщений бота.
+
+    Общий токен-бакет держит частоту всего бота и достаётся классам по
+    приоритету: заявки, затем запросы восстановления сессии, затем ошибки и
+    снимки. У каждого класса свои лимиты одновременных запросов и частоты,
+    поэтому поток снимков с ошибками не вытесняет заявки. Для каждого чата
+    хранится время, раньше которого в него писать нельзя. TelegramRetryAfter
+    ставит свой чат на паузу и сразу возвращается как ошибка этого чата;
+    пока пауза не кончилась, отправки в чат возвращают ChatPaused без запроса.
+    Остальные чаты не ждут, а повтор остаётся очереди доставки.
+    """
+
+    def __init__(
+        self,
+        rate_per_sec: float = 25,
+        *,
+        concurrency: int = 16,
+        alert_rate_per_sec: float | None = None,
+        alert_concurrency: int | None = None,
+    ):
+        # Небольшой запас подряд: за любую секунду уходит не больше rate + rate/5.
+        self.bucket = TokenBucket(rate_per_sec, capacity=max(1.0, rate_per_sec / 5))
+        alert = Lane(
+            2,
+            alert_rate_per_sec or max(1.0, rate_per_sec / 5),
+            alert_concurrency or max(1, concurrency // 4),
+        )
+        self.lanes = {
+            LANE_ORDERS: Lane(0, rate_per_sec, concurrency),
+            LANE_RECOVERY: Lane(1, alert.rate_per_sec, alert.concurrency),
+            LANE_ALERTS: alert,
+        }
+        self._gate = PriorityGate(self.bucket)
+        self._lanes = {
+            name: _LaneState(name, lane) for name, lane in self.lanes.items()
+        }
+        self._chat_ready_at: dict[int, float] = {}
+
+    def queue_depth(self, lane: str) -> int:
+        return self._lanes[lane].waiting
+
+    async def deliver(
+        self,
+        chat_ids: Iterable[int],
+        send: Callable[[int], Awaitable[None]],
+        lane: str = LANE_ORDERS,
+    ) -> list[tuple[int, BaseException | None]]:
+        """Вызывает send для каждого чата; возвращает ошибку или None по чату."""
+        chat_ids = tuple(chat_ids)
+        state = self._lanes[lane]
+        results = await asyncio.gather(
+            *(self._deliver_one(chat_id, send, state) for chat_id in chat_ids)
+        )
+        return list(zip(chat_ids, results))
+
+    @asynccontextmanager
+    async def _turn(self, lane: _LaneState) -> AsyncIterator[None]:
+        """Ждёт слот и бюджет своего класса, затем токен общего бакета."""
+        self._set_waiting(lane, 1)
+        waiting = True
+        try:
+            async with lane.slots:
+                await lane.bucket.acquire()
+                await self._gate.acquire(lane.priority)
+                self._set_waiting(lane, -1)
+                waiting = False
+                yield
+        finally:
+            if waiting:
+                self._set_waiting(lane, -1)
+
+    def _set_waiting(self, lane: _LaneState, delta: int) -> None:
+        lane.waiting += delta
+        QUEUE_DEPTH.set(lane.waiting, lane=lane.name)
+
+    async def _deliver_one(
+        self,
+        chat_id: int,
+        send: Callable[[int], Awaitable[None]],
+        lane: _LaneState,
+    ) -> BaseException | None:
+        interval = GROUP_CHAT_INTERVAL_SEC if chat_id < 0 else PRIVATE_CHAT_INTERVAL_SEC
+        while True:
+            now = time.monotonic()
+            wait = self._chat_ready_at.get(chat_id, 0.0) - now
+            if wait > interval:
+                # Пауза после лимита дольше обычного интервала: не держим рассылку.
+                return ChatPaused(chat_id, wait)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        # Время занимается до отправки, чтобы параллельное сообщение в тот
+        # же чат дождалось своей очереди.
+        self._chat_ready_at[chat_id] = now + interval
+        async with self._turn(lane):
+            try:
+                await send(chat_id)
+            except TelegramRetryAfter as exc:
+                self._chat_ready_at[chat_id] = time.monotonic() + exc.retry_after
+                TELEGRAM_RETRIES.inc()
+                return exc
+            except Exception as exc:
+                return exc
+            finally:
+                self._prune(time.monotonic())
+        return None
+
+    def _prune(self, now: float) -> None:
+        if len(self._chat_ready_at) > 4096:
+            self._chat_ready_at = {
+                chat_id: ready_at
+                for chat_id, ready_at in self._chat_ready_at.items()
+                if ready_at > now
+            }
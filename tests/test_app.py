@@ -111,7 +111,8 @@ class AppTests(unittest.TestCase):
 
         with redirect_stdout(output):
             exit_code = command_filter(
-                "Нужно разработать Telegram-бота, бюджет 50 000 рублей"
+                Settings.load(env_file=None, values={}),
+                "Нужно разработать Telegram-бота, бюджет 50 000 рублей",
             )
 
         self.assertEqual(exit_code, 0)
@@ -123,7 +124,8 @@ class AppTests(unittest.TestCase):
 
         with redirect_stdout(output):
             exit_code = command_filter(
-                "Нужно разработать Telegram-бота для таргетинга, бюджет 50 000 рублей"
+                Settings.load(env_file=None, values={}),
+                "Нужно разработать Telegram-бота для таргетинга, бюджет 50 000 рублей",
             )
 
         self.assertEqual(exit_code, 0)
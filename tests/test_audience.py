@@ -1,14 +1,35 @@
 import asyncio
+import logging
 from pathlib import Path
+import os
 import tempfile
+import time
+from types import SimpleNamespace
 import unittest
+from unittest.mock import patch
 
 from aiogram.enums import ChatType
-from aiogram.exceptions import TelegramNetworkError
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+)
 from aiogram.methods import SendMessage
 
 from audience import TelegramAudience
 from config import Settings
+from delivery import DeliveryOutbox
+from queues import JsonlQueue, open_order_queue
+from run_all import order_notifier
+import storage
+from storage import BackgroundJsonWriter, JSON_WRITER, read_json_object
+from telegram_dispatch import (
+    ChatPaused,
+    LANE_ALERTS,
+    LANE_ORDERS,
+    TelegramDispatcher,
+    TokenBucket,
+)
 
 
 class FakeBot:
@@ -158,6 +179,325 @@ class AudienceTests(unittest.TestCase):
 
         asyncio.run(scenario())
 
+    def test_screenshot_is_uploaded_once_and_reused_by_file_id(self):
+        class UploadingBot(FakeBot):
+            async def send_photo(self, chat_id, photo, caption):
+                await super().send_photo(chat_id, photo, caption)
+                file_id = photo if isinstance(photo, str) else f"file-{len(self.photos)}"
+                return SimpleNamespace(photo=[SimpleNamespace(file_id=file_id)])
+
+        async def scenario():
+            with tempfile.TemporaryDirectory() as directory:
+                settings = Settings.load(
+                    env_file=None,
+                    values={
+                        "DATA_DIR": directory,
+                        "BOT_TOKEN": "123:abc",
+                        "PROFI_LOGIN": "+79990000000",
+                    },
+                )
+                audience = TelegramAudience(settings)
+                for chat_id in (42, 99, 7):
+                    audience.register(chat_id)
+                screenshot = Path(directory) / "error.png"
+                screenshot.write_bytes(b"png")
+                bot = UploadingBot()
+
+                path = str(screenshot)
+                self.assertEqual(await audience.send_error_photo(bot, path, "a"), 3)
+                self.assertEqual(await audience.send_error_photo(bot, path, "b"), 3)
+                self.assertNotIsInstance(bot.photos[0][1], str)
+                self.assertEqual(
+                    [photo for _, photo, _ in bot.photos[1:]],
+                    ["file-1"] * 5,
+                )
+
+                screenshot.write_bytes(b"new png")
+                os.utime(screenshot, ns=(0, time.time_ns() + 10**9))
+                await audience.send_error_photo(bot, path, "c")
+                self.assertNotIsInstance(bot.photos[6][1], str)
+                self.assertEqual(len(audience.photo_ids), 2)
+
+        asyncio.run(scenario())
+
+
+class DeliveryOutboxTests(unittest.TestCase):
+    def test_failed_chat_keeps_orders_in_order_across_restart(self):
+        class FlakyBot(FakeBot):
+            def __init__(self, broken):
+                super().__init__()
+                self.broken = broken
+
+            async def send_message(self, chat_id, text, **kwargs):
+                if chat_id in self.broken:
+                    raise TelegramNetworkError(
+                        method=SendMessage(chat_id=chat_id, text=text),
+                        message="connection reset",
+                    )
+                await super().send_message(chat_id, text, **kwargs)
+
+        async def scenario():
+            with tempfile.TemporaryDirectory() as directory:
+                settings = Settings.load(
+                    env_file=None,
+                    values={
+                        "DATA_DIR": directory,
+                        "BOT_TOKEN": "123:abc",
+                        "PROFI_LOGIN": "+79990000000",
+                    },
+                )
+                audience = TelegramAudience(settings, FakeLog())
+                audience.register(42)
+                audience.register(99)
+                bot = FlakyBot({99})
+
+                self.assertEqual(await audience.send_order(bot, "first"), 2)
+                bot.broken.clear()
+                # Чат с очередью получает новую заявку только после старой.
+                self.assertEqual(await audience.send_order(bot, "second"), 2)
+                self.assertEqual(
+                    bot.messages,
+                    [(42, "first", {}), (42, "second", {})],
+                )
+
+                restored = TelegramAudience(settings, FakeLog())
+                self.assertEqual(len(restored.outbox), 2)
+                await restored.retry_pending(bot)
+                self.assertEqual(await restored.retry_pending(bot), None)
+                self.assertEqual(
+                    [text for chat_id, text, _ in bot.messages if chat_id == 99],
+                    ["first", "second"],
+                )
+                self.assertEqual(len(TelegramAudience(settings).outbox), 0)
+
+        asyncio.run(scenario())
+
+    def test_rate_limited_chat_does_not_hold_back_other_chats(self):
+        class LimitedBot(FakeBot):
+            async def send_message(self, chat_id, text, **kwargs):
+                if chat_id == 99:
+                    raise TelegramRetryAfter(
+                        method=SendMessage(chat_id=chat_id, text=text),
+                        message="Too Many Requests",
+                        retry_after=30,
+                    )
+                await super().send_message(chat_id, text, **kwargs)
+
+        async def scenario():
+            with tempfile.TemporaryDirectory() as directory:
+                settings = Settings.load(
+                    env_file=None,
+                    values={
+                        "DATA_DIR": directory,
+                        "BOT_TOKEN": "123:abc",
+                        "PROFI_LOGIN": "+79990000000",
+                    },
+                )
+                audience = TelegramAudience(settings, FakeLog())
+                audience.register(42)
+                audience.register(99)
+                bot = LimitedBot()
+
+                started = time.monotonic()
+                self.assertEqual(await audience.send_order(bot, "first"), 2)
+                self.assertEqual(await audience.send_order(bot, "second"), 2)
+                elapsed = time.monotonic() - started
+                delay = await audience.retry_pending(bot)
+                JSON_WRITER.flush()
+                return elapsed, delay, bot.messages, len(audience.outbox)
+
+        elapsed, delay, messages, pending = asyncio.run(scenario())
+        # Второй заявке в чат 42 мешает только его интервал в одну секунду.
+        self.assertLess(elapsed, 1.5)
+        self.assertEqual(messages, [(42, "first", {}), (42, "second", {})])
+        self.assertEqual(pending, 2)
+        self.assertGreater(delay, 25)
+
+    def test_rejected_chat_does_not_block_order_for_others(self):
+        class RejectingBot(FakeBot):
+            async def send_message(self, chat_id, text, **kwargs):
+                if chat_id == 7:
+                    raise TelegramBadRequest(
+                        method=SendMessage(chat_id=chat_id, text=text),
+                        message="Bad Request: chat not found",
+                    )
+                await super().send_message(chat_id, text, **kwargs)
+
+        acked = []
+        ack = JsonlQueue.ack
+
+        def recording_ack(queue, position):
+            acked.append(position)
+            ack(queue, position)
+
+        async def scenario():
+            with tempfile.TemporaryDirectory() as directory:
+                settings = Settings.load(
+                    env_file=None,
+                    values={
+                        "DATA_DIR": directory,
+                        "BOT_TOKEN": "123:abc",
+                        "PROFI_LOGIN": "+79990000000",
+                        "BOT_POLL_SEC": "1",
+                    },
+                )
+                audience = TelegramAudience(settings, FakeLog())
+                for chat_id in (7, 42, 99):
+                    audience.register(chat_id)
+                bot = RejectingBot()
+                notifier = asyncio.create_task(
+                    order_notifier(settings, bot, logging.getLogger("test"), audience)
+                )
+                await asyncio.sleep(0.2)
+                with open_order_queue(settings) as queue:
+                    queue.append({"order_id": "1", "title": "Сайт"})
+                # Несколько циклов опроса: заявка не должна уйти повторно.
+                await asyncio.sleep(2.5)
+                notifier.cancel()
+                await asyncio.gather(notifier, return_exceptions=True)
+                JSON_WRITER.flush()
+                return bot.messages, len(audience.outbox), audience.recipients
+
+        with patch.object(JsonlQueue, "ack", recording_ack):
+            messages, pending, recipients = asyncio.run(scenario())
+
+        self.assertEqual(sorted(chat_id for chat_id, _, _ in messages), [42, 99])
+        self.assertEqual(pending, 0)
+        self.assertEqual(recipients, (7, 42, 99))
+        self.assertEqual(len(acked), 1)
+
+    def test_queued_message_is_on_disk_when_add_returns(self):
+        write = storage.write_json_atomic
+
+        def slow_write(path, payload, **kwargs):
+            time.sleep(0.1)
+            write(path, payload, **kwargs)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "outbox.json"
+            outbox = DeliveryOutbox(
+                path,
+                base_delay_sec=5,
+                max_delay_sec=15,
+                max_attempts=4,
+                writer=BackgroundJsonWriter("test-outbox"),
+            )
+            with patch("storage.write_json_atomic", slow_write):
+                outbox.add([42, 99], {"text": "order"})
+                stored = read_json_object(path)
+
+        self.assertEqual(set(stored["chats"]), {"42", "99"})
+
+    def test_backoff_doubles_and_message_is_dropped_after_max_attempts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            outbox = DeliveryOutbox(
+                Path(directory) / "outbox.json",
+                base_delay_sec=5,
+                max_delay_sec=15,
+                max_attempts=4,
+            )
+            outbox.add([42], {"text": "order"})
+
+            self.assertTrue(outbox.failed(42, 1000))
+            self.assertEqual(outbox.next_due(), 1005)
+            self.assertTrue(outbox.failed(42, 1000))
+            self.assertEqual(outbox.next_due(), 1010)
+            self.assertTrue(outbox.failed(42, 1000, retry_after=30))
+            self.assertEqual(outbox.next_due(), 1030)
+            self.assertEqual(outbox.due(1020), {})
+            self.assertFalse(outbox.failed(42, 1000))
+            self.assertFalse(outbox.has_pending(42))
+            self.assertEqual(outbox.next_due(), None)
+
+
+class DispatcherTests(unittest.TestCase):
+    def test_recipients_are_sent_concurrently(self):
+        sent = []
+
+        async def send(chat_id):
+            await asyncio.sleep(0.05)
+            sent.append(chat_id)
+
+        async def scenario():
+            dispatcher = TelegramDispatcher(1000, concurrency=20)
+            started = time.monotonic()
+            results = await dispatcher.deliver(range(1, 21), send)
+            return time.monotonic() - started, results
+
+        elapsed, results = asyncio.run(scenario())
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(sorted(sent), list(range(1, 21)))
+        self.assertTrue(all(error is None for _chat_id, error in results))
+
+    def test_retry_after_pauses_only_the_limited_chat(self):
+        sent = []
+        limited = {99}
+
+        async def send(chat_id):
+            if chat_id in limited:
+                limited.discard(chat_id)
+                raise TelegramRetryAfter(
+                    method=SendMessage(chat_id=chat_id, text="test"),
+                    message="Too Many Requests",
+                    retry_after=5,
+                )
+            sent.append(chat_id)
+
+        async def scenario():
+            dispatcher = TelegramDispatcher(1000)
+            started = time.monotonic()
+            first = await dispatcher.deliver([42, 99, 7], send)
+            # Пауза чата не задерживает рассылку и не тратит запрос.
+            second = await dispatcher.deliver([99], send)
+            return time.monotonic() - started, first, second
+
+        elapsed, first, second = asyncio.run(scenario())
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(sent, [42, 7])
+        errors = dict(first)
+        self.assertIsNone(errors[42])
+        self.assertIsNone(errors[7])
+        self.assertIsInstance(errors[99], TelegramRetryAfter)
+        self.assertIsInstance(second[0][1], ChatPaused)
+        self.assertGreater(second[0][1].retry_after, 4)
+
+    def test_orders_overtake_queued_alerts(self):
+        sent = []
+
+        async def send(chat_id):
+            sent.append(chat_id)
+
+        async def scenario():
+            dispatcher = TelegramDispatcher(
+                20,
+                concurrency=4,
+                alert_rate_per_sec=20,
+                alert_concurrency=20,
+            )
+            alerts = asyncio.create_task(
+                dispatcher.deliver(range(100, 120), send, LANE_ALERTS)
+            )
+            await asyncio.sleep(0.1)
+            self.assertGreater(dispatcher.queue_depth(LANE_ALERTS), 10)
+            await dispatcher.deliver([1, 2], send, LANE_ORDERS)
+            self.assertEqual(dispatcher.queue_depth(LANE_ORDERS), 0)
+            await alerts
+            self.assertEqual(dispatcher.queue_depth(LANE_ALERTS), 0)
+
+        asyncio.run(scenario())
+        self.assertLess(sent.index(2), 8)
+        self.assertEqual(len(sent), 22)
+
+    def test_token_bucket_limits_global_rate(self):
+        async def scenario():
+            bucket = TokenBucket(50, capacity=1)
+            started = time.monotonic()
+            for _ in range(11):
+                await bucket.acquire()
+            return time.monotonic() - started
+
+        self.assertGreaterEqual(asyncio.run(scenario()), 0.18)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,178 @@
+import re
+import time
+import unittest
+
+import filters
+from filter_corpus import synthetic_orders
+from filters import FilterDecision, FilterRule, evaluate_order
+
+
+def reference_evaluate(data) -> FilterDecision:
+    """Исходная схема: отдельный search на каждое правило в порядке приоритета."""
+    text = filters._normalize_text(filters._to_text(data))
+    if not text:
+        return FilterDecision(accepted=False)
+
+    matched_rule = None
+    for group, patterns in filters.TARGET_PATTERN_GROUPS:
+        for pattern in patterns:
+            match = pattern.search(text)
+            if match is not None:
+                matched_rule = FilterRule(match.group(0), group)
+                break
+        if matched_rule is not None:
+            break
+    if matched_rule is None:
+        return FilterDecision(accepted=False)
+
+    if not any(keyword in text for keyword in filters.DEV_KEYWORDS):
+        return FilterDecision(
+            accepted=False,
+            matched_rule=matched_rule,
+            excluded_rule=FilterRule(
+                "нет запроса на разработку или внедрение",
+                "Контекст заявки",
+            ),
+        )
+    for keyword in filters.DISALLOWED_TOPICS:
+        if keyword in text:
+            return FilterDecision(
+                accepted=False,
+                matched_rule=matched_rule,
+                excluded_rule=FilterRule(keyword, "Исключённая тематика"),
+            )
+    for pattern in filters.DISALLOWED_PLATFORM_PATTERNS:
+        match = pattern.search(text)
+        if match is not None:
+            return FilterDecision(
+                accepted=False,
+                matched_rule=matched_rule,
+                excluded_rule=FilterRule(match.group(0), "Исключённая платформа"),
+            )
+    if not filters._budget_matches(text, filters.DEFAULT_RULES):
+        return FilterDecision(
+            accepted=False,
+            matched_rule=matched_rule,
+            excluded_rule=FilterRule(
+                f"цена ниже {filters.MIN_BUDGET_RUB:,} руб.".replace(",", " "),
+                "Бюджет",
+            ),
+        )
+    return FilterDecision(accepted=True, matched_rule=matched_rule)
+
+
+# Шаблоны до перехода на KeywordPairRule: эталон для сравнения совпадений.
+ORIGINAL_PAIR_PATTERNS = (
+    (
+        filters.TARGET_PATTERN_GROUPS[0][1][0],
+        re.compile(
+            r"(?iu)(?:"
+            r"\b(?:телеграм\w*|telegram|тг)\b.*?\b(?:бот\w*|bots?)\b|"
+            r"\b(?:бот\w*|bots?)\b.*?\b(?:телеграм\w*|telegram|тг)\b"
+            r")"
+        ),
+    ),
+    (
+        filters.TARGET_PATTERN_GROUPS[1][1][0],
+        re.compile(
+            r"(?iu)(?:"
+            r"\b(?:макс|max)\b.*?\b(?:бот\w*|bots?)\b|"
+            r"\b(?:бот\w*|bots?)\b.*?\b(?:макс|max)\b"
+            r")"
+        ),
+    ),
+)
+
+
+class FilterEngineEquivalenceTests(unittest.TestCase):
+    def test_synthetic_corpus_gives_identical_decisions(self):
+        outcomes = set()
+        for order in synthetic_orders(6000, seed=27, target_share=0.8):
+            expected = reference_evaluate(order)
+            self.assertEqual(evaluate_order(order), expected, order)
+            outcomes.add(
+                (
+                    expected.accepted,
+                    expected.matched_rule.group if expected.matched_rule else None,
+                    expected.excluded_rule.group if expected.excluded_rule else None,
+                )
+            )
+
+        # Корпус должен задевать все ветки решения, иначе проверка бессмысленна.
+        groups = {group for _accepted, group, _excluded in outcomes}
+        excluded = {reason for _accepted, _group, reason in outcomes}
+        self.assertTrue({group for group, _patterns in filters.TARGET_PATTERN_GROUPS} <= groups)
+        self.assertTrue(
+            {"Контекст заявки", "Исключённая тематика", "Исключённая платформа", "Бюджет"}
+            <= excluded
+        )
+        self.assertIn(True, {accepted for accepted, _group, _excluded in outcomes})
+
+    def test_keyword_pairs_match_original_lazy_patterns(self):
+        texts = [
+            "бот max\nтелеграм",
+            "телеграм\nбот телеграм",
+            "тг тг\nбот бот\nmax бот",
+            "ботmax бот-max",
+        ]
+        for order in synthetic_orders(3000, seed=28):
+            texts.append(filters._to_text(order))
+            texts.append(filters._normalize_text(texts[-1]))
+        for rule, original in ORIGINAL_PAIR_PATTERNS:
+            for text in texts:
+                expected = original.search(text)
+                actual = rule.search(text)
+                self.assertEqual(
+                    actual and actual.span(),
+                    expected and expected.span(),
+                    text,
+                )
+
+    def test_long_descriptions_are_filtered_in_linear_time(self):
+        repeated_first_keyword = ("нужно сделать телеграм интеграцию " * 6000)[:200_000]
+        repeated_second_keyword = ("бот для max " * 17_000)[:200_000] + " телеграм"
+        started = time.perf_counter()
+        first = evaluate_order({"description": repeated_first_keyword})
+        second = evaluate_order({"description": repeated_second_keyword})
+        elapsed = time.perf_counter() - started
+
+        self.assertFalse(first.accepted)
+        self.assertEqual(second.matched_rule.group, "Telegram-боты")
+        # Прежние шаблоны тратили на такой текст десятки секунд.
+        self.assertLess(elapsed, 1.0)
+
+    def test_lower_priority_rule_does_not_hide_earlier_one(self):
+        samples = (
+            "нужно сделать парсинг, затем парсер",
+            "нужно сделать crm-систему и crm",
+            "нужно сделать парсер в insta и instagram",
+            "нужно сделать crm discord whatsapp",
+        )
+        for text in samples:
+            with self.subTest(text=text):
+                self.assertEqual(evaluate_order(text), reference_evaluate(text))
+
+    def test_rules_sharing_a_start_position_are_all_seen(self):
+        scanner = filters._RuleScanner(
+            (
+                (re.compile(r"(?iu)\bbot\w*\b"),),
+                (re.compile(r"(?iu)\bbots\b"), re.compile(r"(?iu)\bbo\b")),
+            )
+        )
+
+        self.assertEqual(scanner.scan("x bots bo"), [(0, "bots"), (0, "bots")])
+        self.assertEqual(scanner.scan("x bo bots"), [(0, "bots"), (0, "bots")])
+        self.assertEqual(scanner.scan("x bo"), [None, (1, "bo")])
+
+    def test_rules_without_word_boundary_are_checked_separately(self):
+        scanner = filters._RuleScanner(
+            ((re.compile(r"(?iu)\bcrm\b"), re.compile(r"(?iu)бот"), re.compile(r"(?iu)\bapi\b")),)
+        )
+
+        self.assertEqual(scanner.scan("api чатбот"), [(1, "бот")])
+        self.assertEqual(scanner.scan("api crm чатбот"), [(0, "crm")])
+        self.assertEqual(scanner.scan("api"), [(2, "api")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+from contextlib import redirect_stdout
+import gzip
+from io import StringIO
+import json
+from pathlib import Path
+import tempfile
+import unittest
+
+from app import command_replay
+from config import Settings
+from filter_replay import (
+    ACCEPTED,
+    NO_TARGET_GROUP,
+    iter_jsonl_orders,
+    percentile,
+    replay_orders,
+)
+from filters import DEFAULT_RULES, FilterRules
+
+
+ORDERS = (
+    {"order_id": "1", "title": "Нужно написать парсер, бюджет 8 000 рублей"},
+    {"order_id": "2", "title": "Нужно разработать Telegram-бота"},
+    {"order_id": "3", "title": "Ремонт квартиры"},
+)
+
+
+class FilterReplayTests(unittest.TestCase):
+    def test_jsonl_and_gzip_archives_are_streamed_with_corrupt_lines_counted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            plain = Path(directory) / "orders.jsonl"
+            plain.write_text(
+                json.dumps(ORDERS[0], ensure_ascii=False) + "\n{broken\n\n",
+                encoding="utf-8",
+            )
+            archive = Path(directory) / "board.jsonl.gz"
+            with gzip.open(archive, "wt", encoding="utf-8") as stream:
+                stream.write(json.dumps(ORDERS[2], ensure_ascii=False) + "\n")
+
+            orders = list(iter_jsonl_orders([plain, archive]))
+
+        self.assertEqual(orders, [ORDERS[0], None, ORDERS[2]])
+
+    def test_report_counts_decisions_per_group(self):
+        report = replay_orders([*ORDERS, None], DEFAULT_RULES)
+
+        self.assertEqual(report.total, 3)
+        self.assertEqual(report.corrupt, 1)
+        self.assertEqual(report.decisions[("Парсеры и парсинг", ACCEPTED)], 1)
+        self.assertEqual(report.decisions[("Telegram-боты", ACCEPTED)], 1)
+        self.assertEqual(report.decisions[(NO_TARGET_GROUP, "отклонена")], 1)
+        self.assertEqual(len(report.latencies), 3)
+        self.assertGreater(report.orders_per_second, 0)
+
+    def test_candidate_rules_diff_lists_changed_orders(self):
+        candidate = FilterRules.from_dict(
+            {**DEFAULT_RULES.to_dict(), "min_budget_rub": 10_000},
+            version="candidate",
+        )
+
+        report = replay_orders(ORDERS, DEFAULT_RULES, candidate=candidate)
+
+        self.assertEqual(report.changed, 1)
+        self.assertEqual(report.changes[0].order_id, "1")
+        self.assertEqual(report.changes[0].after, ("Парсеры и парсинг", "Бюджет"))
+
+    def test_percentile_uses_nearest_rank(self):
+        values = [float(value) for value in range(1, 101)]
+
+        self.assertEqual(percentile(values, 0.5), 51.0)
+        self.assertEqual(percentile(values, 0.99), 99.0)
+        self.assertEqual(percentile([], 0.9), 0.0)
+
+    def test_replay_command_prints_report_and_diff(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings = Settings.load(env_file=None, values={"DATA_DIR": directory})
+            settings.orders_path.write_text(
+                "".join(json.dumps(order, ensure_ascii=False) + "\n" for order in ORDERS),
+                encoding="utf-8",
+            )
+            candidate_path = Path(directory) / "candidate.json"
+            candidate_path.write_text(
+                json.dumps({**DEFAULT_RULES.to_dict(), "min_budget_rub": 10_000}),
+                encoding="utf-8",
+            )
+            output = StringIO()
+
+            with redirect_stdout(output):
+                exit_code = command_replay(
+                    settings,
+                    [],
+                    synthetic=None,
+                    seed=0,
+                    candidate_path=candidate_path,
+                    show_changes=5,
+                )
+
+        self.assertEqual(exit_code, 0)
+        self.assertIn("Заявок: 3", output.getvalue())
+        self.assertIn("p99=", output.getvalue())
+        self.assertIn("Решение изменится у 1 заявок", output.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,20 @@
+import json
+import os
+from pathlib import Path
+import tempfile
 import unittest
 
-from filters import MIN_BUDGET_RUB, evaluate_order, order_matches_filter
+from filters import (
+    DEFAULT_RULES,
+    DecisionCache,
+    FilterRules,
+    MIN_BUDGET_RUB,
+    FilterRulesError,
+    FilterRulesStore,
+    evaluate_order,
+    load_filter_rules,
+    order_matches_filter,
+)
 
 
 class ServiceFilterTests(unittest.TestCase):
@@ -106,5 +120,100 @@ class ServiceFilterTests(unittest.TestCase):
                 )
 
 
+class FilterRulesFileTests(unittest.TestCase):
+    def _write(self, path: Path, document: dict, mtime_ns: int) -> None:
+        path.write_text(json.dumps(document, ensure_ascii=False), encoding="utf-8")
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def test_rules_file_round_trips_to_same_rules(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "rules.json"
+            self._write(path, DEFAULT_RULES.to_dict(), 1_000_000_000)
+
+            rules = load_filter_rules(path)
+
+        self.assertEqual(rules.to_dict(), DEFAULT_RULES.to_dict())
+        self.assertTrue(rules.version)
+
+    def test_store_picks_up_changed_file_without_restart(self):
+        text = "Нужно написать парсер, бюджет 6 000 рублей"
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "rules.json"
+            document = DEFAULT_RULES.to_dict()
+            self._write(path, document, 1_000_000_000)
+            store = FilterRulesStore(path)
+            self.assertTrue(evaluate_order(text, store.current()).accepted)
+
+            self._write(path, {**document, "min_budget_rub": 10_000}, 2_000_000_000)
+            rules = store.current()
+
+        self.assertEqual(rules.min_budget_rub, 10_000)
+        decision = evaluate_order(text, rules)
+        self.assertFalse(decision.accepted)
+        self.assertEqual(decision.excluded_rule.phrase, "цена ниже 10 000 руб.")
+
+    def test_broken_file_keeps_previous_rules(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "rules.json"
+            self._write(path, DEFAULT_RULES.to_dict(), 1_000_000_000)
+            store = FilterRulesStore(path)
+            previous = store.current()
+
+            path.write_text("{", encoding="utf-8")
+            os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+            with self.assertLogs("parser.filters", level="WARNING"):
+                self.assertIs(store.current(), previous)
+
+            broken_pattern = {**DEFAULT_RULES.to_dict(), "disallowed_platforms": ["(insta"]}
+            self._write(path, broken_pattern, 3_000_000_000)
+            with self.assertRaises(FilterRulesError):
+                load_filter_rules(path)
+            with self.assertLogs("parser.filters", level="WARNING"):
+                self.assertIs(store.current(), previous)
+
+
+class DecisionCacheTests(unittest.TestCase):
+    def test_same_normalized_text_is_served_from_cache(self):
+        cache = DecisionCache(maxsize=8)
+
+        first = cache.evaluate({"title": "Нужно написать  парсер"})
+        second = cache.evaluate({"title": "нужно НАПИСАТЬ парсер"})
+
+        self.assertIs(first, second)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(first, evaluate_order("Нужно написать парсер"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = DecisionCache(maxsize=2)
+        cache.evaluate("нужен парсер")
+        cache.evaluate("нужна crm")
+        cache.evaluate("нужен парсер")
+        cache.evaluate("нужен телеграм бот")
+
+        cache.evaluate("нужен парсер")
+        cache.evaluate("нужна crm")
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+    def test_new_rules_version_invalidates_cache(self):
+        cache = DecisionCache()
+        text = "Нужно написать парсер, бюджет 6 000 рублей"
+        stricter = FilterRules.from_dict({**DEFAULT_RULES.to_dict(), "min_budget_rub": 10_000})
+
+        self.assertTrue(cache.evaluate(text, DEFAULT_RULES).accepted)
+        self.assertNotEqual(stricter.version, DEFAULT_RULES.version)
+        self.assertFalse(cache.evaluate(text, stricter).accepted)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.hits, 0)
+
+    def test_zero_size_disables_cache(self):
+        cache = DecisionCache(maxsize=0)
+        cache.evaluate("нужен парсер")
+        cache.evaluate("нужен парсер")
+
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,86 @@
+import io
+from pathlib import Path
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ipc import (
+    FRAME_HEARTBEAT,
+    FRAME_ORDER,
+    FRAME_PREFIX,
+    IPC_ENV,
+    ParserChannel,
+    publish,
+    publish_records,
+)
+from queues import JsonlQueue
+
+
+class _Watcher:
+    def __init__(self):
+        self.wakeups = 0
+
+    def notify(self):
+        self.wakeups += 1
+
+
+def _frames(records, spans) -> list[bytes]:
+    stdout = io.StringIO()
+    with patch.dict("os.environ", {IPC_ENV: "1"}), patch("sys.stdout", stdout):
+        publish_records(FRAME_ORDER, records, spans)
+    return [line + b"\n" for line in stdout.getvalue().encode().split(b"\n")[:-1]]
+
+
+class ParserChannelTests(unittest.TestCase):
+    def test_frames_are_written_only_under_supervisor(self):
+        stdout = io.StringIO()
+        with patch.dict("os.environ", {IPC_ENV: ""}), patch("sys.stdout", stdout):
+            publish(FRAME_HEARTBEAT, {"pid": 1})
+        self.assertEqual(stdout.getvalue(), "")
+
+        channel = ParserChannel()
+        with patch.dict("os.environ", {IPC_ENV: "1"}), patch("sys.stdout", stdout):
+            publish(FRAME_HEARTBEAT, {"pid": 1})
+        self.assertTrue(stdout.getvalue().encode().startswith(FRAME_PREFIX))
+        self.assertTrue(channel.feed(stdout.getvalue().encode()))
+        self.assertEqual(channel.heartbeat, {"pid": 1})
+        self.assertFalse(channel.feed("обычная строка журнала\n".encode()))
+        with self.assertLogs("parser.ipc", level="WARNING"):
+            self.assertTrue(channel.feed(FRAME_PREFIX + b'{"kind": "order", "pay'))
+
+    def test_routed_orders_are_read_without_touching_the_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "new_orders.jsonl"
+            cursor = Path(directory) / "bot_cursor.json"
+            channel = ParserChannel()
+            watcher = _Watcher()
+            with JsonlQueue(path, cursor, 10_000) as queue:
+                records = [{"order_id": "1"}, {"order_id": "2"}]
+                frames = _frames(records, queue.append_many(records))
+                with channel.route(FRAME_ORDER, queue, watcher):
+                    for frame in frames:
+                        channel.feed(frame)
+                channel.feed(frames[0])
+                self.assertEqual(watcher.wakeups, 2)
+
+                content = path.read_bytes()
+                path.write_bytes(b"")
+                batch = list(queue.read_batch())
+                self.assertEqual([record for record, _ in batch], records)
+                for _record, position in batch:
+                    queue.ack(position)
+
+                # Пропущенный кадр: очередь дочитывается из файла.
+                path.write_bytes(content)
+                queue.append({"order_id": "3"})
+                late = [{"order_id": "4"}]
+                with channel.route(FRAME_ORDER, queue, watcher):
+                    channel.feed(_frames(late, queue.append_many(late))[0])
+                self.assertEqual(
+                    [record["order_id"] for record, _ in queue.read_batch()],
+                    ["3", "4"],
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
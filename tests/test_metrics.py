@@ -0,0 +1,131 @@
+import asyncio
+import os
+from pathlib import Path
+import tempfile
+import time
+import unittest
+from urllib.request import urlopen
+
+from config import Settings
+from loop_monitor import LOOP_STALLS, LoopLagMonitor
+from metrics import MetricsRegistry, MetricsServer, chromium_rss_bytes
+from queues import open_order_queue, publish_lag, published_lag_bytes
+from storage import save_cursor
+
+
+class MetricsTests(unittest.TestCase):
+    def test_registry_renders_prometheus_text(self):
+        registry = MetricsRegistry()
+        polls = registry.counter("profi_polls", "Проверки", ("result",))
+        latency = registry.histogram(
+            "profi_phase_seconds",
+            "Этапы",
+            ("phase",),
+            buckets=(0.1, 1.0),
+        )
+
+        polls.inc(result="ok")
+        polls.inc(result="ok")
+        latency.observe(0.05, phase="refresh")
+        latency.observe(5, phase="refresh")
+        text = registry.render()
+
+        self.assertIn("# TYPE profi_polls_total counter", text)
+        self.assertIn('profi_polls_total{result="ok"} 2', text)
+        self.assertIn('profi_phase_seconds_bucket{phase="refresh",le="0.1"} 1', text)
+        self.assertIn('profi_phase_seconds_bucket{phase="refresh",le="+Inf"} 2', text)
+        self.assertIn('profi_phase_seconds_count{phase="refresh"} 2', text)
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("profi_orders", "Заявки", ("group",))
+
+        counter.inc(group='MAX "боты"\n')
+
+        self.assertIn('group="MAX \\"боты\\"\\n"', registry.render())
+
+    def test_server_listens_on_loopback_only(self):
+        registry = MetricsRegistry()
+        registry.gauge_callback("profi_queue_lag_bytes", "Отставание", lambda: 42)
+
+        with MetricsServer(0, registry) as server:
+            self.assertEqual(server._server.server_address[0], "127.0.0.1")
+            with urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as response:
+                body = response.read().decode("utf-8")
+                content_type = response.headers["Content-Type"]
+
+        self.assertIn("profi_queue_lag_bytes 42", body)
+        self.assertTrue(content_type.startswith("text/plain"))
+
+    def test_queue_lag_is_measured_from_cursor(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings = Settings.load(env_file=None, values={"DATA_DIR": directory})
+            settings.orders_path.write_text('{"order_id": "1"}\n' * 3, encoding="utf-8")
+            save_cursor(settings.bot_cursor_path, 18)
+
+            with open_order_queue(settings) as queue:
+                with publish_lag("orders", queue):
+                    lag = published_lag_bytes()
+            closed = published_lag_bytes()
+
+        self.assertEqual(lag, {("orders",): 36})
+        self.assertEqual(closed, {})
+
+    def test_chromium_rss_counts_only_browser_descendants(self):
+        with tempfile.TemporaryDirectory() as directory:
+            proc = Path(directory)
+            for pid, ppid, name, pages in (
+                (10, 1, "python", 100),
+                (11, 10, "node", 50),
+                (12, 11, "chrome", 7),
+                (13, 12, "chrome", 3),
+                (14, 1, "chrome", 1000),
+            ):
+                entry = proc / str(pid)
+                entry.mkdir()
+                (entry / "stat").write_text(f"{pid} ({name}) S {ppid} 0 0")
+                (entry / "comm").write_text(f"{name}\n")
+                (entry / "statm").write_text(f"0 {pages} 0")
+
+            total = chromium_rss_bytes(10, proc)
+
+        self.assertEqual(total, 10 * os.sysconf("SC_PAGE_SIZE"))
+
+    def test_loop_stall_is_attributed_to_blocking_task(self):
+        class Log:
+            def __init__(self):
+                self.warnings = []
+
+            def warning(self, *args):
+                self.warnings.append(args)
+
+        def read_disk_synchronously():
+            time.sleep(0.4)
+
+        async def blocking_command():
+            await asyncio.sleep(0.15)
+            read_disk_synchronously()
+
+        async def scenario(monitor):
+            sampler = asyncio.create_task(monitor.run())
+            await asyncio.create_task(blocking_command(), name="health-command")
+            await asyncio.sleep(0.15)
+            sampler.cancel()
+            await asyncio.gather(sampler, return_exceptions=True)
+
+        log = Log()
+        monitor = LoopLagMonitor(0.1, log, interval_sec=0.05)
+        stalls = LOOP_STALLS.value()
+
+        asyncio.run(scenario(monitor))
+
+        self.assertEqual(LOOP_STALLS.value(), stalls + 1)
+        self.assertGreaterEqual(monitor.last_stall.lag_sec, 0.3)
+        self.assertIn("health-command", monitor.last_stall.task)
+        self.assertIn("blocking_command", monitor.last_stall.task)
+        self.assertIn("read_disk_synchronously", monitor.last_stall.location)
+        self.assertEqual(len(log.warnings), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,20 +1,29 @@
 import asyncio
 import json
+import os
 from pathlib import Path
 from types import SimpleNamespace
 import tempfile
+import threading
 import time
 import unittest
 from unittest.mock import patch
 
 from config import Settings
-from heartbeat import HeartbeatReporter, read_heartbeat
+from heartbeat import (
+    HeartbeatRecord,
+    HeartbeatReporter,
+    heartbeat_age_seconds,
+    read_heartbeat,
+    read_heartbeat_record,
+)
 from health_report import build_health_report
 from instance_lock import AlreadyRunningError, SingleInstanceLock
 from maintenance import create_safe_backup
 from runtime_control import ParserPauseControl
 from run_all import wait_for_active_site_cooldown
 from site_cooldown import activate_site_cooldown
+from storage import read_json_object, write_json_atomic
 
 
 class OperationsTests(unittest.TestCase):
@@ -133,6 +142,77 @@ class OperationsTests(unittest.TestCase):
             self.assertTrue(payload["process_alive_at"])
             self.assertTrue(payload["last_success_at"])
 
+    def test_binary_heartbeat_is_updated_in_place_and_json_on_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "heartbeat.json"
+            with HeartbeatReporter(path, interval_sec=60) as reporter:
+                reporter.mark_success()
+                json_mtime = path.stat().st_mtime_ns
+                with reporter.phase("collect"):
+                    time.sleep(0.01)
+                reporter.count_orders(2)
+                reporter.mark_success()
+                self.assertEqual(path.stat().st_mtime_ns, json_mtime)
+
+                payload = read_heartbeat(path)
+                self.assertEqual(payload["pid"], os.getpid())
+                self.assertEqual(payload["status"], "ok")
+                self.assertEqual((payload["checks"], payload["orders"]), (2, 2))
+                self.assertGreaterEqual(payload["phases"]["collect"], 0.01)
+                self.assertLess(heartbeat_age_seconds(payload), 5)
+
+                reporter.mark_failure("Ошибка " * 100)
+                self.assertTrue(read_heartbeat(path)["message"].startswith("Ошибка"))
+                self.assertEqual(read_json_object(path)["status"], "error")
+
+    def test_stale_binary_heartbeat_does_not_hide_newer_json(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "heartbeat.json"
+            record = HeartbeatRecord(path.with_suffix(".bin"))
+            record.write({
+                "pid": 100,
+                "process_started_at": "2026-01-01T10:00:00+00:00",
+                "process_alive_at": "2026-01-01T10:05:00+00:00",
+                "message": "прежний парсер",
+            })
+            record.close()
+            write_json_atomic(path, {
+                "pid": 200,
+                "process_started_at": "2026-01-01T11:00:00+00:00",
+                "process_alive_at": "2026-01-01T11:00:30+00:00",
+                "message": "новый парсер",
+            })
+
+            self.assertEqual(read_heartbeat(path)["message"], "новый парсер")
+            self.assertEqual(read_heartbeat(path, 200)["message"], "новый парсер")
+            with patch("heartbeat.read_json_object") as read_json:
+                self.assertEqual(read_heartbeat(path, 100)["message"], "прежний парсер")
+            read_json.assert_not_called()
+
+    def test_heartbeat_reader_never_sees_half_written_record(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "heartbeat.bin"
+            record = HeartbeatRecord(path)
+            stop = threading.Event()
+
+            def write() -> None:
+                checks = 0
+                while not stop.is_set():
+                    checks += 1
+                    record.write({"checks": checks, "message": f"проверка {checks}"})
+
+            writer = threading.Thread(target=write)
+            writer.start()
+            try:
+                for _ in range(2_000):
+                    payload = read_heartbeat_record(path)
+                    if payload is not None:
+                        self.assertEqual(payload["message"], f"проверка {payload['checks']}")
+            finally:
+                stop.set()
+                writer.join()
+                record.close()
+
     def test_second_instance_is_rejected(self):
         with tempfile.TemporaryDirectory() as directory:
             path = Path(directory) / "service.lock"
@@ -173,10 +253,11 @@ class OperationsTests(unittest.TestCase):
             self.assertNotIn("BOT_TOKEN", safe_env)
             self.assertNotIn("PROFI_LOGIN", safe_env)
             self.assertNotIn("TELEGRAM_PROXY", safe_env)
-            self.assertIn(
-                "TARGET_KEYWORD_PATTERNS",
-                payload["filter_rules_source"],
+            self.assertEqual(
+                payload["filter_rules"]["target_groups"][0]["name"],
+                "Telegram-боты",
             )
+            self.assertIn("version", payload["filter_rules"])
 
     def test_health_report_contains_core_components(self):
         with tempfile.TemporaryDirectory() as directory:
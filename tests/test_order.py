@@ -0,0 +1,107 @@
+import json
+from pathlib import Path
+import tempfile
+import unittest
+
+from filters import DecisionCache, evaluate_order
+from order import Order, parse_budget_range
+from storage import append_jsonl
+from tg_formatter import MESSAGE_LIMIT, format_order, pack_digests
+
+
+CARD = {
+    "order_id": "101",
+    "title": "Нужно разработать Telegram-бота",
+    "href": "/backoffice/n.php?o=101",
+    "price": "до 3 000 ₽",
+    "description": "Бот для записи клиентов",
+    "location": "Дистанционно",
+    "preferred_time": None,
+    "client_name": "Анна",
+    "posted_ago": "5 минут назад",
+}
+
+
+class OrderTests(unittest.TestCase):
+    def test_budget_range_is_parsed_from_card_price(self):
+        self.assertEqual(parse_budget_range("до 3 000 ₽"), (None, 3000))
+        self.assertEqual(parse_budget_range("от 10 000 ₽"), (10000, None))
+        self.assertEqual(parse_budget_range("5 000–15 000 ₽"), (5000, 15000))
+        self.assertEqual(parse_budget_range("8 000 ₽"), (8000, 8000))
+        self.assertEqual(parse_budget_range("от 2 000 до 4 000 ₽"), (2000, 4000))
+        self.assertEqual(parse_budget_range("1500-3000 ₽"), (1500, 3000))
+        self.assertEqual(parse_budget_range("2 500 ₽ за 60 мин"), (2500, 2500))
+        self.assertEqual(parse_budget_range("до 900 ₽ за 45 мин"), (None, 900))
+        self.assertEqual(parse_budget_range("договорная"), (None, None))
+        self.assertEqual(parse_budget_range(None), (None, None))
+
+    def test_dict_round_trip_keeps_fields_and_adds_budget(self):
+        order = Order.from_dict({**CARD, "unknown": "x", "description": "  "})
+
+        payload = order.to_dict()
+
+        self.assertNotIn("unknown", payload)
+        self.assertIsNone(payload["description"])
+        self.assertEqual((payload["budget_min"], payload["budget_max"]), (None, 3000))
+        self.assertEqual(Order.from_dict(payload), order)
+
+    def test_filter_text_is_normalized_once_on_first_use(self):
+        order = Order.from_dict(CARD)
+
+        self.assertIsNone(order._filter_text)
+        self.assertIn("telegram-бота", order.filter_text)
+        self.assertIs(order.filter_text, order._filter_text)
+
+    def test_filter_uses_card_price_instead_of_amounts_in_text(self):
+        order = Order.from_dict(
+            {
+                **CARD,
+                "price": "15 000 ₽",
+                "description": "Бот, бюджет 2 000 рублей на первый этап",
+            }
+        )
+
+        self.assertTrue(evaluate_order(order).accepted)
+        self.assertFalse(evaluate_order(order.to_dict()).accepted)
+
+    def test_order_and_dict_agree_without_price(self):
+        payload = {**CARD, "price": None, "description": "Бюджет 3 000 рублей"}
+        order = Order.from_dict(payload)
+        cache = DecisionCache()
+
+        self.assertEqual(evaluate_order(order), evaluate_order(payload))
+        self.assertEqual(cache.evaluate(order), evaluate_order(payload))
+        self.assertEqual(cache.evaluate(payload), evaluate_order(payload))
+        self.assertEqual(cache.hits, 1)
+
+    def test_storage_and_formatter_accept_order(self):
+        order = Order.from_dict(CARD)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "orders.jsonl"
+            append_jsonl(path, order)
+            stored = json.loads(path.read_text(encoding="utf-8"))
+
+        self.assertEqual(stored["order_id"], "101")
+        self.assertEqual(stored["budget_max"], 3000)
+        self.assertEqual(format_order(order), format_order(stored))
+        self.assertIn("https://profi.ru/backoffice/n.php?o=101", format_order(order))
+
+    def test_burst_is_packed_into_digests_without_splitting_orders(self):
+        orders = [
+            {**CARD, "order_id": str(index), "description": "д" * 1_500}
+            for index in range(5)
+        ]
+
+        messages = pack_digests(orders)
+
+        self.assertEqual([count for _, count in messages], [2, 2, 1])
+        self.assertTrue(all(len(text) <= MESSAGE_LIMIT for text, _ in messages))
+        self.assertEqual(messages[-1][0], format_order(orders[-1]))
+        for index, order in enumerate(orders):
+            self.assertIn(format_order(order), messages[index // 2][0])
+        self.assertEqual(len(pack_digests([CARD] * 10)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import asyncio
+from pathlib import Path
+import tempfile
+import time
+import unittest
+
+from queue_watch import QueueWatcher
+from storage import append_segmented_jsonl, write_json_atomic
+
+
+class QueueWatcherTests(unittest.IsolatedAsyncioTestCase):
+    async def test_append_wakes_waiter_and_other_files_do_not(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "new_orders.jsonl"
+            with QueueWatcher(path) as watcher:
+                if not watcher.active:
+                    self.skipTest("inotify недоступен")
+
+                write_json_atomic(Path(directory) / "bot_cursor.json", {"offset": 0})
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(watcher.wait(30), 0.2)
+
+                loop = asyncio.get_running_loop()
+                loop.call_later(0.05, append_segmented_jsonl, path, {"order_id": "1"})
+                started = time.monotonic()
+                await watcher.wait(30)
+                self.assertLess(time.monotonic() - started, 1)
+
+    async def test_wait_falls_back_to_sleep_without_inotify(self):
+        watcher = QueueWatcher(Path("unused.jsonl"))
+        started = time.monotonic()
+        await watcher.wait(0.05)
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+        watcher.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
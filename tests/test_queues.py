@@ -0,0 +1,195 @@
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from config import Settings
+from order import Order
+from queues import JsonlQueue, SqliteQueue, open_order_queue
+from storage import (
+    append_jsonl,
+    append_segmented_jsonl,
+    load_cursor,
+    load_queue_position,
+    save_cursor,
+)
+
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+
+# Отправщик, который «падает» без закрытия очереди после crash_after записей.
+CRASHING_CONSUMER = textwrap.dedent(
+    """
+    import os, sys
+    from pathlib import Path
+    from queues import JsonlQueue
+
+    path, cursor, crash_after = Path(sys.argv[1]), Path(sys.argv[2]), int(sys.argv[3])
+    queue = JsonlQueue(path, cursor, 200, max_records=7, commit_every=5,
+                       commit_interval_sec=60)
+    sent = 0
+    while True:
+        batch = list(queue.read_batch())
+        if not batch:
+            break
+        for record, position in batch:
+            print(record["order_id"], flush=True)
+            sent += 1
+            if sent == crash_after:
+                os._exit(1)
+            queue.ack(position)
+        queue.cleanup()
+    queue.close()
+    """
+)
+
+
+class SqliteQueueTests(unittest.TestCase):
+    def test_records_are_read_in_order_and_acknowledged(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "orders.sqlite3"
+            with (
+                SqliteQueue(path) as producer,
+                SqliteQueue(path, batch_size=2) as consumer,
+            ):
+                producer.append_many(
+                    [{"order_id": "1"}, Order.from_dict({"order_id": "2"})]
+                )
+                producer.append({"order_id": "3"})
+
+                batch = consumer.read_batch()
+                self.assertEqual([record["order_id"] for record, _seq in batch], ["1", "2"])
+                consumer.ack(batch[0][1])
+                self.assertEqual(
+                    [record["order_id"] for record, _seq in consumer.read_batch()],
+                    ["2", "3"],
+                )
+                consumer.ack(batch[1][1])
+                consumer.ack(batch[0][1])
+                self.assertEqual(consumer.position(), batch[1][1])
+
+                self.assertEqual(consumer.cleanup(), 2)
+                self.assertEqual(consumer.cleanup(), 0)
+                self.assertEqual(
+                    consumer.lag_bytes(),
+                    len(json.dumps({"order_id": "3"})) + 1,
+                )
+
+    def test_new_consumer_skips_existing_records_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "orders.sqlite3"
+            with SqliteQueue(path) as queue:
+                queue.append({"order_id": "old"})
+                queue.append({"order_id": "old-2"})
+                queue.cleanup()
+
+                self.assertTrue(queue.skip_existing())
+                self.assertFalse(queue.skip_existing())
+                self.assertEqual(queue.read_batch(), [])
+                self.assertEqual(queue.cleanup(), 2)
+
+                queue.append({"order_id": "new"})
+                self.assertEqual(queue.read_batch()[0][0], {"order_id": "new"})
+
+    def test_unread_jsonl_tail_is_imported_without_skipping(self):
+        with tempfile.TemporaryDirectory() as directory:
+            jsonl = Path(directory) / "new_orders.jsonl"
+            cursor = Path(directory) / "bot_cursor.json"
+            append_jsonl(jsonl, {"order_id": "sent"})
+            save_cursor(cursor, jsonl.stat().st_size)
+            append_jsonl(jsonl, {"order_id": "pending"})
+
+            with SqliteQueue(Path(directory) / "orders.sqlite3") as queue:
+                self.assertEqual(queue.import_jsonl(jsonl, cursor), 1)
+                self.assertFalse(queue.skip_existing())
+                self.assertEqual(
+                    [record for record, _seq in queue.read_batch()],
+                    [{"order_id": "pending"}],
+                )
+
+            self.assertEqual(jsonl.read_text(encoding="utf-8"), "")
+            self.assertEqual(load_cursor(cursor), 0)
+
+
+class JsonlQueueCursorTests(unittest.TestCase):
+    def test_cursor_is_written_in_groups_and_on_close(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "orders.jsonl"
+            cursor = Path(directory) / "bot_cursor.json"
+            for order_id in range(12):
+                append_segmented_jsonl(path, {"order_id": str(order_id)})
+
+            with JsonlQueue(
+                path,
+                cursor,
+                10_000,
+                commit_every=5,
+                commit_interval_sec=60,
+            ) as queue:
+                records = list(queue.read_batch())
+                for _record, position in records[:7]:
+                    queue.ack(position)
+                self.assertEqual(queue._cursor.commits, 1)
+                self.assertEqual(load_queue_position(cursor), records[4][1])
+                for _record, position in records[7:]:
+                    queue.ack(position)
+
+            self.assertEqual(load_queue_position(cursor), records[-1][1])
+            self.assertEqual(queue._cursor.commits, 3)
+
+    def test_crash_between_commits_redelivers_but_never_loses_records(self):
+        total = 30
+        for crash_after in (1, 9, 23):
+            with self.subTest(crash_after=crash_after), tempfile.TemporaryDirectory() as directory:
+                path = Path(directory) / "orders.jsonl"
+                cursor = Path(directory) / "bot_cursor.json"
+                for order_id in range(total):
+                    append_segmented_jsonl(path, {"order_id": str(order_id)}, 200)
+
+                crashed = subprocess.run(
+                    [sys.executable, "-c", CRASHING_CONSUMER, str(path), str(cursor), str(crash_after)],
+                    cwd=PROJECT_DIR,
+                    env={**os.environ, "PYTHONPATH": str(PROJECT_DIR)},
+                    capture_output=True,
+                    text=True,
+                    check=False,
+                )
+                self.assertEqual(crashed.returncode, 1, crashed.stderr)
+                sent = crashed.stdout.split()
+                self.assertEqual(len(sent), crash_after)
+
+                with JsonlQueue(path, cursor, 200, max_records=1000) as queue:
+                    resumed = [record["order_id"] for record, _ in queue.read_batch()]
+
+                delivered = sent + resumed
+                self.assertEqual(set(delivered), {str(order_id) for order_id in range(total)})
+                # Повторяется только хвост после последней записи позиции.
+                self.assertLessEqual(len(delivered) - total, 5)
+                self.assertEqual(resumed[-1], str(total - 1))
+
+
+class OrderQueueSelectionTests(unittest.TestCase):
+    def test_backend_is_chosen_from_settings(self):
+        with tempfile.TemporaryDirectory() as directory:
+            jsonl = Settings.load(env_file=None, values={"DATA_DIR": directory})
+            sqlite = Settings.load(
+                env_file=None,
+                values={"DATA_DIR": directory, "ORDER_QUEUE_BACKEND": "SQLite"},
+            )
+
+            with open_order_queue(jsonl) as queue:
+                self.assertIsInstance(queue, JsonlQueue)
+                queue.append({"order_id": "1"})
+                self.assertTrue(queue.skip_existing())
+                self.assertEqual(list(queue.read_batch()), [])
+            with open_order_queue(sqlite) as queue:
+                self.assertIsInstance(queue, SqliteQueue)
+                self.assertEqual(queue.path, Path(directory) / "orders.sqlite3")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,8 +13,8 @@ from main import (
     _select_initial_proxy_index,
     failure_backoff_seconds,
 )
-from run_all import read_order_batch
 from site_cooldown import load_site_cooldown
+from storage import read_jsonl_batch
 from tg_formatter import MAX_DESCRIPTION_LENGTH, format_order
 
 
@@ -321,7 +321,7 @@ class RuntimeTests(unittest.TestCase):
                 encoding="utf-8",
             )
 
-            records, normalized_offset = read_order_batch(path, 0)
+            records, normalized_offset = read_jsonl_batch(path, 0)
 
             self.assertEqual(normalized_offset, 0)
             self.assertEqual([record for record, _ in records], [
@@ -337,7 +337,7 @@ class RuntimeTests(unittest.TestCase):
             path = Path(directory) / "orders.jsonl"
             path.write_text('{"order_id": "1"}\n', encoding="utf-8")
 
-            records, normalized_offset = read_order_batch(path, 10_000)
+            records, normalized_offset = read_jsonl_batch(path, 10_000)
 
             self.assertEqual(normalized_offset, 0)
             self.assertEqual(records[0][0], {"order_id": "1"})
@@ -0,0 +1,240 @@
+from datetime import datetime, timedelta, timezone
+import json
+import os
+from pathlib import Path
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from seen_journal import CompactSeenIdJournal, SeenIdJournal, open_seen_ids
+
+
+def _old(days: int) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+def _record_fsync_and_unlink(events):
+    fsync = os.fsync
+    unlink = Path.unlink
+
+    def recording_fsync(descriptor):
+        events.append("fsync")
+        fsync(descriptor)
+
+    def recording_unlink(path, missing_ok=False):
+        events.append(path.name)
+        unlink(path, missing_ok=missing_ok)
+
+    return (
+        patch("os.fsync", recording_fsync),
+        patch.object(Path, "unlink", recording_unlink),
+    )
+
+
+class SeenIdJournalTests(unittest.TestCase):
+    def test_added_ids_survive_restart_without_rewriting_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "seen_ids.json"
+            with SeenIdJournal(path) as seen:
+                snapshot_mtime = path.stat().st_mtime_ns
+                self.assertEqual(seen.add(["1", "2", "2", ""]), 2)
+                self.assertEqual(seen.add(["2", "3"]), 1)
+                self.assertEqual(path.stat().st_mtime_ns, snapshot_mtime)
+                self.assertEqual(len(seen.journal_path.read_text().splitlines()), 3)
+
+            with SeenIdJournal(path) as reloaded:
+                self.assertEqual(set(reloaded), {"1", "2", "3"})
+                self.assertFalse(reloaded.journal_path.exists())
+            self.assertEqual(set(json.loads(path.read_text())), {"1", "2", "3"})
+
+    def test_legacy_snapshot_is_migrated_to_ordered_epochs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "seen_ids.json"
+            path.write_text(
+                json.dumps(
+                    {
+                        "fresh": _old(1),
+                        "old": _old(200),
+                        "older": _old(2),
+                        "bad": "не дата",
+                    }
+                ),
+                encoding="utf-8",
+            )
+
+            with SeenIdJournal(path, retention_days=180) as seen:
+                self.assertEqual(list(seen), ["older", "fresh", "bad"])
+
+            payload = json.loads(path.read_text(encoding="utf-8"))
+            self.assertEqual(list(payload), ["older", "fresh", "bad"])
+            self.assertTrue(all(isinstance(value, int) for value in payload.values()))
+
+    def test_expiry_and_count_cap_pop_from_old_end(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "seen_ids.json"
+            now = int(time.time())
+            path.write_text(
+                json.dumps({"a": now - 10 * 86_400, "b": now - 86_400, "c": now}),
+                encoding="utf-8",
+            )
+
+            with SeenIdJournal(path, retention_days=5, max_count=3) as seen:
+                self.assertEqual(list(seen), ["b", "c"])
+                seen.add(["d", "e"])
+                self.assertEqual(list(seen), ["c", "d", "e"])
+
+    def test_torn_tail_and_rotated_journal_are_recovered(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "seen_ids.json"
+            seen = SeenIdJournal(path)
+            path.write_text(json.dumps({"1": _old(1)}), encoding="utf-8")
+            seen.rotated_path.write_text(json.dumps(["2", int(time.time())]) + "\n")
+            seen.journal_path.write_text(
+                json.dumps(["3", int(time.time())]) + "\nnot json\n" + '["4", 17'
+            )
+
+            with self.assertLogs("parser.storage", level="WARNING"):
+                seen.load()
+            seen.add(["5"])
+            seen.close()
+
+            self.assertEqual(set(seen), {"1", "2", "3", "5"})
+            with SeenIdJournal(path) as reloaded:
+                self.assertEqual(set(reloaded), {"1", "2", "3", "5"})
+
+    def test_append_after_torn_tail_starts_on_new_line(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "seen_ids.json"
+            seen = SeenIdJournal(path)
+            seen.journal_path.write_text('["4", 17')
+
+            with patch.object(SeenIdJournal, "compact"):
+                seen.add(["5"])
+                seen.close()
+
+            reloaded = SeenIdJournal(path)
+            with self.assertLogs("parser.storage", level="WARNING"):
+                reloaded.load()
+            self.assertEqual(set(reloaded), {"5"})
+
+    def test_snapshot_reaches_disk_before_rotated_journal_is_removed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "seen_ids.json"
+            with SeenIdJournal(path) as seen:
+                seen.add(["1", "2"])
+                events = []
+                fsync, unlink = _record_fsync_and_unlink(events)
+                with fsync, unlink:
+                    seen.compact(background=False)
+
+        rotated = events.index("seen_ids.json.journal.1")
+        self.assertIn("fsync", events[:rotated])
+
+    def test_background_compaction_keeps_ids_added_meanwhile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "seen_ids.json"
+            with SeenIdJournal(path, max_count=150, min_compact_records=100) as seen:
+                for batch in range(10):
+                    seen.add(f"{batch}-{index}" for index in range(30))
+                seen.close()
+                self.assertGreaterEqual(seen.compactions, 2)
+                self.assertLessEqual(len(seen), 300)
+                expected = set(seen)
+
+            with SeenIdJournal(path) as reloaded:
+                self.assertTrue(expected <= set(reloaded))
+                self.assertIn("9-29", reloaded)
+
+
+class CompactSeenIdJournalTests(unittest.TestCase):
+    def test_membership_matches_journal_for_numeric_and_other_ids(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "seen_ids.json"
+            with open_seen_ids(path, backend="compact") as seen:
+                self.assertIsInstance(seen, CompactSeenIdJournal)
+                seen.add(["100", "7", "abc", "007", "100"])
+                seen.compact(background=False)
+                seen.add(["55"])
+
+                for order_id in ("7", "55", "100", "abc", "007"):
+                    self.assertIn(order_id, seen)
+                for order_id in ("8", "07", "1000", "", "ab"):
+                    self.assertNotIn(order_id, seen)
+                self.assertEqual(len(seen), 5)
+                self.assertEqual(list(seen._ids), [7, 100])
+
+            self.assertFalse(path.exists())
+            with open_seen_ids(path, backend="compact") as reloaded:
+                self.assertEqual(set(reloaded), {"7", "55", "100", "abc", "007"})
+
+    def test_switching_backends_keeps_ids(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "seen_ids.json"
+            now = int(time.time())
+            path.write_text(
+                json.dumps({"1": now - 100, "x": now - 50}), encoding="utf-8"
+            )
+
+            with CompactSeenIdJournal(path) as compact:
+                compact.add(["2"])
+            self.assertTrue(compact.compact_path.exists())
+
+            with SeenIdJournal(path) as journal:
+                self.assertEqual(list(journal), ["1", "x", "2"])
+                journal.add(["3"])
+            self.assertFalse(journal.compact_path.exists())
+
+            with CompactSeenIdJournal(path) as compact:
+                self.assertEqual(set(compact), {"1", "2", "3", "x"})
+
+    def test_retention_and_count_cap_are_applied_on_compaction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "seen_ids.json"
+            now = int(time.time())
+            path.write_text(
+                json.dumps(
+                    {
+                        "5": now - 10 * 86_400,
+                        "1": now - 3,
+                        "4": now - 2,
+                        "2": now - 2,
+                        "3": now - 1,
+                    }
+                ),
+                encoding="utf-8",
+            )
+
+            with CompactSeenIdJournal(path, retention_days=5, max_count=3) as seen:
+                self.assertEqual(set(seen), {"2", "3", "4"})
+
+    def test_compact_snapshot_reaches_disk_before_old_copies_are_removed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "seen_ids.json"
+            with CompactSeenIdJournal(path) as seen:
+                seen.add(["1", "x"])
+                events = []
+                fsync, unlink = _record_fsync_and_unlink(events)
+                with fsync, unlink:
+                    seen.compact(background=False)
+
+        self.assertIn("fsync", events[:events.index("seen_ids.json")])
+        self.assertIn("fsync", events[:events.index("seen_ids.json.journal.1")])
+
+    def test_background_compaction_keeps_ids_added_meanwhile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "seen_ids.json"
+            with CompactSeenIdJournal(path, min_compact_records=50) as seen:
+                for batch in range(20):
+                    seen.add(str(batch * 100 + index) for index in range(30))
+                seen.close()
+                self.assertGreaterEqual(seen.compactions, 2)
+                self.assertEqual(len(seen), 600)
+
+            with CompactSeenIdJournal(path) as reloaded:
+                self.assertEqual(len(reloaded), 600)
+                self.assertIn("1929", reloaded)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,41 +4,45 @@ from pathlib import Path
 import stat
 import tempfile
 import unittest
+from unittest.mock import patch
 
 from storage import (
+    BackgroundJsonWriter,
+    JsonlBatchReader,
+    QueuePosition,
     append_jsonl,
-    compact_jsonl_if_consumed,
+    append_segmented_jsonl,
+    drop_consumed_segments,
+    iter_jsonl_batch,
+    iter_segmented_batch,
     load_cursor,
     load_chat_ids,
-    load_seen_ids,
+    load_queue_position,
+    queue_end,
+    queue_files,
+    read_segmented_batch,
     save_cursor,
     save_chat_ids,
-    save_seen_ids,
+    save_queue_position,
+    segment_path,
+    segmented_lag_bytes,
+    write_json_atomic,
 )
 
 
 class StorageTests(unittest.TestCase):
-    def test_seen_ids_round_trip_and_atomic_temp_cleanup(self):
+    def test_json_is_replaced_atomically_with_private_mode(self):
         with tempfile.TemporaryDirectory() as directory:
-            path = Path(directory) / "nested" / "seen.json"
+            path = Path(directory) / "nested" / "state.json"
 
-            save_seen_ids(path, {"2", "1"})
+            write_json_atomic(path, {"1": "a", "2": "b"})
 
-            self.assertEqual(load_seen_ids(path), {"1", "2"})
             payload = json.loads(path.read_text(encoding="utf-8"))
             self.assertEqual(set(payload), {"1", "2"})
             self.assertFalse(path.with_name(f".{path.name}.tmp").exists())
             if os.name == "posix":
                 self.assertEqual(stat.S_IMODE(path.stat().st_mode), 0o600)
 
-    def test_broken_seen_file_is_treated_as_empty(self):
-        with tempfile.TemporaryDirectory() as directory:
-            path = Path(directory) / "seen.json"
-            path.write_text("not json", encoding="utf-8")
-
-            with self.assertLogs("parser.storage", level="WARNING"):
-                self.assertEqual(load_seen_ids(path), set())
-
     def test_cursor_round_trip(self):
         with tempfile.TemporaryDirectory() as directory:
             path = Path(directory) / "cursor.json"
@@ -66,24 +70,131 @@ class StorageTests(unittest.TestCase):
 
             self.assertEqual(load_chat_ids(path), {42, 99})
 
-    def test_consumed_jsonl_queue_is_compacted(self):
+    def test_segmented_queue_seals_reads_and_drops_consumed_segments(self):
         with tempfile.TemporaryDirectory() as directory:
             path = Path(directory) / "orders.jsonl"
-            cursor_path = Path(directory) / "cursor.json"
-            append_jsonl(path, {"order_id": "42", "title": "x" * 100})
-            offset = path.stat().st_size
-            save_cursor(cursor_path, offset)
-
-            new_offset = compact_jsonl_if_consumed(
-                path,
-                cursor_path,
-                offset,
-                threshold_bytes=1,
+            for order_id in range(5):
+                append_segmented_jsonl(path, {"order_id": str(order_id)}, 30)
+
+            self.assertEqual(
+                [file.name for file in queue_files(path)],
+                ["orders.jsonl.000000", "orders.jsonl.000001", "orders.jsonl"],
+            )
+            records, start = read_segmented_batch(path, QueuePosition())
+            self.assertEqual(start, QueuePosition())
+            self.assertEqual(
+                [record["order_id"] for record, _position in records],
+                ["0", "1", "2", "3", "4"],
+            )
+
+            # Читатель отстаёт от головы, но первые сегменты уже можно удалить.
+            position = records[3][1]
+            self.assertEqual(position.segment, 1)
+            self.assertEqual(drop_consumed_segments(path, position), 1)
+            self.assertEqual(segmented_lag_bytes(path, position), path.stat().st_size)
+            records, start = read_segmented_batch(path, position)
+            self.assertEqual(start, QueuePosition(2, 0))
+            self.assertEqual([record["order_id"] for record, _ in records], ["4"])
+
+    def test_seal_is_deferred_while_segment_is_held_open(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "events.jsonl"
+            append_segmented_jsonl(path, {"order_id": "0"}, 10)
+
+            # Так ведёт себя Windows, пока читатель держит файл открытым.
+            with (
+                patch.object(Path, "replace", side_effect=PermissionError(13, "busy")),
+                patch("storage.time.sleep"),
+            ):
+                append_segmented_jsonl(path, {"order_id": "1"}, 10)
+            append_segmented_jsonl(path, {"order_id": "2"}, 10)
+
+            self.assertEqual(
+                [file.name for file in queue_files(path)],
+                ["events.jsonl.000000", "events.jsonl"],
             )
+            records, _ = read_segmented_batch(path, QueuePosition())
+            self.assertEqual(
+                [record["order_id"] for record, _position in records],
+                ["0", "1", "2"],
+            )
+
+    def test_reader_follows_rotation_and_interrupted_manifest_update(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "events.jsonl"
+            append_segmented_jsonl(path, {"n": 1}, 10)
+            records, _start = read_segmented_batch(path, QueuePosition())
+            position = records[-1][1]
+
+            # Сбой после переименования сегмента, но до записи манифеста.
+            path.replace(segment_path(path, 0))
+            append_segmented_jsonl(path, {"n": 2}, 10)
+
+            records, start = read_segmented_batch(path, position)
+            self.assertEqual(start, QueuePosition(1, 0))
+            self.assertEqual([record for record, _ in records], [{"n": 2}])
+            self.assertEqual(queue_end(path), records[-1][1])
+
+    def test_streaming_batch_respects_record_and_byte_limits(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "orders.jsonl"
+            for order_id in range(5):
+                append_segmented_jsonl(path, {"order_id": str(order_id)}, 30)
+            reader = JsonlBatchReader(max_records=3, max_bytes=None, chunk_bytes=8)
 
-            self.assertEqual(new_offset, 0)
-            self.assertEqual(path.read_text(encoding="utf-8"), "")
-            self.assertEqual(load_cursor(cursor_path), 0)
+            first = list(iter_segmented_batch(path, QueuePosition(), reader))
+            self.assertTrue(reader.limited)
+            self.assertEqual([record["order_id"] for record, _ in first], ["0", "1", "2"])
+            rest = list(iter_segmented_batch(path, first[-1][1], reader))
+            self.assertFalse(reader.limited)
+            self.assertEqual([record["order_id"] for record, _ in rest], ["3", "4"])
+
+            reader = JsonlBatchReader(max_records=None, max_bytes=1)
+            self.assertEqual(len(list(iter_jsonl_batch(path, 0, reader))), 1)
+
+    def test_partial_trailing_line_is_carried_to_next_batch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "orders.jsonl"
+            path.write_bytes(b'{"order_id": "1"}\nbad\n{"order_id": "2", "tit')
+            reader = JsonlBatchReader(chunk_bytes=4)
+
+            records = list(iter_jsonl_batch(path, 0, reader))
+            self.assertEqual(
+                [record for record, _ in records],
+                [{"order_id": "1"}, None],
+            )
+            offset = records[-1][1]
+
+            with path.open("ab") as file:
+                file.write('le": "Ремонт"}\n'.encode())
+            records = list(iter_jsonl_batch(path, offset, reader))
+            self.assertEqual(
+                records,
+                [({"order_id": "2", "title": "Ремонт"}, path.stat().st_size)],
+            )
+
+    def test_legacy_cursor_is_read_as_first_segment(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "cursor.json"
+            save_cursor(path, 18)
+
+            self.assertEqual(load_queue_position(path), QueuePosition(0, 18))
+            save_queue_position(path, QueuePosition(3, 7))
+            self.assertEqual(load_queue_position(path), QueuePosition(3, 7))
+
+    def test_background_writer_keeps_latest_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "outbox.json"
+            writer = BackgroundJsonWriter()
+
+            for index in range(50):
+                writer.write(path, {"version": index})
+
+            self.assertTrue(writer.flush(timeout=5))
+            self.assertEqual(
+                json.loads(path.read_text(encoding="utf-8")),
+                {"version": 49},
+            )
 
 
 if __name__ == "__main__":
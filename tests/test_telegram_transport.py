@@ -1,8 +1,29 @@
+import asyncio
+import logging
+import socket
+import tempfile
+import time
 import unittest
+from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import ClientSession, web
+
+from audience import TelegramAudience
 from config import Settings
+from session_recovery import SessionRecoveryManager
+from telegram_control import telegram_command_webhook
 from telegram_transport import create_telegram_session
+from version import APP_VERSION
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
 
 
 class TelegramTransportTests(unittest.TestCase):
@@ -30,6 +51,156 @@ class TelegramTransportTests(unittest.TestCase):
             timeout=30,
         )
 
+    def test_webhook_answers_commands_and_rejects_foreign_requests(self):
+        async def scenario(directory: Path):
+            calls: dict[str, dict] = {}
+            answered = asyncio.Event()
+
+            async def bot_api(request: web.Request) -> web.Response:
+                method = request.match_info["method"].lower()
+                calls[method] = dict(await request.post())
+                if method == "sendmessage":
+                    answered.set()
+                    return web.json_response(
+                        {
+                            "ok": True,
+                            "result": {
+                                "message_id": 2,
+                                "date": int(time.time()),
+                                "chat": {"id": 42, "type": "private"},
+                                "text": calls[method]["text"],
+                            },
+                        }
+                    )
+                return web.json_response({"ok": True, "result": True})
+
+            api = web.Application()
+            api.router.add_post("/bot{token}/{method}", bot_api)
+            api_runner = web.AppRunner(api)
+            await api_runner.setup()
+            api_site = web.TCPSite(api_runner, "127.0.0.1", 0)
+            await api_site.start()
+            api_port = api_site._server.sockets[0].getsockname()[1]
+
+            port = _free_port()
+            settings = Settings.load(
+                env_file=None,
+                values={
+                    "DATA_DIR": str(directory),
+                    "LOG_DIR": str(directory / "logs"),
+                    "BOT_TOKEN": "123:abc",
+                    "TELEGRAM_WEBHOOK_URL": "https://bot.example.com/telegram",
+                    "TELEGRAM_WEBHOOK_PORT": str(port),
+                    "TELEGRAM_WEBHOOK_SECRET": "local-secret",
+                },
+            )
+            settings.ensure_directories()
+            log = logging.getLogger("test.webhook")
+            session = AiohttpSession(
+                api=TelegramAPIServer.from_base(f"http://127.0.0.1:{api_port}")
+            )
+            bot = Bot(token="123:abc", session=session)
+            audience = TelegramAudience(settings, log)
+            recovery = SessionRecoveryManager(settings, bot, log, audience=audience)
+            task = asyncio.create_task(
+                telegram_command_webhook(settings, bot, recovery, log, audience)
+            )
+            try:
+                for _ in range(100):
+                    if "setwebhook" in calls:
+                        break
+                    await asyncio.sleep(0.02)
+                update = {
+                    "update_id": 1,
+                    "message": {
+                        "message_id": 1,
+                        "date": int(time.time()),
+                        "chat": {"id": 42, "type": "private"},
+                        "from": {"id": 42, "is_bot": False, "first_name": "Тест"},
+                        "text": "/version",
+                        "entities": [
+                            {"type": "bot_command", "offset": 0, "length": 8}
+                        ],
+                    },
+                }
+                url = f"http://127.0.0.1:{port}/telegram"
+                async with ClientSession() as client:
+                    async with client.post(
+                        url,
+                        json=update,
+                        headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"},
+                    ) as response:
+                        rejected = response.status
+                    async with client.post(
+                        url,
+                        json=update,
+                        headers={"X-Telegram-Bot-Api-Secret-Token": "local-secret"},
+                    ) as response:
+                        accepted = response.status
+                await asyncio.wait_for(answered.wait(), 5)
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await recovery.stop()
+                await session.close()
+                await api_runner.cleanup()
+            return calls, rejected, accepted
+
+        with tempfile.TemporaryDirectory() as directory:
+            calls, rejected, accepted = asyncio.run(scenario(Path(directory)))
+
+        self.assertEqual(rejected, 401)
+        self.assertEqual(accepted, 200)
+        self.assertEqual(calls["setwebhook"]["url"], "https://bot.example.com/telegram")
+        self.assertEqual(calls["setwebhook"]["secret_token"], "local-secret")
+        self.assertEqual(calls["sendmessage"]["chat_id"], "42")
+        self.assertEqual(
+            calls["sendmessage"]["text"],
+            f"Версия парсера: {APP_VERSION}",
+        )
+
+    def test_webhook_retries_when_port_is_busy(self):
+        async def scenario(directory: Path, port: int):
+            settings = Settings.load(
+                env_file=None,
+                values={
+                    "DATA_DIR": str(directory),
+                    "LOG_DIR": str(directory / "logs"),
+                    "BOT_TOKEN": "123:abc",
+                    "TELEGRAM_WEBHOOK_URL": "https://bot.example.com/telegram",
+                    "TELEGRAM_WEBHOOK_PORT": str(port),
+                },
+            )
+            settings.ensure_directories()
+            log = logging.getLogger("test.webhook")
+            bot = Bot(token="123:abc")
+            audience = TelegramAudience(settings, log)
+            recovery = SessionRecoveryManager(settings, bot, log, audience=audience)
+            task = asyncio.create_task(
+                telegram_command_webhook(settings, bot, recovery, log, audience)
+            )
+            try:
+                await asyncio.sleep(0.3)
+                running = not task.done()
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await recovery.stop()
+                await bot.session.close()
+            return running
+
+        with tempfile.TemporaryDirectory() as directory, socket.socket() as busy:
+            busy.bind(("127.0.0.1", 0))
+            busy.listen()
+            port = busy.getsockname()[1]
+            with self.assertLogs("test.webhook", "WARNING") as logs:
+                running = asyncio.run(scenario(Path(directory), port))
+
+        self.assertTrue(running)
+        self.assertTrue(
+            any("запуска webhook-сервера" in line for line in logs.output)
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from typing import Any
+
+
+# Нормализация отдельно от filters: order и filters импортируют её без цикла.
+def to_text(data: Any) -> str:
+    if data is None:
+        return ""
+
+    if isinstance(data, str):
+        return data
+
+    if isinstance(data, dict):
+        parts: list[str] = []
+
+        for key in (
+            "title",
+            "text",
+            "description",
+            "details",
+            "snippet",
+            "category",
+            "budget",
+            "price",
+            "amount",
+        ):
+            value = data.get(key)
+            if isinstance(value, str) and value.strip():
+                normalized_value = value.strip()
+                if key in {"budget", "price", "amount"}:
+                    parts.append(f"{key}: {normalized_value}")
+                else:
+                    parts.append(normalized_value)
+            elif isinstance(value, (int, float)):
+                if key in {"budget", "price", "amount"}:
+                    parts.append(f"{key}: {value}")
+                else:
+                    parts.append(str(value))
+
+        if not parts:
+            for value in data.values():
+                if isinstance(value, str) and value.strip():
+                    parts.append(value.strip())
+                elif isinstance(value, (int, float)):
+                    parts.append(str(value))
+
+        return "\n".join(parts)
+
+    if isinstance(data, (list, tuple, set)):
+        return "\n".join(to_text(x) for x in data)
+
+    return str(data)
+
+
+def normalize_text(text: str) -> str:
+    text = (text or "").lower().replace("ё", "е").replace("\xa0", " ")
+    return " ".join(text.split())
+
+
+def order_text(data: Any) -> str:
+    """Нормализованный текст заявки, по которому работает фильтр."""
+    return normalize_text(to_text(data))
@@ -2,10 +2,14 @@ from __future__ import annotations
 
 from html import escape
 import re
-from typing import Any
+from typing import Any, Mapping, Sequence
+
+from order import Order
 
 
 MAX_DESCRIPTION_LENGTH = 2_800
+MESSAGE_LIMIT = 4_096
+DIGEST_SEPARATOR = "\n\n" + "➖" * 8 + "\n\n"
 
 
 def _html(value: Any) -> str:
@@ -16,33 +20,71 @@ def _normalize_price(value: str) -> str:
     return re.sub(r"\bдо(?=\d)", "до ", value, flags=re.IGNORECASE)
 
 
-def format_order(order: dict[str, Any]) -> str:
-    title = _html(order.get("title") or "Без названия")
+def format_order(order: Order | Mapping[str, Any]) -> str:
+    if not isinstance(order, Order):
+        order = Order.from_dict(order)
+
+    title = _html(order.title or "Без названия")
     lines = [f"🧾 <b>Заказ:</b> {title}"]
 
-    if price := order.get("price"):
-        lines.append(f"💰 <b>Бюджет:</b> {_html(_normalize_price(str(price)))}")
+    if order.price:
+        lines.append(f"💰 <b>Бюджет:</b> {_html(_normalize_price(order.price))}")
 
-    if description := order.get("description"):
-        description = str(description)
+    if description := order.description:
         if len(description) > MAX_DESCRIPTION_LENGTH:
             description = description[:MAX_DESCRIPTION_LENGTH].rstrip() + "…"
         lines.extend(("", "📝 <b>Описание:</b>", _html(description)))
 
-    if location := order.get("location"):
-        lines.append(f"📍 <b>Место:</b> {_html(location)}")
-    if preferred_time := order.get("preferred_time"):
-        lines.append(f"🗓 <b>Когда удобно:</b> {_html(preferred_time)}")
-    if posted_ago := order.get("posted_ago"):
-        lines.append(f"⏱ <b>Опубликовано:</b> {_html(posted_ago)}")
+    if order.location:
+        lines.append(f"📍 <b>Место:</b> {_html(order.location)}")
+    if order.preferred_time:
+        lines.append(f"🗓 <b>Когда удобно:</b> {_html(order.preferred_time)}")
+    if order.posted_ago:
+        lines.append(f"⏱ <b>Опубликовано:</b> {_html(order.posted_ago)}")
 
-    if href := order.get("href"):
-        url = str(href)
+    if url := order.href:
         if url.startswith("/"):
             url = "https://profi.ru" + url
         lines.append(f'🔗 <a href="{_html(url)}">Открыть заказ на Profi.ru</a>')
 
-    if order_id := order.get("order_id"):
-        lines.append(f"🆔 <b>ID:</b> <code>{_html(order_id)}</code>")
+    if order.order_id:
+        lines.append(f"🆔 <b>ID:</b> <code>{_html(order.order_id)}</code>")
 
     return "\n".join(lines)
+
+
+def _digest_header(count: int) -> str:
+    return f"📦 <b>Новых заявок:</b> {count}"
+
+
+def pack_digests(
+    orders: Sequence[Order | Mapping[str, Any]],
+    limit: int = MESSAGE_LIMIT,
+) -> list[tuple[str, int]]:
+    """Упаковывает заявки в сообщения не длиннее limit символов.
+
+    Заявка никогда не делится между сообщениями; одиночная заявка отправляется
+    в обычном виде. Возвращает текст сообщения и число заявок в нём.
+    """
+    texts = [format_order(order) for order in orders]
+    reserve = len(_digest_header(len(texts))) + len(DIGEST_SEPARATOR)
+    groups: list[list[str]] = []
+    size = 0
+    for text in texts:
+        added = len(text) + len(DIGEST_SEPARATOR)
+        if groups and size + added <= limit - reserve:
+            groups[-1].append(text)
+            size += added
+        else:
+            groups.append([text])
+            size = len(text)
+    messages: list[tuple[str, int]] = []
+    for group in groups:
+        if len(group) == 1:
+            messages.append((group[0], 1))
+        else:
+            header = _digest_header(len(group))
+            messages.append(
+                (DIGEST_SEPARATOR.join((header, *group)), len(group))
+            )
+    return messages
@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import asyncio
-from datetime import datetime, timezone
 import shutil
 import time
 from typing import Callable
@@ -10,18 +9,12 @@ from aiogram import Bot
 
 from audience import TelegramAudience
 from config import Settings
-from heartbeat import parse_utc_timestamp, read_heartbeat
+from heartbeat import heartbeat_age_seconds, read_heartbeat
+from ipc import ParserChannel
 from runtime_control import ParserPauseControl
 from session_recovery import SessionRecoveryManager
 
 
-def _age_seconds(value) -> float | None:
-    timestamp = parse_utc_timestamp(value)
-    if timestamp is None:
-        return None
-    return max(0.0, (datetime.now(timezone.utc) - timestamp).total_seconds())
-
-
 async def heartbeat_watchdog(
     settings: Settings,
     bot: Bot,
@@ -30,6 +23,7 @@ async def heartbeat_watchdog(
     control: ParserPauseControl,
     log,
     parser_pid: Callable[[], int | None],
+    channel: ParserChannel | None = None,
 ) -> None:
     heartbeat_alert = False
     disk_alert = False
@@ -38,7 +32,7 @@ async def heartbeat_watchdog(
 
     while True:
         try:
-            disk = shutil.disk_usage(settings.project_dir)
+            disk = await asyncio.to_thread(shutil.disk_usage, settings.project_dir)
             free_mb = disk.free // (1024 * 1024)
             disk_low = free_mb < settings.min_free_disk_mb
             if disk_low and not disk_alert:
@@ -67,7 +61,14 @@ async def heartbeat_watchdog(
                 and not recovery.in_progress
             )
             if should_check:
-                heartbeat = read_heartbeat(settings.heartbeat_path)
+                # Кадр из канала свежее файла; файл остаётся, если канал молчит.
+                heartbeat = channel.heartbeat if channel is not None else None
+                if not heartbeat or heartbeat.get("pid") != current_pid:
+                    heartbeat = await asyncio.to_thread(
+                        read_heartbeat,
+                        settings.heartbeat_path,
+                        current_pid,
+                    )
                 heartbeat_pid = heartbeat.get("pid")
                 if (
                     heartbeat_pid != current_pid
@@ -76,7 +77,7 @@ async def heartbeat_watchdog(
                 ):
                     await asyncio.sleep(settings.watchdog_poll_sec)
                     continue
-                alive_age = _age_seconds(heartbeat.get("process_alive_at"))
+                alive_age = heartbeat_age_seconds(heartbeat)
                 heartbeat_stale = (
                     alive_age is None or alive_age > settings.heartbeat_stale_sec
                 )